@@ -39,6 +39,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',  # Search and trigram lookups (recipe.search, recipe.autocomplete)
     'rest_framework',
     'rest_framework.authtoken',
     'drf_spectacular',
@@ -48,6 +49,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # First, so its total time includes all the other middleware. Unused unless PERFORMANCE_METRICS or PROMETHEUS_METRICS is on.
+    'core.middleware.PerformanceMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -57,6 +60,15 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Queries, SQL time, view and rendering time of every request, in the Server-Timing header and in JSON log lines
+# of the core.performance logger (core/middleware.py)
+PERFORMANCE_METRICS = bool(int(os.getenv('PERFORMANCE_METRICS') or 0))
+
+# Prometheus metrics at /metrics: request latency, SQL queries and cache hits by view (core/metrics.py)
+PROMETHEUS_METRICS = bool(int(os.getenv('PROMETHEUS_METRICS') or 0))
+# Required with PROMETHEUS_METRICS, /metrics needs the "Authorization: Bearer <token>" header (404 without a token)
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+
 ROOT_URLCONF = 'app.urls'
 
 TEMPLATES = [
@@ -82,11 +94,18 @@ WSGI_APPLICATION = 'app.wsgi.application'
 
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql',
+        # Django's PostgreSQL backend with health checks and an optional connection pool
+        'ENGINE': 'core.db.backends.postgresql',
         'HOST': os.getenv('DB_HOST'),
         'NAME': os.getenv('DB_NAME'),
         'USER': os.getenv('DB_USER'),
         'PASSWORD': os.getenv('DB_PASS'),
+        # Seconds to keep a connection open between requests, 0 closes it at the end of every request.
+        # With the pool enabled keep it at 0, closed connections go back to the pool.
+        'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE') or 0),
+        'CONN_HEALTH_CHECKS': bool(int(os.getenv('DB_CONN_HEALTH_CHECKS') or 1)),
+        # Max idle connections kept by every uWSGI worker, 0 disables the pool
+        'POOL_SIZE': int(os.getenv('DB_POOL_SIZE') or 0),
     }
 }
 
@@ -108,6 +127,17 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# The first hasher hashes new passwords, the others only check existing ones. Passwords hashed with any of them (or
+# with different parameters) are rehashed with the first one when the user logs in (core/hashers.py).
+PASSWORD_HASHERS = [
+    # Needs argon2-cffi (requirements.txt). The list is the same in every image, a hasher missing from it would lock
+    # out the users whose passwords it hashed.
+    'core.hashers.TunedArgon2PasswordHasher',
+    'django.contrib.auth.hashers.ScryptPasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2PasswordHasher',  # Django's default, used before
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+]
+
 # Internationalization
 # https://docs.djangoproject.com/en/3.2/topics/i18n/
 
@@ -130,6 +160,23 @@ MEDIA_URL = '/static/media/'
 MEDIA_ROOT = '/vol/web/media'
 STATIC_ROOT = '/vol/web/static'
 
+# Recipes created in one transaction by the bulk import, and read from the database at once by the export
+RECIPE_BULK_BATCH_SIZE = int(os.getenv('RECIPE_BULK_BATCH_SIZE') or 500)
+
+# Render tags and ingredients in the recipe list from Recipe.nested_snapshot instead of the M2M tables (recipe/snapshots.py)
+# Snapshots are maintained either way, python manage.py rebuild_recipe_snapshots builds the missing ones
+RECIPE_LIST_SNAPSHOTS = bool(int(os.getenv('RECIPE_LIST_SNAPSHOTS') or 1))
+
+# How resized variants of uploaded recipe images are generated (recipe/images.py):
+# 'thread' - by a background thread of the worker, 'sync' - right after the upload, 'off' - not at all
+# (python manage.py process_recipe_images generates the missing ones)
+RECIPE_IMAGE_PROCESSING = os.getenv('RECIPE_IMAGE_PROCESSING', 'thread')
+
+# Limits checked while recipe images are being uploaded (recipe/uploadhandlers.py)
+RECIPE_IMAGE_MAX_UPLOAD_SIZE = int(os.getenv('RECIPE_IMAGE_MAX_UPLOAD_SIZE') or 10 * 1024 * 1024)  # Same as nginx
+RECIPE_IMAGE_MAX_PIXELS = int(os.getenv('RECIPE_IMAGE_MAX_PIXELS') or 40_000_000)
+RECIPE_IMAGE_FORMATS = ['JPEG', 'PNG', 'GIF', 'WEBP']
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/3.2/ref/settings/#default-auto-field
 
@@ -139,6 +186,77 @@ AUTH_USER_MODEL = 'core.User'
 
 REST_FRAMEWORK = {
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
+    'DEFAULT_PAGINATION_CLASS': 'core.pagination.KeysetPagination',
+    # Empty means lists are unpaginated unless the client asks for ?page_size=N
+    'PAGE_SIZE': int(os.getenv('API_PAGE_SIZE') or 0) or None,
+    # orjson when it's installed, same output as DRF's JSONRenderer/JSONParser (core/renderers.py)
+    'DEFAULT_RENDERER_CLASSES': [
+        'core.renderers.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'core.renderers.ORJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
+}
+
+# Cache backends to choose from with RESPONSE_CACHE_BACKEND
+RESPONSE_CACHE_BACKENDS = {
+    'dummy': 'django.core.cache.backends.dummy.DummyCache',  # Caching disabled, lists have no ETag (recipe.conditional)
+    'locmem': 'django.core.cache.backends.locmem.LocMemCache',  # Only for a single process, uWSGI workers don't share it
+    'file': 'django.core.cache.backends.filebased.FileBasedCache',  # Shared by all workers of the container
+}
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    # Per-user cache of list responses (recipe/cache.py)
+    'responses': {
+        'BACKEND': RESPONSE_CACHE_BACKENDS[os.getenv('RESPONSE_CACHE_BACKEND') or 'dummy'],
+        # Don't put it in /vol/web, nginx serves that directory
+        'LOCATION': os.getenv('RESPONSE_CACHE_LOCATION') or '/tmp/response-cache',
+        'TIMEOUT': int(os.getenv('RESPONSE_CACHE_TIMEOUT') or 300),
+    },
+}
+
+# Token authentication cache (user/authentication.py)
+TOKEN_AUTH_CACHE = {
+    # Seconds a cached token is trusted without checking the database. Without SHARED_CACHE, workers can't learn about
+    # tokens revoked by other workers, so they trust their local cache for at most 5 seconds.
+    'TTL': int(os.getenv('TOKEN_AUTH_CACHE_TTL') or 30),
+    # Max number of tokens in the in-process cache of every worker
+    'MAX_SIZE': int(os.getenv('TOKEN_AUTH_CACHE_MAX_SIZE') or 10000),
+    # Optional alias from CACHES shared between workers, empty to use only the in-process cache
+    'SHARED_CACHE': os.getenv('TOKEN_AUTH_SHARED_CACHE', ''),
+}
+
+# Short-lived cache of correct logins (user/authentication.py), repeated logins with the same email and password
+# don't hash the password again. Failed logins are never cached. TTL 0 disables it.
+LOGIN_CACHE = {
+    'TTL': int(os.getenv('LOGIN_CACHE_TTL') or 60),
+    'MAX_SIZE': int(os.getenv('LOGIN_CACHE_MAX_SIZE') or 10000),
+}
+
+# The biggest page a client can ask for with ?page_size=N
+API_MAX_PAGE_SIZE = int(os.getenv('API_MAX_PAGE_SIZE') or 100)
+
+# Objects read from the database at once by streamed lists (?stream=1, core/streaming.py)
+API_STREAM_CHUNK_SIZE = int(os.getenv('API_STREAM_CHUNK_SIZE') or 500)
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'message': {'format': '%(message)s'},  # Performance log lines are JSON already
+    },
+    'handlers': {
+        'performance': {'class': 'logging.StreamHandler', 'formatter': 'message'},
+    },
+    'loggers': {
+        'core.performance': {'handlers': ['performance'], 'level': 'INFO', 'propagate': False},
+    },
 }
 
 # Setting to make uploading images to work through browsable API interface
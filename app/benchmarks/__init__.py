@@ -0,0 +1,10 @@
+"""
+Benchmarks for the recipe API.
+
+Run them with: python manage.py benchmark <name>
+Every benchmark seeds its own data inside a transaction, which is rolled back at the end.
+
+The api benchmark is a load test of the whole application (middleware, views, rendering) through its WSGI entrypoint:
+    python manage.py benchmark api --users 4 --recipes 1000 --repeat 200 --scenarios list,filter,create
+It reports p50/p95/p99 latency and queries per request of every scenario (benchmarks/scenarios.py).
+"""
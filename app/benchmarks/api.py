@@ -0,0 +1,59 @@
+"""
+Load test of the API: scenarios sent through the WSGI application, reporting latency percentiles and queries.
+Requests are sent one at a time from this process, so it measures the latency of a single request without any
+contention (no concurrent workers, no network, no nginx), not the throughput of a deployment.
+"""
+import random
+import statistics
+import tempfile
+
+from django.conf import settings
+from django.test import override_settings
+
+from .data import seed
+from .scenarios import SCENARIOS, PASSWORD, BenchmarkUser
+from .utils import percentiles
+from .wsgi import WSGIClient
+
+WARMUP = 3
+
+
+def run(stdout, recipes=1000, repeat=20, users=4, scenarios=None, **options):
+    """ Seed users with recipes and send every scenario's requests round robin between them """
+    names = scenarios.split(',') if scenarios else list(SCENARIOS)
+    unknown = set(names) - set(SCENARIOS)
+    if unknown:
+        stdout.write(f'!!! Unknown scenarios: {", ".join(sorted(unknown))}, choose from {", ".join(SCENARIOS)}')
+        return
+
+    stdout.write(f'Seeding {users} users x {recipes} recipes')
+    bench_users = [BenchmarkUser(user) for user in seed(users=users, recipes=recipes, password=PASSWORD)]
+
+    with tempfile.TemporaryDirectory() as media_root, override_settings(
+        ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver'],
+        # Uploaded images stay in a temporary directory, variants are not generated (they would be by other threads,
+        # outside the benchmark's transaction)
+        MEDIA_ROOT=media_root,
+        RECIPE_IMAGE_PROCESSING='off',
+        # The benchmark's transaction is rolled back, so versions bumped on commit (recipe.cache) never change and
+        # lists cached by earlier requests would be served stale. A shared cache (RESPONSE_CACHE_BACKEND=file) would
+        # also get the benchmark's entries. Every request is measured against the database.
+        CACHES={**settings.CACHES, 'responses': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}},
+    ), WSGIClient() as client:
+        stdout.write(f'{"scenario":<10} {"requests":>8} {"p50 ms":>9} {"p95 ms":>9} {"p99 ms":>9} {"queries":>8}')
+        for name in names:
+            scenario, expected_status = SCENARIOS[name]
+            # Every scenario gets the same random choices, whichever other scenarios are run
+            rng = random.Random(name)
+            results = []
+            for i in range(WARMUP + repeat):
+                result = scenario(client, bench_users[i % len(bench_users)], rng)
+                if result.status != expected_status:
+                    stdout.write(f'!!! {name}: expected {expected_status}, got {result.status}: {result.body[:500]!r}')
+                    return
+                results.append(result)
+
+            results = results[WARMUP:]
+            p50, p95, p99 = percentiles([result.duration for result in results])
+            queries = statistics.mean(result.queries for result in results)
+            stdout.write(f'{name:<10} {len(results):>8} {p50:>9.2f} {p95:>9.2f} {p99:>9.2f} {queries:>8.1f}')
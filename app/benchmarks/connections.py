@@ -0,0 +1,42 @@
+""" Compare per-request latency of new, persistent and pooled database connections """
+import statistics
+
+from django.db import connections
+from django.db.utils import load_backend
+
+from .utils import timeit, summary
+
+MODES = {
+    'new connection per request': {'CONN_MAX_AGE': 0, 'POOL_SIZE': 0},
+    'persistent connection': {'CONN_MAX_AGE': 600, 'POOL_SIZE': 0},
+    'pooled connection': {'CONN_MAX_AGE': 0, 'POOL_SIZE': 4},
+}
+
+
+def make_wrapper(alias, **overrides):
+    """ Return a new connection to the default database, with overridden settings """
+    settings_dict = {**connections['default'].settings_dict, **overrides}
+    return load_backend(settings_dict['ENGINE']).DatabaseWrapper(settings_dict, alias)
+
+
+def simulate_request(wrapper):
+    """ Do what Django does with the connection during a request, which runs one query """
+    wrapper.close_if_unusable_or_obsolete()  # request_started
+    with wrapper.cursor() as cursor:
+        cursor.execute('SELECT 1')
+    wrapper.close_if_unusable_or_obsolete()  # request_finished
+
+
+def run(stdout, repeat=20, **options):
+    """ Time simulated requests in every connection mode """
+    if 'POOL_SIZE' not in connections['default'].settings_dict:
+        stdout.write('The default database doesn\'t use core.db.backends.postgresql, nothing to compare.')
+        return
+
+    for name, overrides in MODES.items():
+        wrapper = make_wrapper(f'benchmark-{name}', **overrides)
+        simulate_request(wrapper)  # Warm up, so the persistent and pooled modes start with an open connection
+        durations = timeit(lambda: simulate_request(wrapper), repeat)
+        wrapper.close()
+        p95 = statistics.quantiles(durations, n=20)[-1] if len(durations) > 1 else durations[0]
+        stdout.write(f'{name}: {summary(durations)}, p95 {p95:.2f} ms')
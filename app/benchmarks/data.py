@@ -0,0 +1,65 @@
+""" Seed realistic benchmark data """
+import random
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+
+from core.models import Recipe, Tag, Ingredient
+from recipe import search, snapshots
+
+
+def pick(rng, items, mean):
+    """ Return about mean items, popular ones (at the start of the list) more often, like real recipes use them """
+    # Fan-out varies from recipe to recipe (0 to 2 * mean) and the i-th item is picked with weight 1 / (i + 1).
+    # Weighted sampling without replacement: every item gets a random key u ** (1 / weight), the biggest keys win.
+    count = min(len(items), rng.randint(0, 2 * mean))
+    keyed = sorted((rng.random() ** (i + 1), i) for i in range(len(items)))
+    return [items[i] for _, i in keyed[len(keyed) - count:]]
+
+
+def seed(users=1, recipes=100, tags=20, ingredients=50, tags_per_recipe=3, ingredients_per_recipe=8,
+         password='benchmark1234', random_seed=0):
+    """ Create users with recipes, tags and ingredients and return the users """
+    rng = random.Random(random_seed)
+    # Hashing is slow on purpose, so we hash the password once and share the hash between all users
+    password_hash = make_password(password)
+    user_objs = get_user_model().objects.bulk_create([
+        get_user_model()(email=f'bench{i}-{rng.random()}@example.com', name=f'Bench {i}', password=password_hash)
+        for i in range(users)
+    ])
+
+    for user in user_objs:
+        user_tags = Tag.objects.bulk_create([Tag(user=user, name=f'Tag {i}') for i in range(tags)])
+        user_ingredients = Ingredient.objects.bulk_create(
+            [Ingredient(user=user, name=f'Ingredient {i}') for i in range(ingredients)]
+        )
+        user_recipes = Recipe.objects.bulk_create([
+            Recipe(
+                user=user,
+                title=f'Recipe {i}',
+                description='Benchmark recipe description. ' * rng.randint(1, 10),
+                time_minutes=rng.randint(5, 240),
+                price=Decimal(rng.randint(100, 9999)) / 100,
+                link='https://example.com/recipe.pdf',
+            )
+            for i in range(recipes)
+        ])
+
+        Recipe.tags.through.objects.bulk_create([
+            Recipe.tags.through(recipe_id=recipe.id, tag_id=tag.id)
+            for recipe in user_recipes
+            for tag in pick(rng, user_tags, tags_per_recipe)
+        ])
+        Recipe.ingredients.through.objects.bulk_create([
+            Recipe.ingredients.through(recipe_id=recipe.id, ingredient_id=ingredient.id)
+            for recipe in user_recipes
+            for ingredient in pick(rng, user_ingredients, ingredients_per_recipe)
+        ])
+
+        # bulk_create() skips the code maintaining denormalized columns, same as the bulk import we do its work here
+        recipe_ids = [recipe.id for recipe in user_recipes]
+        search.update_search_vectors(recipe_ids)
+        snapshots.update_snapshots(recipe_ids)
+
+    return user_objs
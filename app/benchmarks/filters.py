@@ -0,0 +1,39 @@
+""" Compare JOIN + DISTINCT filtering of recipes with the EXISTS filters used by RecipeAttrFilter """
+from django.db import connection
+
+from core.models import Recipe, Tag
+from recipe import filters
+
+from .data import seed
+from .utils import timeit, summary
+
+
+def legacy_queryset(user, tag_ids):
+    """ The way RecipeViewSet used to filter recipes by tags """
+    return Recipe.objects.filter(tags__id__in=tag_ids).filter(user=user).order_by('-id').distinct()
+
+
+def exists_queryset(user, tag_ids, match=filters.MATCH_ANY):
+    """ The way RecipeAttrFilter filters recipes by tags """
+    queryset = Recipe.objects.filter(user=user).order_by('-id')
+    return filters.filter_by_related(queryset, 'tags', tag_ids, match)
+
+
+def run(stdout, recipes=5000, repeat=20, **options):
+    """ Seed a user with recipes and time both filters """
+    user = seed(recipes=recipes, tags=20, tags_per_recipe=4)[0]
+    tag_ids = list(Tag.objects.filter(user=user).values_list('id', flat=True)[:5])
+
+    querysets = {
+        'JOIN + DISTINCT': legacy_queryset(user, tag_ids),
+        'EXISTS (any)': exists_queryset(user, tag_ids),
+        'EXISTS (all)': exists_queryset(user, tag_ids[:2], filters.MATCH_ALL),
+    }
+    # ANALYZE runs the query and shows actual timings, which only Postgres supports
+    explain_options = {'analyze': True} if connection.vendor == 'postgresql' else {}
+
+    for name, queryset in querysets.items():
+        stdout.write(f'--- {name}: {queryset.count()} recipes')
+        stdout.write(queryset.explain(**explain_options))
+        # Evaluate full rows, DISTINCT has to compare the whole recipe row
+        stdout.write(summary(timeit(lambda: list(queryset.all()), repeat)))
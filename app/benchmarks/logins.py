@@ -0,0 +1,41 @@
+""" Compare logins per second per core with every password hasher and with the login cache """
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import get_hashers, make_password
+from django.test import override_settings
+
+from user import authentication
+from user.serializers import AuthTokenSerializer
+
+from .utils import timeit, summary
+
+EMAIL = 'login-benchmark@example.com'
+PASSWORD = 'benchmark1234'
+
+
+def login():
+    """ What CreateTokenView does before it gets the token """
+    serializer = AuthTokenSerializer(data={'email': EMAIL, 'password': PASSWORD}, context={'request': None})
+    serializer.is_valid(raise_exception=True)
+
+
+def report(stdout, name, durations):
+    # One login at a time, so this is the throughput of one core
+    per_second = 1000 / (sum(durations) / len(durations))
+    stdout.write(f'{name}: {summary(durations)}, {per_second:.1f} logins/s per core')
+
+
+def run(stdout, repeat=20, **options):
+    """ Time logins of a user whose password is hashed with each hasher, then repeated logins """
+    user = get_user_model().objects.create_user(email=EMAIL, password=PASSWORD)
+
+    with override_settings(LOGIN_CACHE={'TTL': 0, 'MAX_SIZE': 0}):
+        for hasher in get_hashers():
+            # The password has to stay hashed by this hasher, otherwise the first login would rehash it
+            with override_settings(PASSWORD_HASHERS=[f'{type(hasher).__module__}.{type(hasher).__name__}']):
+                user.password = make_password(PASSWORD, hasher=hasher.algorithm)
+                user.save(update_fields=['password'])
+                report(stdout, f'--- {type(hasher).__name__}', timeit(login, repeat))
+
+    authentication.login_cache.clear()
+    login()  # The first login hashes the password, the rest are served from the cache
+    report(stdout, '--- Repeated login (login cache)', timeit(login, repeat))
@@ -0,0 +1,28 @@
+""" Compare rendering recipe lists with DRF's JSONRenderer and with ORJSONRenderer (core.renderers) """
+from rest_framework.renderers import JSONRenderer
+
+from core.models import Recipe
+from core.renderers import ORJSONRenderer, orjson
+
+from .data import seed
+from .serializers import lean_list
+from .utils import timeit, summary
+
+
+def run(stdout, recipes=10000, repeat=20, **options):
+    """ Seed a user with recipes and time rendering the list with both renderers """
+    if orjson is None:
+        stdout.write('!!! orjson is not installed, ORJSONRenderer is the same as JSONRenderer')
+        return
+
+    user = seed(recipes=recipes)[0]
+    data = lean_list(Recipe.objects.filter(user=user).order_by('-id'))
+
+    # Rendered output has to be the same, byte for byte
+    if JSONRenderer().render(data) != ORJSONRenderer().render(data):
+        stdout.write('!!! ORJSONRenderer output differs from the JSONRenderer output')
+        return
+
+    for renderer in [JSONRenderer(), ORJSONRenderer()]:
+        stdout.write(f'--- {type(renderer).__name__}: {len(data)} recipes, {len(renderer.render(data))} bytes')
+        stdout.write(summary(timeit(lambda: renderer.render(data), repeat)))
@@ -0,0 +1,86 @@
+""" Requests sent by the api benchmark, every scenario is one kind of request a client makes """
+import io
+import json
+
+from django.urls import reverse
+from PIL import Image
+from rest_framework.authtoken.models import Token
+
+from core.models import Recipe, Tag, Ingredient
+
+PASSWORD = 'benchmark1234'
+PAGE_SIZE = 50
+
+
+class BenchmarkUser:
+    """ A seeded user with everything the scenarios need to know about their data """
+
+    def __init__(self, user):
+        self.email = user.email
+        self.token = Token.objects.create(user=user).key
+        self.recipe_ids = list(Recipe.objects.filter(user=user).values_list('id', flat=True))
+        self.tags = dict(Tag.objects.filter(user=user).values_list('id', 'name'))
+        self.ingredients = dict(Ingredient.objects.filter(user=user).values_list('id', 'name'))
+
+
+def list_recipes(client, user, rng):
+    """ First page of the recipe list """
+    return client.request('get', reverse('recipe:recipe-list'), user.token, data={'page_size': PAGE_SIZE})
+
+
+def filter_recipes(client, user, rng):
+    """ Recipes with any of two tags and all of two ingredients """
+    tags, ingredients = rng.sample(list(user.tags), 2), rng.sample(list(user.ingredients), 2)
+    data = {
+        'tags': ','.join(map(str, tags)),
+        'ingredients': ','.join(map(str, ingredients)),
+        'ingredients_match': 'all',
+        'page_size': PAGE_SIZE,
+    }
+    return client.request('get', reverse('recipe:recipe-list'), user.token, data=data)
+
+
+def create_recipe(client, user, rng):
+    """ New recipe with mostly existing tags and ingredients, and a new one of each """
+    payload = {
+        'title': f'Benchmark recipe {rng.random()}',
+        'time_minutes': rng.randint(5, 240),
+        'price': f'{rng.randint(100, 9999) / 100:.2f}',
+        'tags': [{'name': name} for name in rng.sample(list(user.tags.values()), 2)] + [{'name': f'Tag {rng.random()}'}],
+        'ingredients': [{'name': name} for name in rng.sample(list(user.ingredients.values()), 7)] + [{'name': f'Ingredient {rng.random()}'}],
+    }
+    return client.request('post', reverse('recipe:recipe-list'), user.token, data=json.dumps(payload), content_type='application/json')
+
+
+def update_recipe(client, user, rng):
+    """ Changed title and tags of an existing recipe """
+    payload = {'title': f'Updated recipe {rng.random()}', 'tags': [{'name': name} for name in rng.sample(list(user.tags.values()), 3)]}
+    path = reverse('recipe:recipe-detail', args=[rng.choice(user.recipe_ids)])
+    return client.request('patch', path, user.token, data=json.dumps(payload), content_type='application/json')
+
+
+def token_auth(client, user, rng):
+    """ Log in with email and password """
+    return client.request('post', reverse('user:token'), data={'email': user.email, 'password': PASSWORD})
+
+
+def upload_image(client, user, rng):
+    """ Upload a small JPEG photo to a recipe """
+    image = io.BytesIO()
+    # A different image every time, uploads of the same content are stored only once
+    Image.new('RGB', (800, 600), tuple(rng.randrange(256) for _ in range(3))).save(image, format='JPEG')
+    image.name = 'photo.jpg'
+    image.seek(0)
+    path = reverse('recipe:recipe-upload-image', args=[rng.choice(user.recipe_ids)])
+    return client.request('post', path, user.token, data={'image': image})
+
+
+# Name -> (scenario, expected status)
+SCENARIOS = {
+    'list': (list_recipes, 200),
+    'filter': (filter_recipes, 200),
+    'create': (create_recipe, 201),
+    'update': (update_recipe, 200),
+    'token': (token_auth, 200),
+    'upload': (upload_image, 200),
+}
@@ -0,0 +1,57 @@
+""" Compare serializing recipe lists with RecipeSerializer and with the lean read path (core.lean) """
+from django.db.models import Prefetch
+from rest_framework.renderers import JSONRenderer
+
+from core import lean
+from core.models import Recipe, Tag, Ingredient
+from recipe import snapshots
+from recipe.serializers import RecipeSerializer
+
+from .data import seed
+from .utils import timeit, summary
+
+
+def serializer_list(queryset):
+    """ The way ListModelMixin lists recipes """
+    queryset = queryset.prefetch_related(
+        Prefetch('tags', queryset=Tag.objects.order_by('pk')), Prefetch('ingredients', queryset=Ingredient.objects.order_by('pk'))
+    )
+    return RecipeSerializer(queryset, many=True).data
+
+
+def lean_list(queryset):
+    """ The way LeanListMixin lists recipes """
+    serializer = RecipeSerializer()
+    rows = lean.load_nested(list(lean.lean_values(queryset, serializer)), Recipe, serializer)
+    to_representation = lean.compile_representation(serializer)
+    return [to_representation(row) for row in rows]
+
+
+def snapshot_list(queryset):
+    """ The way LeanListMixin lists recipes with their nested snapshots (recipe.snapshots) """
+    serializer = RecipeSerializer()
+    rows = list(lean.lean_values(queryset, serializer, extra=['nested_snapshot']))
+    for row in rows:
+        row.update(row['nested_snapshot'])
+    to_representation = lean.compile_representation(serializer)
+    return [to_representation(row) for row in rows]
+
+
+def run(stdout, recipes=10000, repeat=20, **options):
+    """ Seed a user with recipes and time both ways of listing them """
+    user = seed(recipes=recipes)[0]
+    queryset = Recipe.objects.filter(user=user).order_by('-id')
+
+    snapshots.update_snapshots(list(queryset.values_list('id', flat=True)))
+
+    renderer = JSONRenderer()
+    # Rendered output has to be the same, byte for byte
+    expected = renderer.render(serializer_list(queryset))
+    if expected != renderer.render(lean_list(queryset)) or expected != renderer.render(snapshot_list(queryset)):
+        stdout.write('!!! Lean output differs from the serializer output')
+        return
+
+    funcs = [('RecipeSerializer', serializer_list), ('Lean (values + compiled)', lean_list), ('Lean with snapshots', snapshot_list)]
+    for name, func in funcs:
+        stdout.write(f'--- {name}: {queryset.count()} recipes, queries + serialization')
+        stdout.write(summary(timeit(lambda: func(queryset), repeat)))
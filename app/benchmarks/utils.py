@@ -0,0 +1,26 @@
+""" Helpers shared by the benchmarks """
+import statistics
+import time
+
+
+def timeit(func, repeat=20):
+    """ Call func repeat times and return the list of durations in milliseconds """
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        durations.append((time.perf_counter() - start) * 1000)
+    return durations
+
+
+def summary(durations):
+    """ Return a one line summary (median, min, max) of durations in milliseconds """
+    return f'median {statistics.median(durations):.2f} ms, min {min(durations):.2f} ms, max {max(durations):.2f} ms'
+
+
+def percentiles(durations):
+    """ Return p50, p95 and p99 of durations """
+    if len(durations) < 2:
+        return durations * 3
+    cuts = statistics.quantiles(durations, n=100, method='inclusive')
+    return cuts[49], cuts[94], cuts[98]
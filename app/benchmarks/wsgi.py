@@ -0,0 +1,60 @@
+""" Call the WSGI application the way uWSGI does, measuring every request """
+import time
+
+from django.core.signals import request_started, request_finished
+from django.core.wsgi import get_wsgi_application
+from django.db import close_old_connections, connections
+from django.test import RequestFactory
+
+from core.middleware import RequestMetrics
+
+
+class Result:
+    """ Status, duration (ms) and number of queries of a request """
+
+    def __init__(self, status, body, duration, queries):
+        self.status = status
+        self.body = body
+        self.duration = duration
+        self.queries = queries
+
+
+class WSGIClient:
+    """ Send requests through app.wsgi's application: all the middleware, URL routing, views and rendering """
+
+    def __init__(self):
+        self.application = get_wsgi_application()
+        self.factory = RequestFactory()
+
+    # Django closes the database connection at the start and end of every request, which would also end the
+    # transaction the benchmark data lives in. The test client disconnects these handlers the same way.
+    def __enter__(self):
+        request_started.disconnect(close_old_connections)
+        request_finished.disconnect(close_old_connections)
+        return self
+
+    def __exit__(self, *exc_info):
+        request_started.connect(close_old_connections)
+        request_finished.connect(close_old_connections)
+
+    def request(self, method, path, token=None, **kwargs):
+        """ Send a request, kwargs are the ones of the RequestFactory method (data, content_type, ...) """
+        if token is not None:
+            kwargs['HTTP_AUTHORIZATION'] = f'Token {token}'
+        environ = getattr(self.factory, method)(path, **kwargs).environ
+        metrics = RequestMetrics()
+        status = []
+
+        def start_response(status_line, headers, exc_info=None):
+            status.append(int(status_line.split()[0]))
+
+        with connections['default'].execute_wrapper(metrics):
+            start = time.perf_counter()
+            response = self.application(environ, start_response)
+            try:
+                body = b''.join(response)  # Streaming responses are produced while they are read
+            finally:
+                response.close()
+            duration = (time.perf_counter() - start) * 1000
+
+        return Result(status[0], body, duration, metrics.queries)
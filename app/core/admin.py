@@ -3,6 +3,7 @@ from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
 from django.utils.translation import gettext_lazy as _  # Future-proof if we wanted to translate the project
 from core import models
+from recipe import search, snapshots
 
 
 # BaseUserAdmin gives us some predefined auth, like requiring passwords and username.
@@ -26,7 +27,18 @@ class UserAdmin(BaseUserAdmin):
     )
 
 
+class RecipeAdmin(admin.ModelAdmin):
+    """ Define the admin pages for recipes """
+
+    def save_related(self, request, form, formsets, change):
+        # Tags and ingredients are saved after the recipe, search vector and the snapshot include their names
+        snapshots.keep_snapshot(form.instance)
+        super().save_related(request, form, formsets, change)
+        search.update_search_vectors([form.instance.id])
+        snapshots.update_snapshots([form.instance.id])
+
+
 admin.site.register(models.User, UserAdmin)
-admin.site.register(models.Recipe)
+admin.site.register(models.Recipe, RecipeAdmin)
 admin.site.register(models.Tag)
 admin.site.register(models.Ingredient)
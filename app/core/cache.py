@@ -0,0 +1,55 @@
+""" In-process caches """
+import threading
+import time
+from collections import OrderedDict
+
+
+class TTLCache:
+    """ Thread safe LRU cache, which also expires entries ttl seconds after they were set """
+
+    def __init__(self, max_size=1024, ttl=60):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()  # key -> (value, expires_at), least recently used first
+        # uWSGI runs with --enable-threads, so more than one request can use the cache at the same time
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        """ Return the value for key, or default if it's missing or expired """
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None and item[1] < time.monotonic():
+                del self._data[key]
+                item = None
+
+            if item is None:
+                self.misses += 1
+                return default
+
+            self._data.move_to_end(key)
+            self.hits += 1
+            return item[0]
+
+    def set(self, key, value):
+        """ Store value for key, evicting the least recently used entries above max_size """
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        """ Remove key from the cache """
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        """ Remove all entries and reset the counters """
+        with self._lock:
+            self._data.clear()
+            self.hits = self.misses = 0
+
+    def __len__(self):
+        return len(self._data)
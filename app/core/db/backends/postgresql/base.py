@@ -0,0 +1,98 @@
+"""
+PostgreSQL backend with connection health checks and an optional connection pool.
+
+Extra keys in settings.DATABASES:
+    CONN_HEALTH_CHECKS - Check that a persistent connection still works before the first query of every request,
+                         the same as the setting added in Django 4.1.
+    POOL_SIZE - Max number of idle connections kept per worker process, 0 disables the pool.
+"""
+import functools
+import threading
+
+from django.db.backends.postgresql import base
+from psycopg2 import extensions
+
+from core.db.pool import ConnectionPool
+
+_pools = {}  # (NAME, USER, HOST, PORT) -> ConnectionPool, shared by all threads of the process
+_pools_lock = threading.Lock()
+
+
+def _is_reusable(connection):
+    """ Return True if connection can go back to the pool """
+    if connection.closed:
+        return False
+    # Only connections outside of any transaction. One left in a transaction (or an aborted one) by a failed
+    # request could carry its locks or SET LOCAL settings into the next request, so it's closed instead.
+    return connection.get_transaction_status() == extensions.TRANSACTION_STATUS_IDLE
+
+
+def _is_alive(connection):
+    """ Run a trivial query to make sure the connection is still alive """
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT 1')
+        return True
+    except base.Database.Error:
+        return False
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.health_check_done = False
+        self.connection_pool = None  # Pool the current connection was taken from
+
+    def _get_pool(self):
+        """ Return the connection pool of this database, or None if pooling is disabled """
+        size = self.settings_dict.get('POOL_SIZE') or 0
+        if not size:
+            return None
+
+        # Tests switch NAME to the test database, so connections are pooled per target, not just per alias
+        key = tuple(self.settings_dict[name] for name in ['NAME', 'USER', 'HOST', 'PORT'])
+        with _pools_lock:
+            if key not in _pools:
+                _pools[key] = ConnectionPool(size, _is_reusable)
+            return _pools[key]
+
+    def get_new_connection(self, conn_params):
+        self.connection_pool = self._get_pool()
+        if self.connection_pool is None:
+            return super().get_new_connection(conn_params)
+
+        connect = functools.partial(super().get_new_connection, conn_params)
+        check = _is_alive if self.settings_dict.get('CONN_HEALTH_CHECKS') else None
+        return self.connection_pool.get(connect, check)
+
+    def _close(self):
+        if self.connection is None or self.connection_pool is None:
+            return super()._close()
+
+        # Closing a pooled connection gives it back to the pool, the next request will reuse it
+        with self.wrap_database_errors:
+            self.connection_pool.put(self.connection)
+
+    def connect(self):
+        super().connect()
+        # A new connection doesn't need a health check
+        self.health_check_done = True
+
+    def ensure_connection(self):
+        self._close_if_health_check_failed()
+        super().ensure_connection()
+
+    def _close_if_health_check_failed(self):
+        """ Close a persistent connection, if it stopped working since the last request (e.g. database restart) """
+        if self.connection is None or self.health_check_done or not self.settings_dict.get('CONN_HEALTH_CHECKS'):
+            return
+
+        if not self.is_usable():
+            self.close()
+        self.health_check_done = True
+
+    def close_if_unusable_or_obsolete(self):
+        # Django calls this at the start and the end of every request, so the next request checks the connection again
+        super().close_if_unusable_or_obsolete()
+        self.health_check_done = False
@@ -0,0 +1,55 @@
+""" In-process pool of database connections """
+import threading
+
+
+class ConnectionPool:
+    """
+    Thread safe pool of idle connections.
+    It never blocks: when there is no idle connection a new one is opened, and connections returned above
+    max_idle are closed. That makes it safe for any number of uWSGI threads.
+    """
+
+    def __init__(self, max_idle, is_reusable):
+        self.max_idle = max_idle
+        self.is_reusable = is_reusable  # Called with a returned connection, False closes it instead of pooling it
+        self._idle = []
+        self._lock = threading.Lock()
+
+    def get(self, connect, check=None):
+        """ Return an idle connection (which passes check, if given) or a new one from connect() """
+        while True:
+            with self._lock:
+                connection = self._idle.pop() if self._idle else None
+            if connection is None:
+                return connect()
+            if check is None or check(connection):
+                return connection
+            self._discard(connection)
+
+    def put(self, connection):
+        """ Return connection to the pool """
+        if not self.is_reusable(connection):
+            self._discard(connection)
+            return
+
+        with self._lock:
+            if len(self._idle) < self.max_idle:
+                self._idle.append(connection)
+                return
+        self._discard(connection)
+
+    def close_all(self):
+        """ Close all idle connections """
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for connection in idle:
+            self._discard(connection)
+
+    def _discard(self, connection):
+        try:
+            connection.close()
+        except Exception:
+            pass  # It's most likely already broken, that's why we are discarding it
+
+    def __len__(self):
+        return len(self._idle)
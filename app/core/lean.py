@@ -0,0 +1,119 @@
+""" Lean read path: serializer output built from values() rows, without model instances or serializer machinery """
+from django.core.exceptions import ImproperlyConfigured
+from rest_framework import serializers
+from rest_framework.response import Response
+
+from core.middleware import serializing
+
+# Fields whose to_representation() returns database values unchanged (int(int), str(str))
+PASSTHROUGH_FIELDS = (serializers.IntegerField, serializers.CharField)
+# Fields which need model instances (files, other objects, methods), the lean path can't produce them
+UNSUPPORTED_FIELDS = (serializers.FileField, serializers.RelatedField, serializers.ManyRelatedField, serializers.SerializerMethodField)
+
+_compiled = {}
+
+
+def _readable_fields(serializer):
+    fields = list(serializer._readable_fields)
+    for field in fields:
+        if isinstance(field, UNSUPPORTED_FIELDS) or field.source != field.field_name \
+                or (isinstance(field, serializers.BaseSerializer) and not isinstance(field, serializers.ListSerializer)):
+            raise ImproperlyConfigured(f'{type(serializer).__name__}.{field.field_name} is not supported by the lean read path.')
+    return fields
+
+
+def compile_representation(serializer):
+    """ Return a function turning a row dict into the same data serializer.to_representation() returns """
+    serializer_class = type(serializer)
+    if serializer_class in _compiled:
+        return _compiled[serializer_class]
+
+    # The function is generated as source code, so converting a row is a single dict display without any loops,
+    # attribute lookups or calls for the fields which don't need converting
+    namespace, items = {}, []
+    for i, field in enumerate(_readable_fields(serializer)):
+        key = repr(field.field_name)
+        if isinstance(field, serializers.ListSerializer):
+            namespace[f'convert{i}'] = compile_representation(field.child)
+            value = f'[convert{i}(item) for item in row[{key}]]'
+        elif isinstance(field, PASSTHROUGH_FIELDS):
+            value = f'row[{key}]'
+        else:
+            # e.g. DecimalField, the field formats the value itself, so the output is the same
+            namespace[f'convert{i}'] = field.to_representation
+            value = f'(None if row[{key}] is None else convert{i}(row[{key}]))'
+        items.append(f'{key}: {value}')
+
+    source = f'def to_representation(row):\n    return {{{", ".join(items)}}}\n'
+    exec(compile(source, f'<lean {serializer_class.__name__}>', 'exec'), namespace)
+    _compiled[serializer_class] = namespace['to_representation']
+    return namespace['to_representation']
+
+
+def lean_values(queryset, serializer, extra=()):
+    """ Return the queryset as values() with the columns the serializer (and the queryset's ordering) needs """
+    names = [field.field_name for field in _readable_fields(serializer) if not isinstance(field, serializers.ListSerializer)]
+    names += [name for name in extra if name not in names]
+    # Ordering fields (e.g. search_rank) are needed by the pagination cursor
+    ordering = [name.lstrip('-') for name in queryset.query.order_by if isinstance(name, str)]
+    names += [name for name in [queryset.model._meta.pk.attname, *ordering] if name not in names]
+    return queryset.prefetch_related(None).values(*names)
+
+
+def load_nested(rows, model, serializer):
+    """ Add rows of the serializer's nested many-to-many fields to the rows, one query per field """
+    pk = model._meta.pk.attname
+    rows_by_pk = {row[pk]: row for row in rows}
+    for field in _readable_fields(serializer):
+        if not isinstance(field, serializers.ListSerializer):
+            continue
+
+        for row in rows:
+            row[field.field_name] = []
+        if not rows:
+            continue
+
+        m2m = model._meta.get_field(field.field_name)
+        source, target = m2m.m2m_field_name(), m2m.m2m_reverse_field_name()
+        child_names = [child.field_name for child in _readable_fields(field.child)]
+        # Same order as the prefetch in the regular path, by the related object's primary key
+        related = (
+            m2m.remote_field.through.objects.filter(**{f'{source}_id__in': rows_by_pk}).order_by(f'{target}_id')
+            .values_list(f'{source}_id', *[f'{target}__{name}' for name in child_names])
+        )
+        for row_pk, *values in related:
+            rows_by_pk[row_pk][field.field_name].append(dict(zip(child_names, values)))
+    return rows
+
+
+class LeanListMixin:
+    """ List objects from values() rows with a compiled representation of the serializer """
+    # Output is the same as the serializer's, but objects, serializer fields and nested serializers are never
+    # created for the rows. Only for serializers with plain model fields and nested many-to-many serializers.
+
+    def get_snapshot_field(self):
+        """ Return the name of a JSON field with the nested rows already in it, or None to always load them """
+        return None
+
+    def list(self, request, *args, **kwargs):
+        serializer = self.get_serializer()
+        snapshot_field = self.get_snapshot_field()
+        queryset = lean_values(self.filter_queryset(self.get_queryset()), serializer, extra=[snapshot_field] if snapshot_field else [])
+
+        page = self.paginate_queryset(queryset)
+        rows = list(queryset) if page is None else page
+        if snapshot_field:
+            # Only rows without a snapshot (NULL) load their nested rows from the related tables
+            for row in rows:
+                row.update(row[snapshot_field] or {})
+            rows_to_load = [row for row in rows if row[snapshot_field] is None]
+        else:
+            rows_to_load = rows
+        load_nested(rows_to_load, queryset.model, serializer)
+        to_representation = compile_representation(serializer)
+        with serializing(request):
+            data = [to_representation(row) for row in rows]
+
+        if page is not None:
+            return self.get_paginated_response(data)
+        return Response(data)
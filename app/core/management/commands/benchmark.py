@@ -0,0 +1,29 @@
+"""
+Django command to run a benchmark from the benchmarks package
+"""
+import importlib
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+BENCHMARKS = ['filters', 'connections', 'serializers', 'renderers', 'api', 'logins']
+
+
+class Command(BaseCommand):
+    """ Django command to run a benchmark """
+    help = 'Run a benchmark. Seeded data is rolled back afterwards.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('name', choices=BENCHMARKS)
+        parser.add_argument('--recipes', type=int, default=5000, help='Number of recipes to seed per user')
+        parser.add_argument('--repeat', type=int, default=20, help='Number of timed runs')
+        parser.add_argument('--users', type=int, default=4, help='Number of users to seed (api)')
+        parser.add_argument('--scenarios', help='Comma separated scenarios to run, all by default (api)')
+
+    def handle(self, *args, **options):
+        """ Entrypoint for command """
+        benchmark = importlib.import_module(f'benchmarks.{options["name"]}')
+        with transaction.atomic():
+            benchmark.run(self.stdout, **options)
+            # We never want to keep the benchmark data in the database
+            transaction.set_rollback(True)
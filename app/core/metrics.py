@@ -0,0 +1,59 @@
+""" Prometheus metrics of the API, aggregated across uWSGI workers """
+import hmac
+import os
+
+from django.conf import settings
+from django.http import Http404, HttpResponse
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram, generate_latest, multiprocess
+
+# With PROMETHEUS_MULTIPROC_DIR set (scripts/run.sh), every worker process writes its values to memory-mapped files
+# in that directory, and /metrics sums up the files of all the workers. Without it (runserver, tests), values are
+# kept in the process.
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 3, 4, 5, 8, 13, 21, 34, 55, 100)
+
+# Views are labeled by their class and action (e.g. RecipeViewSet.list), see core.middleware.get_view_name
+REQUEST_DURATION = Histogram(
+    'api_request_duration_seconds', 'Time to handle a request', ['view', 'method', 'status'], buckets=LATENCY_BUCKETS
+)
+REQUEST_DB_QUERIES = Histogram('api_request_db_queries', 'SQL queries run by a request', ['view'], buckets=QUERY_BUCKETS)
+REQUEST_DB_DURATION = Histogram('api_request_db_duration_seconds', 'Time a request spent in SQL', ['view'], buckets=LATENCY_BUCKETS)
+CACHE_REQUESTS = Counter('api_cache_requests', 'Cache lookups by result (hit or miss)', ['cache', 'result'])
+
+# Token of .env.sample, anyone could use it
+PLACEHOLDER_TOKEN = 'changeme'
+
+
+def record_request(view, method, status, duration, queries, sql_time):
+    """ Record a handled request, durations are in seconds """
+    view = view or 'unmatched'  # 404s not matching any URL
+    REQUEST_DURATION.labels(view, method, status).observe(duration)
+    REQUEST_DB_QUERIES.labels(view).observe(queries)
+    REQUEST_DB_DURATION.labels(view).observe(sql_time)
+
+
+def count_cache(cache, hit):
+    """ Record a lookup in one of the caches (responses, tokens, ...) """
+    CACHE_REQUESTS.labels(cache, 'hit' if hit else 'miss').inc()
+
+
+def _registry():
+    if 'PROMETHEUS_MULTIPROC_DIR' not in os.environ:
+        return REGISTRY
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return registry
+
+
+def metrics_view(request):
+    """ Return all metrics in the Prometheus text format """
+    # Bearer token, nginx makes the endpoint reachable from outside. Without a token (or with the sample's
+    # placeholder) it would publish the metrics to everyone, so the endpoint is off until a token is set.
+    token = settings.METRICS_TOKEN
+    if not settings.PROMETHEUS_METRICS or not token or token == PLACEHOLDER_TOKEN:
+        raise Http404
+    # compare_digest() only takes ASCII str, so a header with other characters would raise TypeError, compare bytes
+    authorization = request.headers.get('Authorization', '').encode()
+    if not hmac.compare_digest(authorization, f'Bearer {token}'.encode()):
+        return HttpResponse(status=401, headers={'WWW-Authenticate': 'Bearer'})
+    return HttpResponse(generate_latest(_registry()), content_type=CONTENT_TYPE_LATEST)
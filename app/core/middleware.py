@@ -0,0 +1,183 @@
+""" Per-request performance metrics: SQL queries, view, serialization and rendering time """
+import json
+import logging
+import time
+from contextlib import ExitStack, contextmanager, nullcontext
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+from core import metrics as prometheus
+
+logger = logging.getLogger('core.performance')
+
+
+class RequestMetrics:
+    """ Queries and timings of one request, also a database execute wrapper counting the queries """
+
+    def __init__(self):
+        self.queries = 0
+        self.sql_time = 0.0
+        self.serialize_time = 0.0
+        self._serializing = False
+        self.view_name = None
+        # Mark -> (wall clock, SQL time so far, serialization time so far),
+        # marks are request -> view -> render -> rendered -> end
+        self.marks = {}
+        self.mark('request')
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql_time += time.perf_counter() - start
+            self.queries += 1
+
+    def mark(self, phase):
+        """ Record the start (or end) of a phase of the request, the first time it's reached """
+        self.marks.setdefault(phase, (time.perf_counter(), self.sql_time, self.serialize_time))
+
+    @contextmanager
+    def serializing(self):
+        """ Count the time spent in the block as serialization, except its SQL (e.g. relations loaded lazily) """
+        if self._serializing:
+            # Nested serializers (and lists of them) are part of the outermost one's time
+            yield
+            return
+        self._serializing = True
+        start, start_sql = time.perf_counter(), self.sql_time
+        try:
+            yield
+        finally:
+            self._serializing = False
+            self.serialize_time += (time.perf_counter() - start) - (self.sql_time - start_sql)
+
+    def _python_time(self, start, end):
+        """ Return seconds between two marks spent outside SQL and serialization, or None if the phase didn't happen """
+        if start not in self.marks or end not in self.marks:
+            return None
+        (start_time, start_sql, start_serialize), (end_time, end_sql, end_serialize) = self.marks[start], self.marks[end]
+        return (end_time - start_time) - (end_sql - start_sql) - (end_serialize - start_serialize)
+
+    def total_time(self):
+        """ Return seconds from the start to the end of the request """
+        return self.marks['end'][0] - self.marks['request'][0]
+
+    def timings(self):
+        """ Return durations in milliseconds: db (all SQL), view, serialize and render (without SQL) and total """
+        durations = {
+            'db': self.sql_time,
+            # The view's Python time: authentication, filtering, ... but not serialization, which has its own entry
+            'view': self._python_time('view', 'render'),
+            # serializer.data and the lean read path's row conversion, also while a streaming response is sent
+            'serialize': self.serialize_time,
+            'render': self._python_time('render', 'rendered'),
+            'total': self.total_time(),
+        }
+        return {name: round(seconds * 1000, 2) for name, seconds in durations.items() if seconds is not None}
+
+
+def serializing(request):
+    """ Return a context manager timing serialization in the request's metrics, if they are recorded """
+    # request is a Django or DRF request (which proxies attributes of Django's), or None in serializers used without one
+    metrics = getattr(request, 'performance', None)
+    return metrics.serializing() if metrics is not None else nullcontext()
+
+
+def get_view_name(view_func, method):
+    """ Return a view's name for metrics, e.g. RecipeViewSet.list """
+    view_class = getattr(view_func, 'cls', None)  # Set by DRF's as_view()
+    if view_class is None:
+        return f'{view_func.__module__}.{view_func.__name__}'
+    # Viewsets map HTTP methods to their actions
+    action = (getattr(view_func, 'actions', None) or {}).get(method.lower(), method.lower())
+    return f'{view_class.__name__}.{action}'
+
+
+class PerformanceMiddleware:
+    """ Report queries and timings of every request in the Server-Timing header and in a JSON log line """
+    # Enabled by PERFORMANCE_METRICS=1 (headers and log lines) and by PROMETHEUS_METRICS=1 (/metrics, core.metrics).
+    # With neither of them, Django drops the middleware when it starts.
+
+    def __init__(self, get_response):
+        self.report = settings.PERFORMANCE_METRICS
+        self.export = settings.PROMETHEUS_METRICS
+        if not self.report and not self.export:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    @staticmethod
+    def counting(metrics):
+        """ Return a context manager counting the queries of all connections in the metrics """
+        stack = ExitStack()
+        # Connections are per thread, so only this request's queries are counted
+        for alias in connections:
+            stack.enter_context(connections[alias].execute_wrapper(metrics))
+        return stack
+
+    def __call__(self, request):
+        metrics = request.performance = RequestMetrics()
+        with self.counting(metrics):
+            response = self.get_response(request)
+
+        if response.streaming:
+            # The stream's queries and serialization run while the server sends it, after we've returned. Its render
+            # phase is sending the stream, it's reported (logged and exported, headers are already sent) at its end.
+            metrics.mark('render')
+            response.streaming_content = self.stream(request, response, response.streaming_content, metrics)
+            return response
+
+        # Views returning HttpResponse have no render phase
+        for mark in ['render', 'rendered', 'end']:
+            metrics.mark(mark)
+        self.finish(request, response, metrics)
+        return response
+
+    def stream(self, request, response, content, metrics):
+        """ Yield the streaming response's content counting its queries, then report the request """
+        # The WSGI server closes the response (and so this generator) even if the client goes away early
+        try:
+            with self.counting(metrics):
+                yield from content
+        finally:
+            for mark in ['rendered', 'end']:
+                metrics.mark(mark)
+            self.finish(request, response, metrics)
+
+    def finish(self, request, response, metrics):
+        """ Export and report the finished request """
+        if self.export:
+            prometheus.record_request(
+                metrics.view_name, request.method, response.status_code, metrics.total_time(), metrics.queries, metrics.sql_time
+            )
+        if self.report:
+            self.report_metrics(request, response, metrics)
+        return response
+
+    def report_metrics(self, request, response, metrics):
+        """ Add the Server-Timing header (except to streaming responses, already sent) and log the request """
+        timings = metrics.timings()
+        if not response.streaming:
+            response['Server-Timing'] = ', '.join(
+                f'{name};dur={duration}' + (f';desc="{metrics.queries} queries"' if name == 'db' else '') for name, duration in timings.items()
+            )
+        logger.info(json.dumps({
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'view': metrics.view_name,
+            'queries': metrics.queries,
+            **{f'{name}_ms': duration for name, duration in timings.items()},
+        }))
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.performance.view_name = get_view_name(view_func, request.method)
+        request.performance.mark('view')
+
+    def process_template_response(self, request, response):
+        # DRF responses are rendered after the view has returned, and after this hook
+        request.performance.mark('render')
+        response.add_post_render_callback(lambda response: request.performance.mark('rendered'))
+        return response
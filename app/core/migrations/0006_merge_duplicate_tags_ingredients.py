@@ -0,0 +1,44 @@
+# Generated by Django 4.0.10 on 2026-10-17 06:50
+
+from django.db import migrations
+from django.db.models import Count, Min
+
+
+def merge_duplicates(apps, schema_editor):
+    """ Merge tags/ingredients with the same user and name into the oldest one, before making them unique """
+    Recipe = apps.get_model('core', 'Recipe')
+
+    for field_name in ['tags', 'ingredients']:
+        field = Recipe._meta.get_field(field_name)
+        model = field.related_model
+        through = field.remote_field.through
+        column = f'{field.m2m_reverse_field_name()}_id'
+
+        duplicates = (
+            model.objects.values('user_id', 'name')
+            .annotate(count=Count('id'), keep_id=Min('id'))
+            .filter(count__gt=1)
+        )
+        for duplicate in duplicates:
+            extra_ids = list(
+                model.objects.filter(user_id=duplicate['user_id'], name=duplicate['name'])
+                .exclude(id=duplicate['keep_id'])
+                .values_list('id', flat=True)
+            )
+            recipe_ids = set(through.objects.filter(**{f'{column}__in': extra_ids}).values_list('recipe_id', flat=True))
+            through.objects.bulk_create(
+                [through(recipe_id=recipe_id, **{column: duplicate['keep_id']}) for recipe_id in recipe_ids],
+                ignore_conflicts=True,
+            )
+            model.objects.filter(id__in=extra_ids).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_recipe_image'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicates, migrations.RunPython.noop),
+    ]
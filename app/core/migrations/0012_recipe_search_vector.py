@@ -0,0 +1,47 @@
+# Generated by Django 4.0.10 on 2026-10-17 07:13
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+# Same weights and configuration as recipe.search.update_search_vectors
+FILL_SEARCH_VECTORS = """
+UPDATE core_recipe SET search_vector =
+    setweight(to_tsvector('english', title), 'A')
+    || setweight(to_tsvector('english', concat_ws(' ',
+        (SELECT string_agg(t.name, ' ') FROM core_tag t JOIN core_recipe_tags rt ON rt.tag_id = t.id WHERE rt.recipe_id = core_recipe.id),
+        (SELECT string_agg(i.name, ' ') FROM core_ingredient i JOIN core_recipe_ingredients ri ON ri.ingredient_id = i.id
+         WHERE ri.recipe_id = core_recipe.id)
+    )), 'B')
+    || setweight(to_tsvector('english', description), 'C')
+"""
+
+
+def create_search_index(apps, schema_editor):
+    """ Fill search vectors of existing recipes and index them (Postgres only) """
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(FILL_SEARCH_VECTORS)
+    schema_editor.execute('CREATE INDEX recipe_search_vector_idx ON core_recipe USING gin (search_vector)')
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP INDEX IF EXISTS recipe_search_vector_idx')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_recipe_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        # GinIndex in Meta.indexes would break migrations on other databases (SQLite in development)
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 4.0.10 on 2026-10-17 07:20
+
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+TABLES = ['core_tag', 'core_ingredient']
+
+
+def create_trigram_indexes(apps, schema_editor):
+    """ Index names of tags and ingredients for autocomplete (Postgres only) """
+    # Same expression as the istartswith lookup, so the index also serves case-insensitive prefix searches
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for table in TABLES:
+        schema_editor.execute(f'CREATE INDEX {table}_name_trgm_idx ON {table} USING gin (upper(name::text) gin_trgm_ops)')
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for table in TABLES:
+        schema_editor.execute(f'DROP INDEX IF EXISTS {table}_name_trgm_idx')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_recipe_search_vector'),
+    ]
+
+    operations = [
+        # Does nothing on other databases
+        TrigramExtension(),
+        # GinIndex in Meta.indexes would break migrations on other databases (SQLite in development)
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
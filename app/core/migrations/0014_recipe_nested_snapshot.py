@@ -0,0 +1,18 @@
+# Generated by Django 4.0.10 on 2026-10-17 07:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_tag_ingredient_name_trigram'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='nested_snapshot',
+            field=models.JSONField(editable=False, null=True),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.0.10 on 2026-10-17 08:26
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_recipe_nested_snapshot'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='recipe',
+            name='recipe_image_idx',
+        ),
+    ]
@@ -1,19 +1,23 @@
 """ Database models """
-import uuid
 import os
 
 from django.db import models
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager, PermissionsMixin
 from django.conf import settings
+from django.contrib.postgres.search import SearchVectorField
+
+from core.storage import ContentAddressedStorage, file_digest
 
 
 def recipe_image_file_path(instance, filename):
-    """ Generate filepath for new recipe image """
-    ext = os.path.splitext(filename)[1]
-    filename = f'{uuid.uuid4()}{ext}'
+    """ Generate filepath for new recipe image from the hash of its content """
+    ext = os.path.splitext(filename)[1].lower()
+    # Identical images get the same path, so they are stored once and URLs of images never change
+    digest = file_digest(instance.image)
 
     # We don't create a string ourselves, we make sure the pathname is created appropriately to the OS
-    return os.path.join('uploads', 'recipe', filename)
+    # Subdirectories keep the number of files in one directory reasonable
+    return os.path.join('uploads', 'recipe', digest[:2], f'{digest}{ext}')
 
 
 class UserManager(BaseUserManager):
@@ -60,7 +64,22 @@ class Recipe(models.Model):
     link = models.CharField(max_length=255, blank=True)
     tags = models.ManyToManyField('Tag')
     ingredients = models.ManyToManyField('Ingredient')
-    image = models.ImageField(null=True, upload_to=recipe_image_file_path)
+    image = models.ImageField(null=True, upload_to=recipe_image_file_path, storage=ContentAddressedStorage())
+    # Resized copies of the image (variant name -> path), generated in the background by recipe.images
+    image_variants = models.JSONField(default=dict, blank=True)
+    # Changes on every save, also when tags, ingredients or their names change (see recipe.signals)
+    updated_at = models.DateTimeField(auto_now=True)
+    # Title, tag/ingredient names and description for full-text search on Postgres, maintained by recipe.search.
+    # Its GIN index is created by migration 0012, only on Postgres.
+    search_vector = SearchVectorField(null=True, editable=False)
+    # Tags and ingredients as the recipe list renders them, maintained by recipe.snapshots. NULL if not built yet.
+    nested_snapshot = models.JSONField(null=True, editable=False)
+
+    class Meta:
+        indexes = [
+            # Recipe list: WHERE user_id = ? ORDER BY id DESC (and the cursor's id < ?) is read straight from the index
+            models.Index(fields=['user', '-id'], name='recipe_user_id_desc_idx'),
+        ]
 
     # This affects how these objects are displayed in the Django Admin
     def __str__(self):
@@ -71,6 +90,13 @@ class Tag(models.Model):
     """ Tag for filtering recipes """
     name = models.CharField(max_length=255)
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        # Lets the serializers create missing names in bulk with ON CONFLICT DO NOTHING
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'name'], name='unique_tag_name_per_user'),
+        ]
 
     def __str__(self):
         return self.name
@@ -80,6 +106,13 @@ class Ingredient(models.Model):
     """ Ingredient for recipes """
     name = models.CharField(max_length=255)
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        # Lets the serializers create missing names in bulk with ON CONFLICT DO NOTHING
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'name'], name='unique_ingredient_name_per_user'),
+        ]
 
     def __str__(self):
         return self.name
@@ -0,0 +1,24 @@
+""" Pagination classes shared by the API apps """
+from rest_framework.pagination import CursorPagination
+from django.conf import settings
+
+
+class KeysetPagination(CursorPagination):
+    """ Cursor (keyset) pagination based on the ordering declared by the view """
+    # Page size defaults to REST_FRAMEWORK['PAGE_SIZE']. When it's not set, clients opt in with ?page_size=N,
+    # otherwise the list is returned unpaginated (the way it always was).
+    page_size_query_param = 'page_size'
+    max_page_size = settings.API_MAX_PAGE_SIZE
+    ordering = '-pk'
+
+    # Cursors filter on the first ordering field (WHERE id < <cursor>), so the database can seek straight into
+    # the index instead of counting and skipping rows like OFFSET does. Page cost stays the same on every page.
+    def get_ordering(self, request, queryset, view):
+        """ Use queryset's (or view's) ordering, so the cursor follows the order of the view's queryset """
+        # Filters can change the order, e.g. search results are ordered by their rank
+        ordering = queryset.query.order_by
+        if not ordering or not all(isinstance(field, str) for field in ordering):
+            ordering = getattr(view, 'ordering', None) or self.ordering
+        if isinstance(ordering, str):
+            return (ordering,)
+        return tuple(ordering)
@@ -0,0 +1,60 @@
+""" JSON renderer and parser using orjson, with DRF's stdlib json ones as a fallback """
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+try:
+    import orjson
+except ImportError:  # Optional, without it everything goes through the stdlib json
+    orjson = None
+
+if orjson is not None:
+    # Datetimes, dates and times go to DRF's encoder, which formats them the way the stdlib renderer does.
+    # Dicts with int keys are allowed by json.dumps() too.
+    ORJSON_OPTIONS = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+
+# JavaScript doesn't allow these characters in strings, DRF escapes them (see JSONRenderer.render)
+LINE_SEPARATORS = [('\u2028'.encode(), b'\\u2028'), ('\u2029'.encode(), b'\\u2029')]
+
+
+class ORJSONRenderer(JSONRenderer):
+    """ Renders the same bytes as JSONRenderer, several times faster when orjson is installed """
+    # orjson only writes compact UTF-8 JSON, indented responses (the browsable API, ?indent=) go through json.
+    # Types orjson doesn't know (Decimal, lazy strings, ...) are converted by DRF's encoder, same as before.
+    # Unlike with STRICT_JSON, NaN and Infinity are rendered as null, not rejected (the API has no float fields).
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or data is None or self.ensure_ascii or not self.compact:
+            return super().render(data, accepted_media_type, renderer_context)
+        if self.get_indent(accepted_media_type, renderer_context or {}) is not None:
+            return super().render(data, accepted_media_type, renderer_context)
+
+        try:
+            ret = orjson.dumps(data, default=self.encoder_class().default, option=ORJSON_OPTIONS)
+        except orjson.JSONEncodeError:  # e.g. integers bigger than 64 bits, json handles them
+            return super().render(data, accepted_media_type, renderer_context)
+
+        for character, escaped in LINE_SEPARATORS:
+            if character in ret:
+                ret = ret.replace(character, escaped)
+        return ret
+
+
+class ORJSONParser(JSONParser):
+    """ Parses JSON request bodies with orjson, when it's installed """
+    renderer_class = ORJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        if orjson is None:
+            return super().parse(stream, media_type, parser_context)
+
+        # orjson only reads UTF-8, which is the JSON default, other charsets go through json
+        encoding = (parser_context or {}).get('encoding', 'utf-8')
+        if encoding.lower().replace('_', '-') not in ('utf-8', 'utf8'):
+            return super().parse(stream, media_type, parser_context)
+
+        try:
+            # Same as the json parser with STRICT_JSON, NaN and Infinity are rejected
+            return orjson.loads(stream.read())
+        except orjson.JSONDecodeError as exc:
+            raise ParseError(f'JSON parse error - {exc}')
@@ -0,0 +1,21 @@
+""" Serializer classes shared by the apps """
+from rest_framework import serializers
+
+from core.middleware import serializing
+
+
+class TimedDataMixin:
+    """ Record the time .data takes as serialization in the request's performance metrics (core.middleware) """
+
+    @property
+    def data(self):
+        with serializing(self.context.get('request')):
+            return super().data
+
+
+class TimedListSerializer(TimedDataMixin, serializers.ListSerializer):
+    """ ListSerializer of many=True serializers, set it as Meta.list_serializer_class """
+
+
+class TimedModelSerializer(TimedDataMixin, serializers.ModelSerializer):
+    """ ModelSerializer with timed .data, its Meta needs list_serializer_class = TimedListSerializer for many=True """
@@ -0,0 +1,55 @@
+""" File storages """
+import hashlib
+import os
+import tempfile
+
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+
+def file_digest(file):
+    """ Return the SHA-256 hex digest of file's content """
+    sha256 = hashlib.sha256()
+    for chunk in file.chunks():  # chunks() starts from the beginning of the file
+        sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    Storage for files named after their content (e.g. a hash), so a name always stands for the same content.
+    A file that already exists isn't stored again and names are never changed to avoid collisions.
+    """
+
+    def get_available_name(self, name, max_length=None):
+        # An existing file with this name has the same content, _save() reuses it
+        return name
+
+    def touch(self, name):
+        """ Mark an existing file as just saved, returns False if it doesn't exist """
+        # Unused files are only deleted once they are older than collect_recipe_images --min-age, so a file reused by
+        # a new upload is safe until the upload's transaction commits
+        try:
+            os.utime(self.path(name))
+        except FileNotFoundError:
+            return False
+        return True
+
+    def _save(self, name, content):
+        if self.touch(name):
+            return name
+
+        full_path = self.path(name)
+        directory = os.path.dirname(full_path)
+        os.makedirs(directory, exist_ok=True)
+        if self.directory_permissions_mode is not None:
+            os.chmod(directory, self.directory_permissions_mode)
+
+        # Write to a temporary file and rename it, so two uploads of the same file can't leave a half written file
+        with tempfile.NamedTemporaryFile(dir=directory, delete=False) as tmp_file:
+            for chunk in content.chunks():
+                tmp_file.write(chunk)
+        os.replace(tmp_file.name, full_path)
+        os.chmod(full_path, self.file_permissions_mode if self.file_permissions_mode is not None else 0o644)
+        return name
@@ -0,0 +1,57 @@
+""" Helpers for streaming large querysets """
+from itertools import islice
+
+from django.conf import settings
+from django.db.models import prefetch_related_objects
+from django.http import StreamingHttpResponse
+
+from core.renderers import ORJSONRenderer
+
+
+def iterate_in_chunks(queryset, chunk_size=500):
+    """ Yield lists of the queryset's objects, with its prefetch_related() lookups done for every list """
+    # iterator() reads rows with a server-side cursor on Postgres, so the whole result is never loaded at once.
+    # It ignores prefetch_related() (before Django 4.1), so we prefetch every chunk ourselves: one query per
+    # lookup per chunk, instead of one per lookup per object.
+    lookups = queryset._prefetch_related_lookups
+    objects = queryset.iterator(chunk_size=chunk_size)
+    while True:
+        chunk = list(islice(objects, chunk_size))
+        if not chunk:
+            return
+        if lookups:
+            prefetch_related_objects(chunk, *lookups)
+        yield chunk
+
+
+def stream_json_array(chunks, serialize):
+    """ Yield a JSON array of serialized objects, a chunk of objects at a time """
+    # Same bytes as rendering the whole list at once, but only one chunk is in memory at a time
+    renderer = ORJSONRenderer()
+    separator = b''
+    yield b'['
+    for chunk in chunks:
+        items = b','.join(renderer.render(item) for item in serialize(chunk))
+        if items:
+            yield separator + items
+            separator = b','
+    yield b']'
+
+
+class StreamingListMixin:
+    """ Stream the list as a JSON array with ?stream=1, instead of loading all objects at once """
+    # Unlike the regular list, it's never paginated and always JSON
+
+    def list(self, request, *args, **kwargs):
+        if request.query_params.get('stream') != '1':
+            return super().list(request, *args, **kwargs)
+
+        queryset = self.filter_queryset(self.get_queryset())
+        chunks = iterate_in_chunks(queryset, settings.API_STREAM_CHUNK_SIZE)
+        response = StreamingHttpResponse(
+            stream_json_array(chunks, lambda chunk: self.get_serializer(chunk, many=True).data),
+            content_type='application/json',
+        )
+        # nginx would otherwise collect the whole response before sending it
+        response['X-Accel-Buffering'] = 'no'
+        return response
@@ -0,0 +1,99 @@
+""" Test helpers shared by the apps """
+import re
+from collections import Counter
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+# Plan lines showing that the database reads a whole table, or sorts rows instead of reading them in index order
+PLAN_PATTERNS = {
+    'postgresql': {
+        'scan': re.compile(r'Seq Scan on (\w+)'),
+        'sort': re.compile(r'(?:^|->\s*)(?:Incremental )?Sort\b', re.MULTILINE),
+    },
+    'sqlite': {
+        'scan': re.compile(r'\bSCAN (\w+)'),
+        'sort': re.compile(r'USE TEMP B-TREE FOR (?:ORDER BY|RIGHT PART OF ORDER BY)'),
+    },
+}
+
+
+class QueryPlanTestMixin:
+    """ Assertions on query plans (EXPLAIN) of querysets """
+
+    def explain(self, queryset):
+        """ Return the query plan of the queryset """
+        if connection.vendor == 'postgresql':
+            # On small test tables reading the whole table is the cheapest plan, so the planner would ignore our
+            # indexes. With seq scans disabled it still falls back to one, but only when no index can be used.
+            # SET LOCAL only lasts until the end of the test's transaction.
+            with connection.cursor() as cursor:
+                cursor.execute('SET LOCAL enable_seqscan = off')
+        return queryset.explain()
+
+    def assertUsesIndex(self, queryset, ordered=True):
+        """ Fail if the queryset reads a whole table, or (when ordered) sorts rows it could read in index order """
+        patterns = PLAN_PATTERNS.get(connection.vendor)
+        if patterns is None:
+            self.skipTest(f'Query plans of {connection.vendor} are not supported')
+
+        plan = self.explain(queryset)
+        message = f'\n{queryset.query}\n\n{plan}'
+        scans = patterns['scan'].findall(plan)
+        self.assertFalse(scans, f'Sequential scan of {", ".join(scans)}:{message}')
+        if ordered:
+            self.assertIsNone(patterns['sort'].search(plan), f'Rows are sorted instead of read in index order:{message}')
+
+
+def normalize_sql(sql):
+    """ Return the SQL with numbers replaced, so queries differing only in IDs are the same """
+    return re.sub(r'\b\d+\b', 'N', sql)
+
+
+def describe_queries(queries):
+    """ Return the captured queries numbered, with the ones run more than once (N+1 suspects) listed first """
+    counts = Counter(normalize_sql(query['sql']) for query in queries)
+    repeated = [f'  {count}x {sql}' for sql, count in counts.most_common() if count > 1]
+    numbered = [f'  {i}. {query["sql"]}' for i, query in enumerate(queries, start=1)]
+    return '\n'.join(['Repeated queries:', *(repeated or ['  none']), 'All queries:', *numbered])
+
+
+class QueryCountTestMixin:
+    """ Assertions on the number of queries of API requests """
+    # Numbers of objects the requests are made with, the second one several times the first
+    query_count_sizes = (2, 10)
+
+    def assertConstantQueries(self, request, add_data, sizes=None):
+        """ Fail if request() runs more queries once add_data(n) has created n more objects """
+        # Catches N+1 queries (e.g. a nested serializer without prefetching), which a fixed expected count in a test
+        # with one object doesn't. request() returns the response, which has to be successful.
+        sizes = sizes or self.query_count_sizes
+        captured, created = [], 0
+        for size in sizes:
+            add_data(size - created)
+            created = size
+            with CaptureQueriesContext(connection) as queries:
+                response = request()
+            self.assertLess(response.status_code, 400, f'Request failed with {response.status_code}: {getattr(response, "data", "")}')
+            request_queries = queries.captured_queries
+            if hasattr(response, 'streaming_content'):
+                with CaptureQueriesContext(connection) as queries:
+                    b''.join(response.streaming_content)  # Streamed responses query the database while they are read
+                request_queries += queries.captured_queries
+            captured.append(request_queries)
+
+        small, large = captured[0], captured[-1]
+        if len(large) != len(small):
+            self.fail(
+                f'{len(small)} queries with {sizes[0]} objects, {len(large)} with {sizes[-1]}.\n'
+                f'Queries with {sizes[-1]} objects:\n{describe_queries(large)}'
+            )
+        return len(large)
+
+    def committed(self, request):
+        """ Return request() also running the on_commit callbacks of its writes, as a commit would """
+        # TestCase never commits, so the queries of the callbacks wouldn't be counted
+        def committed_request():
+            with self.captureOnCommitCallbacks(execute=True):
+                return request()
+        return committed_request
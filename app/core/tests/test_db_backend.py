@@ -0,0 +1,112 @@
+""" Tests for the PostgreSQL backend with health checks and a connection pool """
+from unittest.mock import MagicMock, patch
+
+from django.contrib.postgres.signals import register_type_handlers
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.test import SimpleTestCase
+from psycopg2 import extensions
+
+from core.db.backends.postgresql import base
+
+
+def make_connection(status=extensions.TRANSACTION_STATUS_IDLE):
+    """ Return a mocked psycopg2 connection """
+    connection = MagicMock(closed=0)
+    connection.get_transaction_status.return_value = status
+    return connection
+
+
+class PooledBackendTests(SimpleTestCase):
+    """ Test taking connections from the pool and giving them back """
+
+    def setUp(self):
+        self.new_connections = []
+        patcher = patch.object(base.base.DatabaseWrapper, 'get_new_connection', side_effect=self.open_connection)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(base._pools.clear)
+        # contrib.postgres looks up hstore types on every new connection, there's no database to ask here
+        connection_created.disconnect(register_type_handlers)
+        self.addCleanup(connection_created.connect, register_type_handlers)
+
+    def open_connection(self, conn_params):
+        connection = make_connection()
+        self.new_connections.append(connection)
+        return connection
+
+    def make_wrapper(self, **settings):
+        settings_dict = {
+            **connections['default'].settings_dict,
+            'ENGINE': 'core.db.backends.postgresql', 'NAME': 'pooltest', 'USER': '', 'PASSWORD': '', 'HOST': '', 'PORT': '',
+            'POOL_SIZE': 2, 'CONN_HEALTH_CHECKS': True, **settings,
+        }
+        return base.DatabaseWrapper(settings_dict, alias='pooltest')
+
+    def test_close_returns_connection_to_pool(self):
+        """ Test closing a pooled connection keeps it open for the next request """
+        wrapper = self.make_wrapper()
+        wrapper.connect()
+        connection = wrapper.connection
+        wrapper.close()
+
+        connection.close.assert_not_called()
+        wrapper.connect()
+        self.assertIs(wrapper.connection, connection)
+        self.assertEqual(len(self.new_connections), 1)
+
+    def test_pool_disabled(self):
+        """ Test connections are closed when the pool is disabled """
+        wrapper = self.make_wrapper(POOL_SIZE=0)
+        wrapper.connect()
+        connection = wrapper.connection
+        wrapper.close()
+
+        connection.close.assert_called_once()
+
+    def test_unhealthy_connection_discarded(self):
+        """ Test a pooled connection which stopped working is closed and replaced by a new one """
+        wrapper = self.make_wrapper()
+        wrapper.connect()
+        dead = wrapper.connection
+        wrapper.close()
+        dead.cursor.return_value.__enter__.return_value.execute.side_effect = base.base.Database.OperationalError
+
+        wrapper.connect()
+
+        dead.close.assert_called_once()
+        self.assertIsNot(wrapper.connection, dead)
+        self.assertEqual(len(self.new_connections), 2)
+
+    def test_connection_in_transaction_not_reused(self):
+        """ Test connections left in a transaction, aborted or broken are closed instead of pooled """
+        statuses = [
+            extensions.TRANSACTION_STATUS_INTRANS, extensions.TRANSACTION_STATUS_INERROR,
+            extensions.TRANSACTION_STATUS_ACTIVE, extensions.TRANSACTION_STATUS_UNKNOWN,
+        ]
+        for status in statuses:
+            with self.subTest(status=status):
+                wrapper = self.make_wrapper()
+                wrapper.connect()
+                connection = wrapper.connection
+                connection.get_transaction_status.return_value = status
+                wrapper.close()
+
+                connection.close.assert_called_once()
+                connection.rollback.assert_not_called()
+                wrapper.connect()
+                self.assertIsNot(wrapper.connection, connection)
+                wrapper.close()
+
+    def test_persistent_connection_health_check(self):
+        """ Test a persistent connection is checked once per request, and replaced when it's unusable """
+        wrapper = self.make_wrapper(POOL_SIZE=0, CONN_MAX_AGE=600)
+        wrapper.connect()
+        first = wrapper.connection
+        wrapper.close_if_unusable_or_obsolete()  # End of the request
+
+        with patch.object(wrapper, 'is_usable', return_value=False):
+            wrapper.ensure_connection()
+
+        first.close.assert_called_once()
+        self.assertIsNot(wrapper.connection, first)
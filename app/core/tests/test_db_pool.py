@@ -0,0 +1,62 @@
+""" Tests for the database connection pool """
+from unittest.mock import Mock
+
+from django.test import SimpleTestCase
+
+from core.db.pool import ConnectionPool
+
+
+def always_reusable(connection):
+    return True
+
+
+class ConnectionPoolTests(SimpleTestCase):
+    """ Test pooling connections """
+
+    def test_get_opens_connection_when_empty(self):
+        """ Test a new connection is opened when there is no idle one """
+        pool = ConnectionPool(2, always_reusable)
+        connect = Mock(return_value='conn')
+
+        self.assertEqual(pool.get(connect), 'conn')
+        connect.assert_called_once()
+
+    def test_returned_connection_reused(self):
+        """ Test a returned connection is handed out again, instead of opening a new one """
+        pool = ConnectionPool(2, always_reusable)
+        connection = Mock()
+        pool.put(connection)
+        connect = Mock()
+
+        self.assertIs(pool.get(connect), connection)
+        connect.assert_not_called()
+
+    def test_connections_above_max_idle_closed(self):
+        """ Test the pool closes returned connections it has no room for """
+        pool = ConnectionPool(1, always_reusable)
+        first, second = Mock(), Mock()
+        pool.put(first)
+        pool.put(second)
+
+        self.assertEqual(len(pool), 1)
+        second.close.assert_called_once()
+
+    def test_unusable_connection_not_pooled(self):
+        """ Test a connection rejected by is_reusable is closed """
+        pool = ConnectionPool(2, lambda connection: False)
+        connection = Mock()
+        pool.put(connection)
+
+        self.assertEqual(len(pool), 0)
+        connection.close.assert_called_once()
+
+    def test_failed_check_discards_connection(self):
+        """ Test an idle connection failing the check is closed and replaced """
+        pool = ConnectionPool(2, always_reusable)
+        dead = Mock()
+        pool.put(dead)
+
+        connection = pool.get(Mock(return_value='new'), check=lambda connection: False)
+
+        self.assertEqual(connection, 'new')
+        dead.close.assert_called_once()
@@ -0,0 +1,54 @@
+""" Tests for the lean read path """
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ImproperlyConfigured
+from django.db.models import Prefetch
+from django.test import TestCase
+from rest_framework.renderers import JSONRenderer
+
+from core import lean
+from core.models import Recipe, Tag, Ingredient
+from recipe.serializers import RecipeSerializer, RecipeDetailSerializer, TagSerializer
+
+
+class LeanRepresentationTests(TestCase):
+    """ Test lean representations are the same as the serializers' """
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user('user@example.com', 'test1234')
+        tags = [Tag.objects.create(user=self.user, name=name) for name in ['Vegan', 'Dinner', 'Quick']]
+        salt = Ingredient.objects.create(user=self.user, name='Salt')
+        for i, price in enumerate([Decimal('5'), Decimal('0.5'), Decimal('999.99')]):
+            recipe = Recipe.objects.create(user=self.user, title=f'Recipe {i}', time_minutes=i, price=price, link='')
+            # Added in reverse, nested objects are ordered by their IDs anyway
+            recipe.tags.add(*reversed(tags[i:]))
+            if i:
+                recipe.ingredients.add(salt)
+
+    def lean_data(self, queryset, serializer):
+        rows = lean.load_nested(list(lean.lean_values(queryset, serializer)), queryset.model, serializer)
+        return [lean.compile_representation(serializer)(row) for row in rows]
+
+    def test_recipes_same_as_serializer(self):
+        """ Test if recipe rows render to the same JSON as the serializer """
+        queryset = Recipe.objects.order_by('-id')
+        prefetched = queryset.prefetch_related(
+            Prefetch('tags', queryset=Tag.objects.order_by('pk')), Prefetch('ingredients', queryset=Ingredient.objects.order_by('pk'))
+        )
+        expected = JSONRenderer().render(RecipeSerializer(prefetched, many=True).data)
+
+        actual = JSONRenderer().render(self.lean_data(queryset, RecipeSerializer()))
+
+        self.assertEqual(actual, expected)
+
+    def test_tags_same_as_serializer(self):
+        """ Test if tag rows render to the same JSON as the serializer """
+        queryset = Tag.objects.order_by('-name')
+
+        self.assertEqual(self.lean_data(queryset, TagSerializer()), TagSerializer(queryset, many=True).data)
+
+    def test_unsupported_serializer(self):
+        """ Test if serializers with fields needing model instances are rejected """
+        with self.assertRaises(ImproperlyConfigured):
+            lean.compile_representation(RecipeDetailSerializer())
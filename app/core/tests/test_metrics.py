@@ -0,0 +1,87 @@
+""" Tests for Prometheus metrics """
+import os
+import subprocess
+import sys
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from prometheus_client import REGISTRY, CollectorRegistry, multiprocess
+from rest_framework.test import APIClient
+
+METRICS_URL = reverse('metrics')
+RECIPES_URL = reverse('recipe:recipe-list')
+
+# Counts a cache hit in a separate process, like one of the uWSGI workers
+WORKER = 'from core import metrics; metrics.count_cache("responses", True)'
+
+
+def sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+
+@override_settings(PROMETHEUS_METRICS=True, METRICS_TOKEN='secret')
+class MetricsTests(TestCase):
+    """ Test recording and exporting metrics """
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user('user@example.com', 'test1234')
+        self.client.force_authenticate(self.user)
+
+    def test_requests_recorded_by_view_and_action(self):
+        """ Test if requests are recorded with their view, action, status and queries """
+        labels = {'view': 'RecipeViewSet.list', 'method': 'GET', 'status': '200'}
+        before = sample('api_request_duration_seconds_count', **labels)
+        queries_before = sample('api_request_db_queries_count', view='RecipeViewSet.list')
+        misses_before = sample('api_cache_requests_total', cache='responses', result='miss')
+
+        self.client.get(RECIPES_URL)
+
+        self.assertEqual(sample('api_request_duration_seconds_count', **labels), before + 1)
+        self.assertEqual(sample('api_request_db_queries_count', view='RecipeViewSet.list'), queries_before + 1)
+        self.assertEqual(sample('api_cache_requests_total', cache='responses', result='miss'), misses_before + 1)
+
+    def test_metrics_endpoint(self):
+        """ Test if metrics are exported in the Prometheus text format """
+        self.client.get(RECIPES_URL)
+
+        res = self.client.get(METRICS_URL, HTTP_AUTHORIZATION='Bearer secret')
+
+        self.assertEqual(res.status_code, 200)
+        self.assertIn(b'api_request_duration_seconds_bucket{', res.content)
+        self.assertIn(b'view="RecipeViewSet.list"', res.content)
+
+    def test_metrics_token(self):
+        """ Test if the endpoint requires the token """
+        self.assertEqual(self.client.get(METRICS_URL).status_code, 401)
+        self.assertEqual(self.client.get(METRICS_URL, HTTP_AUTHORIZATION='Bearer wrong').status_code, 401)
+        self.assertEqual(self.client.get(METRICS_URL, HTTP_AUTHORIZATION='Bearer secret').status_code, 200)
+
+    def test_non_ascii_authorization(self):
+        """ Test if a header with non-ASCII characters is refused, instead of failing the request """
+        self.assertEqual(self.client.get(METRICS_URL, HTTP_AUTHORIZATION='Bearer sécret').status_code, 401)
+
+    def test_missing_or_placeholder_token_refused(self):
+        """ Test if the endpoint isn't served without a token, or with the token of .env.sample """
+        for token in ['', 'changeme']:
+            with self.subTest(token=token), override_settings(METRICS_TOKEN=token):
+                self.assertEqual(self.client.get(METRICS_URL, HTTP_AUTHORIZATION=f'Bearer {token}').status_code, 404)
+
+    @override_settings(PROMETHEUS_METRICS=False)
+    def test_metrics_disabled(self):
+        """ Test if the endpoint doesn't exist when metrics are disabled """
+        self.assertEqual(self.client.get(METRICS_URL).status_code, 404)
+
+    def test_metrics_of_worker_processes_added_up(self):
+        """ Test if values written by several processes are added up """
+        with tempfile.TemporaryDirectory() as directory:
+            env = {**os.environ, 'PROMETHEUS_MULTIPROC_DIR': directory}
+            for _ in range(2):
+                subprocess.run([sys.executable, '-c', WORKER], env=env, check=True)
+
+            registry = CollectorRegistry()
+            multiprocess.MultiProcessCollector(registry, path=directory)
+
+            self.assertEqual(registry.get_sample_value('api_cache_requests_total', {'cache': 'responses', 'result': 'hit'}), 2)
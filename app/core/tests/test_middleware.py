@@ -0,0 +1,79 @@
+""" Tests for the performance middleware """
+import json
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from core.models import Recipe
+
+RECIPES_URL = reverse('recipe:recipe-list')
+
+
+@override_settings(PERFORMANCE_METRICS=True)
+class PerformanceMiddlewareTests(TestCase):
+    """ Test reporting queries and timings of requests """
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user('user@example.com', 'test1234')
+        self.client.force_authenticate(self.user)
+        Recipe.objects.create(user=self.user, title='Soup', time_minutes=5, price='1.00')
+
+    def test_server_timing_header(self):
+        """ Test if the response reports its queries and timings """
+        with self.assertLogs('core.performance', 'INFO'):
+            res = self.client.get(RECIPES_URL)
+
+        timings = dict(item.split(';', 1) for item in res['Server-Timing'].split(', '))
+        self.assertEqual(set(timings), {'db', 'view', 'serialize', 'render', 'total'})
+        self.assertIn('desc="3 queries"', timings['db'])
+
+    def test_serialize_time(self):
+        """ Test if serializer.data is timed on its own, nested serializers once as part of it """
+        with self.assertLogs('core.performance', 'INFO') as logs:
+            res = self.client.get(reverse('recipe:recipe-detail', args=[Recipe.objects.get().id]))
+
+        self.assertEqual(res.status_code, 200)
+        record = json.loads(logs.records[0].getMessage())
+        self.assertGreater(record['serialize_ms'], 0)
+        self.assertLess(record['serialize_ms'], record['total_ms'])
+
+    def test_streaming_response(self):
+        """ Test if queries run while a streaming response is sent are counted, and it's reported at its end """
+        with self.assertLogs('core.performance', 'INFO') as logs:
+            with CaptureQueriesContext(connection) as queries:
+                res = self.client.get(RECIPES_URL, {'stream': 1})
+                self.assertEqual(logs.records, [])
+                content = b''.join(res.streaming_content)
+
+        self.assertEqual(json.loads(content)[0]['title'], 'Soup')
+        self.assertNotIn('Server-Timing', res)
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record['queries'], len(queries))
+        self.assertGreater(record['serialize_ms'], 0)
+
+    def test_log_line(self):
+        """ Test if every request is logged as a JSON line with the view and its action """
+        with self.assertLogs('core.performance', 'INFO') as logs:
+            self.client.get(RECIPES_URL, {'title': 'x'})
+
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record['path'], RECIPES_URL)
+        self.assertEqual(record['status'], 200)
+        self.assertEqual(record['view'], 'RecipeViewSet.list')
+        self.assertEqual(record['queries'], 3)
+        self.assertGreater(record['total_ms'], 0)
+
+    @override_settings(PERFORMANCE_METRICS=False)
+    def test_disabled(self):
+        """ Test if the middleware isn't used when it's disabled """
+        self.assertIn('core.middleware.PerformanceMiddleware', settings.MIDDLEWARE)
+
+        res = self.client.get(RECIPES_URL)
+
+        self.assertNotIn('Server-Timing', res)
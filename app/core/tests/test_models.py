@@ -1,6 +1,8 @@
 """ Tests for models """
 from decimal import Decimal
-from unittest.mock import patch
+import hashlib
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import IntegrityError
 from django.test import TestCase
 from django.contrib.auth import get_user_model  # helper function to get a default user model for the project
 from .. import models
@@ -68,6 +70,16 @@ class ModelTests(TestCase):
 
         self.assertEqual(str(tag), tag.name)
 
+    def test_tag_name_unique_per_user(self):
+        """ Test a user can't have two tags with the same name, but different users can """
+        user = create_user()
+        other_user = create_user(email='other@example.com')
+        models.Tag.objects.create(user=user, name='Vegan')
+        models.Tag.objects.create(user=other_user, name='Vegan')
+
+        with self.assertRaises(IntegrityError):
+            models.Tag.objects.create(user=user, name='Vegan')
+
     def test_create_ingredient(self):
         """ Test creating an ingredient is succesful """
         user = create_user()
@@ -75,11 +87,11 @@ class ModelTests(TestCase):
 
         self.assertEqual(str(ingredient), ingredient.name)
 
-    @patch('core.models.uuid.uuid4')  # uuid generates a random string (unique identifier)
-    def test_recipe_file_name_uuid(self, mock_uuid):
-        """ Test generating image path """
-        uuid = 'test_uuid'
-        mock_uuid.return_value = uuid
-        file_patch = models.recipe_image_file_path(None, 'example.jpg')
+    def test_recipe_file_name_content_hash(self):
+        """ Test generating image path from the hash of the image """
+        content = b'image content'
+        recipe = models.Recipe(image=SimpleUploadedFile('example.JPG', content))
+        file_path = models.recipe_image_file_path(recipe, 'example.JPG')
 
-        self.assertEqual(file_patch, f'uploads/recipe/{uuid}.jpg')
+        digest = hashlib.sha256(content).hexdigest()
+        self.assertEqual(file_path, f'uploads/recipe/{digest[:2]}/{digest}.jpg')
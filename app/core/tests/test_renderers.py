@@ -0,0 +1,70 @@
+""" Tests for the JSON renderer and parser """
+import datetime
+import io
+from collections import OrderedDict
+from decimal import Decimal
+from unittest import mock, skipIf
+
+from django.test import SimpleTestCase
+from django.utils.translation import gettext_lazy
+from rest_framework.exceptions import ParseError
+from rest_framework.renderers import JSONRenderer
+
+from core import renderers
+
+DATA = OrderedDict([
+    ('id', 1),
+    ('price', Decimal('5.25')),
+    ('title', 'Zupa pomidorowa     "quoted" </script>'),
+    ('image', 'http://example.com/static/media/uploads/recipe/ab/abc.jpg'),
+    ('created', datetime.datetime(2024, 3, 27, 13, 2, 1, 123456, tzinfo=datetime.timezone.utc)),
+    ('day', datetime.date(2024, 3, 27)),
+    ('label', gettext_lazy('Important dates')),
+    ('counts', {1: 2}),
+    ('big', 2 ** 70),
+    ('tags', [OrderedDict([('id', 2), ('name', 'Vegan')])]),
+])
+
+
+class ORJSONRendererTests(SimpleTestCase):
+    """ Test the renderer returns the same bytes as DRF's JSONRenderer """
+
+    def test_same_as_json_renderer(self):
+        """ Test if all kinds of values render the same way """
+        self.assertEqual(renderers.ORJSONRenderer().render(DATA), JSONRenderer().render(DATA))
+
+    def test_line_separators_escaped(self):
+        """ Test if characters invalid in JavaScript strings are escaped """
+        ret = renderers.ORJSONRenderer().render({'title': '  '})
+        self.assertEqual(ret, b'{"title":"\\u2028\\u2029"}')
+
+    def test_indent(self):
+        """ Test if indented responses are the same too """
+        ret = renderers.ORJSONRenderer().render(DATA, 'application/json; indent=4')
+        self.assertEqual(ret, JSONRenderer().render(DATA, 'application/json; indent=4'))
+
+    def test_without_orjson(self):
+        """ Test if the renderer works without orjson """
+        with mock.patch.object(renderers, 'orjson', None):
+            self.assertEqual(renderers.ORJSONRenderer().render(DATA), JSONRenderer().render(DATA))
+
+
+class ORJSONParserTests(SimpleTestCase):
+    """ Test parsing JSON request bodies """
+
+    def test_parse(self):
+        """ Test if JSON is parsed """
+        data = renderers.ORJSONParser().parse(io.BytesIO('{"title": "Zupa", "tags": [{"name": "Vegan"}]}'.encode()))
+        self.assertEqual(data, {'title': 'Zupa', 'tags': [{'name': 'Vegan'}]})
+
+    def test_parse_invalid(self):
+        """ Test if invalid JSON, NaN included, is rejected """
+        for body in [b'{"title": ', b'{"price": NaN}']:
+            with self.subTest(body=body), self.assertRaises(ParseError):
+                renderers.ORJSONParser().parse(io.BytesIO(body))
+
+    @skipIf(renderers.orjson is None, 'orjson is not installed')
+    def test_parse_other_encoding(self):
+        """ Test if bodies in other encodings than UTF-8 are parsed by json """
+        data = renderers.ORJSONParser().parse(io.BytesIO('{"name": "Ł"}'.encode('utf-16')), parser_context={'encoding': 'utf-16'})
+        self.assertEqual(data, {'name': 'Ł'})
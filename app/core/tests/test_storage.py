@@ -0,0 +1,44 @@
+""" Tests for file storages """
+import os
+import tempfile
+
+from django.core.files.base import ContentFile
+from django.test import SimpleTestCase
+
+from core.storage import ContentAddressedStorage
+
+
+class ContentAddressedStorageTests(SimpleTestCase):
+    """ Test storing files under content addressed names """
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.storage = ContentAddressedStorage(location=self.tmp_dir.name)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_existing_file_reused(self):
+        """ Test saving a name that already exists keeps the name and stores the file once """
+        first = self.storage.save('ab/abcdef.jpg', ContentFile(b'image'))
+        second = self.storage.save('ab/abcdef.jpg', ContentFile(b'image'))
+
+        self.assertEqual(first, 'ab/abcdef.jpg')
+        self.assertEqual(second, first)
+        self.assertEqual(os.listdir(os.path.join(self.tmp_dir.name, 'ab')), ['abcdef.jpg'])
+
+    def test_existing_file_touched(self):
+        """ Test saving a name that already exists makes the file new again, so it isn't collected as unused """
+        name = self.storage.save('ab/abcdef.jpg', ContentFile(b'image'))
+        os.utime(self.storage.path(name), (0, 0))
+
+        self.storage.save(name, ContentFile(b'image'))
+
+        self.assertGreater(self.storage.get_modified_time(name).timestamp(), 0)
+
+    def test_saved_content(self):
+        """ Test the saved file has the saved content """
+        name = self.storage.save('file.txt', ContentFile(b'content'))
+
+        with self.storage.open(name) as f:
+            self.assertEqual(f.read(), b'content')
@@ -0,0 +1,113 @@
+""" Autocomplete of tag and ingredient names """
+import difflib
+from bisect import bisect_left
+
+from django.contrib.postgres.search import TrigramWordSimilarity
+from django.db import connections, router
+from django.db.models import Case, Q, Value, When
+from django.db.models.functions import Upper
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+
+from core.cache import TTLCache
+
+# Minimum difflib ratio of a fuzzy match, on Postgres pg_trgm.word_similarity_threshold (0.6 by default) is used
+FUZZY_CUTOFF = 0.6
+
+
+def is_supported(model):
+    """ Return True if the model is stored in a database with trigram indexes (Postgres with pg_trgm) """
+    return connections[router.db_for_read(model)].vendor == 'postgresql'
+
+
+class PrefixIndex:
+    """ Sorted lowercase names of one user's tags or ingredients """
+
+    def __init__(self, items):
+        self.ids = {}  # lowercase name -> IDs
+        for item_id, name in items:
+            self.ids.setdefault(name.lower(), []).append(item_id)
+        self.names = sorted(self.ids)
+
+    def search(self, text, limit):
+        """ Return IDs of names starting with text, then of names similar to it """
+        text = text.lower()
+        found = []
+        # Names with the prefix are next to each other in the sorted list, starting where text would be inserted
+        for name in self.names[bisect_left(self.names, text):]:
+            if len(found) >= limit or not name.startswith(text):
+                break
+            found.append(name)
+
+        if len(found) < limit:
+            # Typos, e.g. "tomatoe"
+            similar = difflib.get_close_matches(text, self.names, n=limit, cutoff=FUZZY_CUTOFF)
+            found += [name for name in similar if name not in found]
+
+        return [item_id for name in found[:limit] for item_id in self.ids[name]][:limit]
+
+
+# Without Postgres (SQLite in development and tests), every process keeps prefix indexes of recently used
+# vocabularies. They are dropped by recipe.signals whenever a tag or ingredient of the user changes.
+local_indexes = TTLCache(max_size=1000, ttl=300)
+
+
+def invalidate(model, user_id):
+    """ Drop the prefix index of the user's tags or ingredients """
+    local_indexes.delete((model._meta.label, user_id))
+
+
+def _local_index(model, user_id):
+    key = (model._meta.label, user_id)
+    index = local_indexes.get(key)
+    if index is None:
+        index = PrefixIndex(model.objects.filter(user_id=user_id).values_list('id', 'name'))
+        local_indexes.set(key, index)
+    return index
+
+
+def suggest(queryset, user_id, text, limit):
+    """ Return up to limit objects from the user's queryset, with names starting with (or similar to) text """
+    model = queryset.model
+    if is_supported(model):
+        # Both conditions can be answered by the pg_trgm GIN index on upper(name) (migration 0013), istartswith is
+        # UPPER(name) LIKE UPPER('text%') and trigrams don't depend on case. word_similarity compares text with the
+        # most similar part of the name, so it works for unfinished words too.
+        return list(
+            queryset.alias(upper_name=Upper('name'))
+            .filter(Q(name__istartswith=text) | Q(upper_name__trigram_word_similar=text))
+            .annotate(
+                is_prefix=Case(When(name__istartswith=text, then=Value(True)), default=Value(False)),
+                similarity=TrigramWordSimilarity(text, 'name'),
+            )
+            .order_by('-is_prefix', '-similarity', 'name')[:limit]
+        )
+
+    ids = _local_index(model, user_id).search(text, limit)
+    # The queryset can be filtered further (assigned_only), the index only knows names of all user's objects
+    objects = queryset.in_bulk(ids)
+    return [objects[item_id] for item_id in ids if item_id in objects]
+
+
+class AutocompleteMixin:
+    """ List only objects with names matching the q param, best matches first """
+    default_autocomplete_limit = 10
+    max_autocomplete_limit = 50
+
+    def get_autocomplete_limit(self, request):
+        try:
+            limit = int(request.query_params.get('limit', self.default_autocomplete_limit))
+        except ValueError:
+            limit = 0
+        if not 0 < limit <= self.max_autocomplete_limit:
+            raise ValidationError({'limit': f'Expected a number from 1 to {self.max_autocomplete_limit}.'})
+        return limit
+
+    def list(self, request, *args, **kwargs):
+        text = request.query_params.get('q', '').strip()
+        if not text:
+            return super().list(request, *args, **kwargs)
+
+        # Suggestions are short, so they are never paginated
+        results = suggest(self.filter_queryset(self.get_queryset()), request.user.id, text, self.get_autocomplete_limit(request))
+        return Response(self.get_serializer(results, many=True).data)
@@ -0,0 +1,96 @@
+""" Bulk import and export of recipes as JSON Lines (one recipe per line) """
+import io
+from itertools import islice
+
+from django.db import transaction
+from rest_framework.exceptions import ParseError
+
+from core.models import Recipe, Tag, Ingredient
+from core.renderers import ORJSONRenderer, ORJSONParser
+from core.streaming import iterate_in_chunks
+from recipe import cache, search, snapshots
+from recipe.serializers import RecipeBulkSerializer, get_or_create_attrs, normalize_name
+
+RELATED_MODELS = {'tags': Tag, 'ingredients': Ingredient}
+
+
+def read_lines(stream):
+    """ Yield (line number, line) of non-empty lines of the stream, without reading all of it """
+    for number, line in enumerate(iter(stream.readline, b''), start=1):
+        if line.strip():
+            yield number, line
+
+
+def validate_line(line, context):
+    """ Return validated data of the recipe on the line, or its errors """
+    try:
+        data = ORJSONParser().parse(io.BytesIO(line))
+    except ParseError as e:
+        return None, {'non_field_errors': [e.detail]}
+
+    serializer = RecipeBulkSerializer(data=data, context=context)
+    if not serializer.is_valid():
+        return None, serializer.errors
+    return serializer.validated_data, None
+
+
+@transaction.atomic
+def create_recipes(user, items):
+    """ Create recipes from validated data with a constant number of queries, and return their IDs """
+    related = {field_name: [item.pop(field_name, []) for item in items] for field_name in RELATED_MODELS}
+    # Postgres (and SQLite 3.35+) return IDs of rows created by bulk_create()
+    recipes = Recipe.objects.bulk_create([Recipe(user=user, **item) for item in items])
+
+    for field_name, model in RELATED_MODELS.items():
+        # Names of all recipes in the batch are looked up and created together, same as RecipeSerializer does
+        # for one recipe
+        objs = get_or_create_attrs(model, user, [attr['name'] for attrs in related[field_name] for attr in attrs])
+        ids = {obj.name: obj.id for obj in objs}
+
+        field = Recipe._meta.get_field(field_name)
+        through = field.remote_field.through
+        column = f'{field.m2m_reverse_field_name()}_id'
+        through.objects.bulk_create([
+            through(recipe_id=recipe.id, **{column: related_id})
+            for recipe, attrs in zip(recipes, related[field_name])
+            for related_id in dict.fromkeys(ids[normalize_name(attr['name'])] for attr in attrs)
+        ])
+
+    # bulk_create() sends no signals and skips the serializers, so we do their work here
+    recipe_ids = [recipe.id for recipe in recipes]
+    search.update_search_vectors(recipe_ids)
+    snapshots.update_snapshots(recipe_ids)
+    return recipe_ids
+
+
+def import_recipes(lines, user, context, batch_size):
+    """ Validate and create recipes from (line number, line) pairs, one transaction per batch """
+    created, errors = 0, []
+    lines = iter(lines)
+    while True:
+        batch = list(islice(lines, batch_size))
+        if not batch:
+            break
+
+        items = []
+        for number, line in batch:
+            data, line_errors = validate_line(line, context)
+            if line_errors:
+                errors.append({'line': number, 'errors': line_errors})
+            else:
+                items.append(data)
+
+        if items:
+            created += len(create_recipes(user, items))
+            # Every committed batch shows up in the user's lists (create_recipes commits it)
+            cache.bump_version(user.id)
+
+    return {'created': created, 'errors': errors}
+
+
+def export_recipes(queryset, context, chunk_size):
+    """ Yield recipes of the queryset as JSON Lines, a chunk at a time """
+    renderer = ORJSONRenderer()
+    for chunk in iterate_in_chunks(queryset, chunk_size):
+        data = RecipeBulkSerializer(chunk, many=True, context=context).data
+        yield b''.join(renderer.render(recipe) + b'\n' for recipe in data)
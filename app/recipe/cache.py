@@ -0,0 +1,83 @@
+""" Per-user cache of list responses """
+import hashlib
+import time
+
+from django.core.cache import caches
+from django.db import transaction
+from rest_framework.response import Response
+
+from core import metrics
+
+# Params with comma separated IDs, their order and duplicates don't change the response
+ID_LIST_PARAMS = ['tags', 'ingredients']
+
+
+def response_cache():
+    return caches['responses']
+
+
+def _version_key(user_id):
+    return f'responses:version:{user_id}'
+
+
+# Every cached response of a user is stored under the user's current version. Any write bumps the version,
+# which makes all the previous responses of the user unreachable (they expire on their own), so we never
+# have to find and delete them. The version is bumped once the write commits: bumped any earlier, a concurrent
+# request could cache data read before the commit under the new version.
+def get_version(user_id):
+    """ Return the current response version of the user """
+    version = response_cache().get(_version_key(user_id))
+    if version is None:
+        # Start from the current time, so a version is never reused, even after the cache was cleared
+        version = time.time_ns()
+        response_cache().set(_version_key(user_id), version, timeout=None)
+    return version
+
+
+def _bump_version(user_id):
+    try:
+        response_cache().incr(_version_key(user_id))
+    except ValueError:  # No version yet
+        response_cache().set(_version_key(user_id), time.time_ns(), timeout=None)
+
+
+def bump_version(user_id):
+    """ Invalidate all cached responses of the user, once the current transaction commits """
+    # Outside of a transaction, right away
+    transaction.on_commit(lambda: _bump_version(user_id))
+
+
+def normalize_params(query_params):
+    """ Return query params as a string, which is the same for all equivalent requests """
+    normalized = []
+    for name in sorted(query_params):
+        value = query_params.get(name)
+        if name in ID_LIST_PARAMS:
+            try:
+                value = ','.join(str(i) for i in sorted({int(i) for i in value.split(',')}))
+            except ValueError:
+                pass  # Invalid IDs are rejected by the view, the response is cached as it is
+        normalized.append(f'{name}={value}')
+    return '&'.join(normalized)
+
+
+def response_cache_key(request, view_name):
+    """ Return the cache key of the response for the request """
+    params = hashlib.md5(normalize_params(request.query_params).encode()).hexdigest()
+    return f'responses:{request.user.id}:{get_version(request.user.id)}:{view_name}:{params}'
+
+
+class CachedListMixin:
+    """ Cache responses of the list action per user, until the user writes anything """
+
+    def list(self, request, *args, **kwargs):
+        key = response_cache_key(request, self.basename)
+        data = response_cache().get(key)
+        metrics.count_cache('responses', data is not None)
+        if data is not None:
+            return Response(data)
+
+        response = super().list(request, *args, **kwargs)
+        if response.status_code == 200:
+            response_cache().set(key, response.data)
+        return response
@@ -0,0 +1,71 @@
+""" Conditional GET (ETag / Last-Modified) for the recipe API """
+import hashlib
+
+from django.core.cache.backends.dummy import DummyCache
+from django.db.models import prefetch_related_objects
+from django.shortcuts import get_object_or_404
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+from rest_framework.response import Response
+
+from recipe.cache import response_cache, response_cache_key
+
+
+class ConditionalListMixin:
+    """ Answer list requests with 304 Not Modified, when the client's copy is still current """
+    # A 304 is returned without loading or serializing any objects. Lists use the user's response cache version.
+    # Only list() is defined, so views without a detail action don't get one.
+
+    def get_etag(self, request, state):
+        """ Return an ETag for the state of the user's objects """
+        # Renderer format is included, because the JSON and the browsable API responses have the same URL
+        parts = [request.user.id, request.accepted_renderer.format, *state]
+        return quote_etag(hashlib.md5(repr(parts).encode()).hexdigest())
+
+    def get_list_etag(self, request):
+        """ Return the ETag of the list response, or None when the response cache is disabled """
+        # The cache key has the user's version, which every committed write of their recipes, tags or ingredients
+        # bumps (recipe.cache), so the ETag takes no query. Without a cache the version isn't kept between requests.
+        if isinstance(response_cache(), DummyCache):
+            return None
+        return self.get_etag(request, [response_cache_key(request, self.basename)])
+
+    def _conditional_response(self, request, etag, last_modified, get_response):
+        """ Return 304 if the client has a current copy, otherwise the response with the validators set """
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified) or get_response()
+        if response.status_code not in (200, 304):
+            return response
+
+        if etag is not None:
+            response['ETag'] = etag
+        if last_modified is not None:
+            response['Last-Modified'] = http_date(last_modified)
+        # Responses are different for every user and clients should check they are still current before using them
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
+
+    def list(self, request, *args, **kwargs):
+        # No Last-Modified for lists, it has one second precision and deletes don't change it
+        return self._conditional_response(
+            request, self.get_list_etag(request), None, lambda: super(ConditionalListMixin, self).list(request, *args, **kwargs)
+        )
+
+
+class ConditionalGetMixin(ConditionalListMixin):
+    """ Answer list and detail requests with 304 Not Modified, when the client's copy is still current """
+    # Details use the recipe's updated_at. Recipes are touched when their tags/ingredients change (see recipe.signals).
+
+    def retrieve(self, request, *args, **kwargs):
+        # Same as get_object(), but the relations are only prefetched when the recipe is going to be serialized
+        queryset = self.filter_queryset(self.get_queryset())
+        lookup = {self.lookup_field: kwargs[self.lookup_url_kwarg or self.lookup_field]}
+        instance = get_object_or_404(queryset.prefetch_related(None), **lookup)
+        self.check_object_permissions(request, instance)
+
+        def get_response():
+            prefetch_related_objects([instance], *queryset._prefetch_related_lookups)
+            return Response(self.get_serializer(instance).data)
+
+        etag = self.get_etag(request, [instance.pk, instance.updated_at])
+        # HTTP dates have one second precision
+        return self._conditional_response(request, etag, int(instance.updated_at.timestamp()), get_response)
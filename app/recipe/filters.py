@@ -0,0 +1,84 @@
+""" Filter backends for the recipe API """
+from django.db.models import Exists, OuterRef
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import BaseFilterBackend
+
+from core.models import Recipe
+from recipe import search
+
+MATCH_ANY = 'any'
+MATCH_ALL = 'all'
+
+
+def params_to_ints(query_string):
+    """ Convert a comma separated string of IDs to a list of unique integers """
+    # '1,2,3' -> [1,2,3]
+    try:
+        return sorted({int(str_id) for str_id in query_string.split(',')})
+    except ValueError:
+        raise ValidationError(f'Expected a comma separated list of IDs, got "{query_string}".')
+
+
+# Filtering with tags__id__in joins the through table, so a recipe with 2 matching tags appears twice and the
+# whole (wide) recipe row has to be sorted and de-duplicated with DISTINCT. EXISTS is a semi-join: Postgres stops
+# at the first matching through row and every recipe is returned at most once, so there is nothing to de-duplicate.
+def filter_by_related(queryset, field_name, ids, match=MATCH_ANY):
+    """ Filter recipes linked to any (or all) of the given IDs through the M2M field_name """
+    field = Recipe._meta.get_field(field_name)
+    # Through model has FKs named after both models, e.g. recipe_id and tag_id
+    related_column = f'{field.m2m_reverse_field_name()}_id'
+    links = field.remote_field.through.objects.filter(**{f'{field.m2m_field_name()}_id': OuterRef('pk')})
+
+    if match == MATCH_ALL:
+        # One EXISTS per ID, every one of them is a single index lookup on the through table
+        for related_id in ids:
+            queryset = queryset.filter(Exists(links.filter(**{related_column: related_id})))
+        return queryset
+
+    return queryset.filter(Exists(links.filter(**{f'{related_column}__in': ids})))
+
+
+class RecipeAttrFilter(BaseFilterBackend):
+    """ Filter recipes by comma separated tag and ingredient IDs """
+    fields = ['tags', 'ingredients']
+
+    def get_match(self, request, field_name):
+        """ Return the match mode (any/all) requested for field_name """
+        match = request.query_params.get(f'{field_name}_match', MATCH_ANY)
+        if match not in (MATCH_ANY, MATCH_ALL):
+            raise ValidationError({f'{field_name}_match': f'Expected "{MATCH_ANY}" or "{MATCH_ALL}".'})
+        return match
+
+    def filter_queryset(self, request, queryset, view):
+        for field_name in self.fields:
+            query_string = request.query_params.get(field_name)  # This will return None if there is no param
+            if query_string:
+                ids = params_to_ints(query_string)
+                queryset = filter_by_related(queryset, field_name, ids, self.get_match(request, field_name))
+        return queryset
+
+
+class AssignedOnlyFilter(BaseFilterBackend):
+    """ Filter tags/ingredients to the ones assigned to at least one recipe """
+
+    def filter_queryset(self, request, queryset, view):
+        assigned_only = bool(
+            int(request.query_params.get('assigned_only', 0))
+        )
+        if not assigned_only:
+            return queryset
+
+        # Same as recipe__isnull=False, but without the JOIN that would need DISTINCT
+        field = next(field for field in Recipe._meta.many_to_many if field.related_model is queryset.model)
+        links = field.remote_field.through.objects.filter(**{f'{field.m2m_reverse_field_name()}_id': OuterRef('pk')})
+        return queryset.filter(Exists(links))
+
+
+class RecipeSearchFilter(BaseFilterBackend):
+    """ Full-text search of recipes with the search param, best matches first """
+
+    def filter_queryset(self, request, queryset, view):
+        text = request.query_params.get('search', '').strip()
+        if not text:
+            return queryset
+        return search.search_recipes(queryset, text)
@@ -0,0 +1,118 @@
+""" Background processing of recipe images """
+import io
+import logging
+import os
+import queue
+import threading
+
+from PIL import Image, ImageOps, features
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+from core.models import Recipe
+
+logger = logging.getLogger(__name__)
+
+# name -> (max width and height, format, file extension, quality)
+VARIANTS = {
+    'thumbnail': ((200, 200), 'JPEG', 'jpg', 80),
+    'medium': ((800, 800), 'JPEG', 'jpg', 85),
+    'webp': ((800, 800), 'WEBP', 'webp', 80),
+}
+
+_queue = queue.Queue()
+_worker = None
+_worker_lock = threading.Lock()
+
+
+def variant_path(image_name, variant):
+    """ Return the storage path of a variant, next to the original image """
+    ext = VARIANTS[variant][2]
+    return f'{os.path.splitext(image_name)[0]}_{variant}.{ext}'
+
+
+def render_variant(image, variant):
+    """ Return image resized and recompressed for variant, as bytes """
+    size, image_format, ext, quality = VARIANTS[variant]
+    resized = image.copy()
+    resized.thumbnail(size)  # Keeps the aspect ratio and never upscales
+    if image_format == 'JPEG' and resized.mode != 'RGB':
+        resized = resized.convert('RGB')  # JPEG has no alpha channel or palette
+
+    output = io.BytesIO()
+    resized.save(output, image_format, quality=quality, optimize=True)
+    return output.getvalue()
+
+
+def open_original(storage, name):
+    """ Return the decoded image, turned upright by its EXIF orientation (variants don't keep EXIF) """
+    with storage.open(name) as image_file, Image.open(image_file) as image:
+        # Returns a new, loaded image, so it stays usable once the file is closed
+        return ImageOps.exif_transpose(image)
+
+
+def generate_variants(recipe_id):
+    """ Create all variants of the recipe's image and save their paths on the recipe """
+    recipe = Recipe.objects.filter(pk=recipe_id).only('image').first()
+    if recipe is None or not recipe.image:
+        return
+
+    storage = recipe.image.storage
+    original = None  # Decoded once, for the first missing variant, render_variant() resizes copies of it
+    variants = {}
+    for variant, (size, image_format, ext, quality) in VARIANTS.items():
+        if image_format == 'WEBP' and not features.check('webp'):
+            continue  # Pillow built without libwebp
+        path = variant_path(recipe.image.name, variant)
+        # Image names are hashes of their content, so an existing variant was made from the same image
+        if not storage.touch(path):
+            if original is None:
+                original = open_original(storage, recipe.image.name)
+            storage.save(path, ContentFile(render_variant(original, variant)))
+        variants[variant] = path
+
+    # The image could have been replaced while we were processing it, the new one has its own job
+    Recipe.objects.filter(pk=recipe_id, image=recipe.image.name).update(image_variants=variants, updated_at=timezone.now())
+
+
+def _process(recipe_id):
+    """ Generate variants, making sure a failing image doesn't stop the worker """
+    try:
+        generate_variants(recipe_id)
+    except Exception:
+        logger.exception('Generating image variants for recipe %s failed', recipe_id)
+
+
+def _work():
+    """ Process recipes from the queue, forever """
+    while True:
+        recipe_id = _queue.get()
+        close_old_connections()
+        _process(recipe_id)
+        # Worker thread has its own DB connection, Django only closes connections of request threads
+        close_old_connections()
+        _queue.task_done()
+
+
+def _start_worker():
+    """ Start the worker thread of this process, if it's not running yet """
+    global _worker
+    with _worker_lock:
+        if _worker is None or not _worker.is_alive():
+            # uWSGI forks workers after loading the app, so every worker starts its own thread on the first upload
+            _worker = threading.Thread(target=_work, name='recipe-image-worker', daemon=True)
+            _worker.start()
+
+
+def schedule_variants(recipe_id):
+    """ Generate variants of the recipe's image once the current transaction commits """
+    mode = settings.RECIPE_IMAGE_PROCESSING
+    if mode == 'sync':
+        transaction.on_commit(lambda: _process(recipe_id))
+    elif mode == 'thread':
+        def enqueue():
+            _start_worker()
+            _queue.put(recipe_id)
+        transaction.on_commit(enqueue)
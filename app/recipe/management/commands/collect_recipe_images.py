@@ -0,0 +1,55 @@
+"""
+Django command to delete recipe image files, which no recipe uses
+"""
+import os
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.models import Recipe
+
+IMAGES_DIR = os.path.join('uploads', 'recipe')
+
+
+def walk(storage, directory):
+    """ Yield names of all files under directory """
+    directories, files = storage.listdir(directory)
+    for name in files:
+        yield os.path.join(directory, name)
+    for name in directories:
+        yield from walk(storage, os.path.join(directory, name))
+
+
+class Command(BaseCommand):
+    """ Garbage collect unreferenced recipe images and image variants """
+    help = 'Delete recipe images and variants, which are not used by any recipe.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Only list files that would be deleted')
+        parser.add_argument(
+            '--min-age', type=int, default=3600,
+            help='Skip files younger than this many seconds, their upload may not be committed yet',
+        )
+
+    def handle(self, *args, **options):
+        """ Entrypoint for command """
+        storage = Recipe._meta.get_field('image').storage
+        if not storage.exists(IMAGES_DIR):
+            return
+
+        referenced = set()
+        for image, variants in Recipe.objects.exclude(image='').exclude(image=None).values_list('image', 'image_variants').iterator():
+            referenced.add(image)
+            referenced.update(variants.values())
+
+        cutoff = time.time() - options['min_age']
+        deleted = 0
+        for name in walk(storage, IMAGES_DIR):
+            if name in referenced or storage.get_modified_time(name).timestamp() > cutoff:
+                continue
+            self.stdout.write(f'Deleting {name}')
+            if not options['dry_run']:
+                storage.delete(name)
+            deleted += 1
+
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} unreferenced files'))
@@ -0,0 +1,21 @@
+"""
+Django command to generate missing variants of recipe images
+"""
+from django.core.management.base import BaseCommand
+
+from core.models import Recipe
+from recipe.images import generate_variants
+
+
+class Command(BaseCommand):
+    """ Generate variants for every recipe, which has an image but no variants """
+    help = 'Generate missing image variants, e.g. for uploads that were queued when a worker restarted.'
+
+    def handle(self, *args, **options):
+        """ Entrypoint for command """
+        recipe_ids = Recipe.objects.exclude(image='').exclude(image=None).filter(image_variants={}).values_list('id', flat=True)
+        count = 0
+        for recipe_id in recipe_ids.iterator():
+            generate_variants(recipe_id)
+            count += 1
+        self.stdout.write(self.style.SUCCESS(f'Processed {count} images'))
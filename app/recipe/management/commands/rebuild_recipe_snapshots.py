@@ -0,0 +1,54 @@
+"""
+Django command to rebuild or verify snapshots of recipes' tags and ingredients
+"""
+from itertools import islice
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from core.models import Recipe
+from recipe import snapshots
+
+
+class Command(BaseCommand):
+    """ Rebuild Recipe.nested_snapshot from the M2M tables, or check it matches them """
+    help = 'Rebuild snapshots of tags and ingredients rendered by the recipe list, or verify them with --verify.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--missing', action='store_true', help='Only build snapshots of recipes without one')
+        parser.add_argument('--verify', action='store_true', help='Only report recipes with outdated snapshots, change nothing')
+        parser.add_argument('--batch-size', type=int, default=500, help='Number of recipes read and written at once')
+
+    def handle(self, *args, **options):
+        """ Entrypoint for command """
+        queryset = Recipe.objects.order_by('id')
+        if options['missing']:
+            queryset = queryset.filter(nested_snapshot__isnull=True)
+        recipe_ids = queryset.values_list('id', flat=True).iterator()
+
+        count, outdated = 0, []
+        while True:
+            batch = list(islice(recipe_ids, options['batch_size']))
+            if not batch:
+                break
+            count += len(batch)
+
+            if options['verify']:
+                stored = dict(Recipe.objects.filter(id__in=batch).values_list('id', 'nested_snapshot'))
+                outdated += [recipe_id for recipe_id, snapshot in snapshots.build_snapshots(batch).items() if stored.get(recipe_id) != snapshot]
+            else:
+                # Under READ COMMITTED a transaction alone doesn't stop links being changed while the batch is built.
+                # Every writer changing what a snapshot holds also updates the recipe rows (the recipe itself, or
+                # updated_at and nested_snapshot=NULL of the linked recipes, see recipe.signals), so with the rows
+                # locked it either committed before we read the links, or waits and writes after our snapshots.
+                with transaction.atomic():
+                    list(Recipe.objects.filter(id__in=batch).order_by('id').select_for_update().values_list('id', flat=True))
+                    snapshots.update_snapshots(batch, options['batch_size'])
+
+        if not options['verify']:
+            self.stdout.write(self.style.SUCCESS(f'Rebuilt {count} snapshots'))
+        elif outdated:
+            shown = ', '.join(map(str, outdated[:20]))
+            raise CommandError(f'{len(outdated)} of {count} snapshots are outdated or missing (IDs: {shown}{", ..." if len(outdated) > 20 else ""})')
+        else:
+            self.stdout.write(self.style.SUCCESS(f'All {count} snapshots are up to date'))
@@ -0,0 +1,59 @@
+""" Full-text search of recipes """
+from django.contrib.postgres.aggregates import StringAgg
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+from django.db import connections, router
+from django.db.models import DecimalField, Exists, F, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Cast, Coalesce
+
+from core.models import Recipe, Tag, Ingredient
+
+# Text search configuration used both for the stored vectors and for the queries, they have to match
+SEARCH_CONFIG = 'english'
+
+# The pagination cursor keeps the rank of the last result as text and the next page filters on it. ts_rank() is a
+# float4, which doesn't compare exactly with that text, so results at a page boundary were repeated or skipped.
+# Ranks are rounded to a numeric, so the cursor holds exactly the value the next page compares.
+RANK_FIELD = DecimalField(max_digits=16, decimal_places=6)
+
+
+def is_supported():
+    """ Return True if the recipes are stored in a database with full-text search (Postgres) """
+    return connections[router.db_for_write(Recipe)].vendor == 'postgresql'
+
+
+def _names(model):
+    """ Return all names of the recipe's tags or ingredients as one string """
+    names = model.objects.filter(recipe=OuterRef('pk')).order_by().values('recipe').annotate(names=StringAgg('name', ' '))
+    return Coalesce(Subquery(names.values('names')), Value(''))
+
+
+# Recipe.search_vector is a stored tsvector with a GIN index (migration 0012), so searching doesn't parse any text.
+# It's not a generated column, because it includes names of tags and ingredients from other tables. Instead, it's
+# updated by the code that writes them: RecipeSerializer, RecipeAdmin and recipe.signals (renamed/deleted tags).
+def update_search_vectors(recipe_ids):
+    """ Rebuild stored search vectors of the recipes with one UPDATE """
+    if not is_supported() or not recipe_ids:
+        return
+    Recipe.objects.filter(pk__in=recipe_ids).update(search_vector=(
+        SearchVector('title', weight='A', config=SEARCH_CONFIG)
+        + SearchVector(_names(Tag), _names(Ingredient), weight='B', config=SEARCH_CONFIG)
+        + SearchVector('description', weight='C', config=SEARCH_CONFIG)
+    ))
+
+
+def search_recipes(queryset, text):
+    """ Filter recipes matching the search text, best matches first """
+    if is_supported():
+        # websearch syntax: quoted phrases, "or" and -excluded words, never a syntax error
+        query = SearchQuery(text, search_type='websearch', config=SEARCH_CONFIG)
+        return queryset.filter(search_vector=query).annotate(
+            search_rank=Cast(SearchRank(F('search_vector'), query), output_field=RANK_FIELD),
+        ).order_by('-search_rank', '-id')
+
+    # Other databases (SQLite in development) get substring matching on the same fields, unranked
+    return queryset.filter(
+        Q(title__icontains=text)
+        | Q(description__icontains=text)
+        | Exists(Tag.objects.filter(recipe=OuterRef('pk'), name__icontains=text))
+        | Exists(Ingredient.objects.filter(recipe=OuterRef('pk'), name__icontains=text))
+    )
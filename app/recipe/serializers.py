@@ -1,33 +1,79 @@
 """ Serializers for recipe API """
+from django.db import transaction
 from rest_framework import serializers
 from core.models import Recipe, Tag, Ingredient
+from core.serializers import TimedListSerializer, TimedModelSerializer
+from recipe import search, autocomplete, snapshots
 
 
-class IngredientSerializer(serializers.ModelSerializer):
+def normalize_name(name):
+    """ Return the name a tag/ingredient is stored with """
+    return ' '.join(name.split()).title()
+
+
+def get_or_create_attrs(model, user, names):
+    """ Return user's tags or ingredients with given names, creating the missing ones in bulk """
+    # This makes sure that we won't have repetetive tags/ingredients in the DB.
+    # dict.fromkeys() drops duplicated names and keeps the order of the payload.
+    names = list(dict.fromkeys(normalize_name(name) for name in names))
+    if not names:
+        return []
+
+    # 1 query for the existing ones, instead of one get_or_create() per name
+    objs = {obj.name: obj for obj in model.objects.filter(user=user, name__in=names)}
+    missing = [name for name in names if name not in objs]
+    if missing:
+        # ignore_conflicts -> INSERT ... ON CONFLICT DO NOTHING. If a concurrent request has just created
+        # the same name, the unique constraint on (user, name) skips it instead of failing.
+        # Skipped rows get no id, so we read all missing names back.
+        model.objects.bulk_create([model(user=user, name=name) for name in missing], ignore_conflicts=True)
+        objs.update({obj.name: obj for obj in model.objects.filter(user=user, name__in=missing)})
+        # bulk_create() doesn't send post_save, which drops the autocomplete index in recipe.signals
+        autocomplete.invalidate(model, user.id)
+
+    return [objs[name] for name in names]
+
+
+class RecipeAttrSerializer(TimedModelSerializer):
+    """ Base serializer for tags and ingredients """
+
+    def validate_name(self, value):
+        """ Make sure a renamed tag/ingredient doesn't clash with another one of the user """
+        if self.instance is not None:
+            others = type(self.instance).objects.filter(user_id=self.instance.user_id, name=value).exclude(pk=self.instance.pk)
+            if others.exists():
+                raise serializers.ValidationError(f'You already have "{value}".')
+        return value
+
+
+class IngredientSerializer(RecipeAttrSerializer):
     """ Serializer for Ingredients """
 
     class Meta:
         model = Ingredient
+        list_serializer_class = TimedListSerializer
         fields = ['id', 'name']
         read_only_fields = ['id']
 
 
-class TagSerializer(serializers.ModelSerializer):
+class TagSerializer(RecipeAttrSerializer):
     """ Serializer for Tags """
 
     class Meta:
         model = Tag
+        list_serializer_class = TimedListSerializer
         fields = ['id', 'name']
         read_only_fields = ['id']  # Optional, id is read-only by default
 
 
-class RecipeSerializer(serializers.ModelSerializer):
+class RecipeSerializer(TimedModelSerializer):
     """ Serializer for Recipes """
     tags = TagSerializer(many=True, required=False)
     ingredients = IngredientSerializer(many=True, required=False)
 
     class Meta:
         model = Recipe
+        list_serializer_class = TimedListSerializer
         fields = ['id', 'title', 'time_minutes', 'price', 'link', 'tags', 'ingredients']
         # extra_kwargs = {'user': {'read_only': True}} # If allowed, remember to add 'user' to the fields
 
@@ -37,76 +83,93 @@ class RecipeSerializer(serializers.ModelSerializer):
     #     response['user'] = instance.user.name
     #     return response
 
-    def _get_or_create_tags(self, tags, recipe):
-        """ Handle getting or creating tags and ingredients """
-        authenticated_user = self.context['request'].user
-        for tag in tags:
-            tag['name'] = ' '.join(tag['name'].split()).title()
-            tag_obj, created = Tag.objects.get_or_create(user=authenticated_user, **tag)
-            recipe.tags.add(tag_obj)
-
-    def _get_or_create_ingredients(self, ingredients, recipe):
-        """ Handle getting or creating ingredients """
-        authenticated_user = self.context['request'].user
-        for ingredient in ingredients:
-            # This makes sure that we won't have repetetive ingredients in the DB.
-            ingredient['name'] = ' '.join(ingredient['name'].split()).title()
-            ingredient_obj, created = Ingredient.objects.get_or_create(user=authenticated_user, **ingredient)
-            recipe.ingredients.add(ingredient_obj)
+    def _get_or_create_attrs(self, model, items):
+        """ Return tags or ingredients with given names, creating the missing ones in bulk """
+        return get_or_create_attrs(model, self.context['request'].user, [item['name'] for item in items])
 
     # We need to specify custom create() and update() methods because nested M2M fields are read-only by default.
     # We need to override these methods for creating and updating many-to-many fields to work.
     # validated_data is a python dictionary of all the data passed in the request
     # By default create() and update() methods in serializer simply call Manager's create and update methods (reminder)
+    # Both are atomic, the recipe, its tags and ingredients and their snapshot (recipe.snapshots) are written together
+    @transaction.atomic
     def create(self, validated_data):
         """ Create a recipe """
-        # 1. Remove tags and ingredients from validated data and return them
-        tags = validated_data.pop('tags', [])
-        ingredients = validated_data.pop('ingredients', [])
+        # 1. Remove tags and ingredients from validated data and get or create them
+        tags = self._get_or_create_attrs(Tag, validated_data.pop('tags', []))
+        ingredients = self._get_or_create_attrs(Ingredient, validated_data.pop('ingredients', []))
 
-        # 2. Create a new recipe object with correct values
-        recipe = Recipe.objects.create(**validated_data)
+        # 2. Create a new recipe object with correct values, the snapshot is known without any extra query
+        recipe = Recipe.objects.create(**validated_data, nested_snapshot=snapshots.snapshot_of(tags=tags, ingredients=ingredients))
+        snapshots.keep_snapshot(recipe)
 
-        # 3. Get authenticated user from the request and loop through tags and ingredients from validated data
-        self._get_or_create_tags(tags, recipe)
-        self._get_or_create_ingredients(ingredients, recipe)
+        # 3. add() inserts all the through table rows with a single query
+        recipe.tags.add(*tags)
+        recipe.ingredients.add(*ingredients)
 
+        # After the tags and ingredients, their names are searchable too
+        search.update_search_vectors([recipe.id])
         return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
         """ Update a recipe """
         tags = validated_data.pop('tags', None)
         ingredients = validated_data.pop('ingredients', None)
+        snapshots.keep_snapshot(instance)  # Rebuilt below
         # If empty array, it will enter the if block and clear all the tags from the recipe
+        # set() compares the new tags with the current ones, and only deletes the removed links and inserts the added
+        # ones. Clearing and re-adding everything would rewrite the whole through table of the recipe on every update.
         if tags is not None:
-            instance.tags.clear()
-            self._get_or_create_tags(tags, instance)  # Instance = recipe
+            instance.tags.set(self._get_or_create_attrs(Tag, tags))  # Instance = recipe
 
         if ingredients is not None:
-            instance.ingredients.clear()
-            self._get_or_create_ingredients(ingredients, instance)
+            instance.ingredients.set(self._get_or_create_attrs(Ingredient, ingredients))
 
         for attr, value in validated_data.items():
             setattr(instance, attr, value)
 
         instance.save()
+        if tags is not None or ingredients is not None:
+            snapshots.update_snapshots([instance.id])
+        search.update_search_vectors([instance.id])
         return instance
 
 
 class RecipeDetailSerializer(RecipeSerializer):
     """ Serializer for Recipe Detail View """
+    # Empty until the background worker (recipe/images.py) has generated the variants
+    image_variants = serializers.SerializerMethodField()
 
     class Meta(RecipeSerializer.Meta):
-        fields = RecipeSerializer.Meta.fields + ['description', 'image']
+        fields = RecipeSerializer.Meta.fields + ['description', 'image', 'image_variants']
+
+    def get_image_variants(self, recipe) -> dict:
+        """ Return URLs of the resized images, the same way ImageField returns the URL of the original """
+        request = self.context.get('request')
+        urls = {}
+        for variant, path in recipe.image_variants.items():
+            url = recipe.image.storage.url(path)
+            urls[variant] = request.build_absolute_uri(url) if request is not None else url
+        return urls
+
+
+class RecipeBulkSerializer(RecipeDetailSerializer):
+    """ Serializer for Recipe bulk import and export """
+
+    class Meta(RecipeDetailSerializer.Meta):
+        # Exported recipes include URLs of their images, importing them back ignores them
+        read_only_fields = ['image']
 
 
 # We create a seperate API for images, because it's the best practice to only upload one type of data to an API.
 # I don't want to upload a form data/JSON data which contains all the form data of a recipe as well as an image.
 # I want to have a specific separate API just for handling the image upload.
-class RecipeImageSerializer(serializers.ModelSerializer):
+class RecipeImageSerializer(TimedModelSerializer):
     """ Serializer for uploading images to recipes """
 
     class Meta:
         model = Recipe
+        list_serializer_class = TimedListSerializer
         fields = ['id', 'image']
         # extra_kwargs = {'image': {'required': True}}
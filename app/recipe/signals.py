@@ -0,0 +1,97 @@
+""" Signal handlers for the recipe app """
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import post_save, pre_delete, post_delete, m2m_changed
+from django.dispatch import receiver
+from django.utils import timezone
+
+from core.models import Recipe, Tag, Ingredient
+from recipe import cache, search, autocomplete, snapshots
+
+
+# Recipes with the same image share its file and variants. Images are never deleted along with a recipe (or when
+# it gets a new image): another upload of the same file could be reusing them at the same time. Unused files are
+# deleted by the collect_recipe_images command, which scripts/run.sh runs every hour.
+
+
+# Signals are sent for writes made by the API, the admin and anything else using the ORM. Tags and ingredients of a
+# recipe are changed together with the recipe itself by the serializers and the admin (they save the recipe first),
+# other changes of the links are handled by drop_snapshots.
+@receiver(post_save, sender=Recipe)
+@receiver(post_save, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Recipe)
+@receiver(post_delete, sender=Tag)
+@receiver(post_delete, sender=Ingredient)
+def invalidate_cached_responses(sender, instance, **kwargs):
+    """ Invalidate cached responses of the owner of a changed recipe, tag or ingredient """
+    cache.bump_version(instance.user_id)
+
+
+# Connecting m2m_changed makes Django check for existing rows before M2M inserts (one more query per add()), but
+# otherwise recipe.tags.add() anywhere but in the writers of recipe.snapshots would leave an outdated snapshot.
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def drop_snapshots(sender, instance, action, reverse, pk_set, **kwargs):
+    """ Set snapshots of recipes whose tags or ingredients were linked or unlinked to NULL """
+    if action not in ('post_add', 'post_remove', 'pre_clear') or (action != 'pre_clear' and not pk_set):
+        return
+
+    if reverse:
+        # Links of a tag/ingredient, pk_set holds IDs of the recipes (on clear, all its recipes lose the link)
+        field_name = 'tags' if sender is Recipe.tags.through else 'ingredients'
+        recipes = Recipe.objects.filter(pk__in=pk_set) if pk_set is not None else Recipe.objects.filter(**{field_name: instance})
+    elif snapshots.is_kept(instance):
+        return
+    else:
+        recipes = Recipe.objects.filter(pk=instance.pk)
+        instance.nested_snapshot = None
+    # NULL snapshots are listed through the M2M tables, until rebuild_recipe_snapshots --missing rebuilds them
+    recipes.update(nested_snapshot=None)
+    cache.bump_version(instance.user_id)
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Tag)
+@receiver(post_delete, sender=Ingredient)
+def drop_autocomplete_index(sender, instance, **kwargs):
+    """ Drop the in-process autocomplete index of the owner of a changed tag or ingredient """
+    autocomplete.invalidate(sender, instance.user_id)
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+@receiver(pre_delete, sender=Tag)
+@receiver(pre_delete, sender=Ingredient)
+def touch_recipes(sender, instance, created=False, signal=None, **kwargs):
+    """ Mark recipes showing a renamed or deleted tag/ingredient as modified and update their search vectors """
+    # Recipes embed names of their tags and ingredients, so their ETags have to change too. On delete, this has to
+    # run before the links to the recipes are deleted.
+    if not created:
+        field_name = 'tags' if sender is Tag else 'ingredients'
+        recipe_ids = list(Recipe.objects.filter(**{field_name: instance}).values_list('id', flat=True))
+        Recipe.objects.filter(id__in=recipe_ids).update(updated_at=timezone.now())
+        # After the delete is committed, the name is no longer linked to the recipes
+        transaction.on_commit(lambda: search.update_search_vectors(recipe_ids))
+
+        if signal is pre_delete:
+            # Snapshots are rebuilt by refresh_snapshots, once the links are deleted
+            instance._snapshot_recipe_ids = recipe_ids
+        else:
+            snapshots.update_snapshots(recipe_ids)
+
+
+@receiver(post_delete, sender=Tag)
+@receiver(post_delete, sender=Ingredient)
+def refresh_snapshots(sender, instance, **kwargs):
+    """ Rebuild snapshots of recipes which showed a deleted tag/ingredient """
+    # Same transaction as the delete (Django deletes objects and their links atomically)
+    snapshots.update_snapshots(getattr(instance, '_snapshot_recipe_ids', []))
+
+
+@receiver(post_save, sender=get_user_model())
+def start_response_version(sender, instance, created, **kwargs):
+    """ Make sure a new user can't see responses cached for a deleted user with the same ID """
+    if created:
+        cache.bump_version(instance.id)
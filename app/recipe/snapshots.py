@@ -0,0 +1,57 @@
+""" Denormalized snapshots of recipes' tags and ingredients (Recipe.nested_snapshot) """
+from core.models import Recipe
+
+# Nested fields of RecipeSerializer and the fields of their serializers (TagSerializer, IngredientSerializer)
+NESTED_FIELDS = ['tags', 'ingredients']
+ITEM_FIELDS = ['id', 'name']
+
+
+# The recipe list renders tags and ingredients from the snapshot, so it reads a single table. Recipes without one
+# (NULL, e.g. created before the column existed) are listed the regular way, through the M2M tables.
+# Snapshots are written by the code that changes the M2M rows or the names, in the same transaction:
+# RecipeSerializer, RecipeAdmin, the bulk import and recipe.signals (renamed and deleted tags/ingredients).
+# Any other change of the links (e.g. recipe.tags.add() in a shell or a migration) sets the snapshot to NULL
+# (recipe.signals.drop_snapshots), until rebuild_recipe_snapshots --missing rebuilds it.
+def keep_snapshot(recipe):
+    """ Mark the recipe as having its snapshot written by the caller, so changing its links doesn't drop it """
+    recipe._keep_snapshot = True
+    return recipe
+
+
+def is_kept(recipe):
+    """ Return True if the recipe's snapshot is written by the code changing its links """
+    return getattr(recipe, '_keep_snapshot', False)
+
+
+def snapshot_of(**items):
+    """ Return the snapshot of given tags and ingredients, ordered by ID like the regular list """
+    return {
+        field_name: [{name: getattr(obj, name) for name in ITEM_FIELDS} for obj in sorted(objs, key=lambda obj: obj.pk)]
+        for field_name, objs in items.items()
+    }
+
+
+def build_snapshots(recipe_ids):
+    """ Return snapshots of the recipes read from the M2M tables, one query per nested field """
+    snapshots = {recipe_id: {field_name: [] for field_name in NESTED_FIELDS} for recipe_id in recipe_ids}
+    if not snapshots:
+        return snapshots
+
+    for field_name in NESTED_FIELDS:
+        m2m = Recipe._meta.get_field(field_name)
+        source, target = m2m.m2m_field_name(), m2m.m2m_reverse_field_name()
+        related = (
+            m2m.remote_field.through.objects.filter(**{f'{source}_id__in': snapshots}).order_by(f'{target}_id')
+            .values_list(f'{source}_id', *[f'{target}__{name}' for name in ITEM_FIELDS])
+        )
+        for recipe_id, *values in related:
+            snapshots[recipe_id][field_name].append(dict(zip(ITEM_FIELDS, values)))
+    return snapshots
+
+
+def update_snapshots(recipe_ids, batch_size=500):
+    """ Rebuild snapshots of the recipes from the M2M tables """
+    snapshots = build_snapshots(recipe_ids)
+    Recipe.objects.bulk_update(
+        [Recipe(id=recipe_id, nested_snapshot=snapshot) for recipe_id, snapshot in snapshots.items()], ['nested_snapshot'], batch_size=batch_size
+    )
@@ -0,0 +1,97 @@
+""" Tests for recipe management commands """
+import os
+import tempfile
+from decimal import Decimal
+from io import StringIO
+from unittest import skipUnless
+
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.management import call_command, CommandError
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from core.models import Recipe
+
+
+class CollectRecipeImagesTests(TestCase):
+    """ Test garbage collecting recipe images """
+
+    def setUp(self):
+        self.media_root = tempfile.TemporaryDirectory()
+        self.settings_override = override_settings(MEDIA_ROOT=self.media_root.name)
+        self.settings_override.enable()
+        self.storage = Recipe._meta.get_field('image').storage
+        user = get_user_model().objects.create_user('user@example.com', 'test1234')
+        self.recipe = Recipe.objects.create(user=user, title='Recipe', time_minutes=5, price=Decimal('1.00'))
+
+    def tearDown(self):
+        self.settings_override.disable()
+        self.media_root.cleanup()
+
+    def test_unreferenced_files_deleted(self):
+        """ Test files not used by any recipe are deleted and used ones are kept """
+        self.recipe.image = 'uploads/recipe/ab/used.jpg'
+        self.recipe.image_variants = {'thumbnail': 'uploads/recipe/ab/used_thumbnail.jpg'}
+        self.recipe.save()
+        for name in ['ab/used.jpg', 'ab/used_thumbnail.jpg', 'cd/orphan.jpg']:
+            self.storage.save(os.path.join('uploads', 'recipe', name), ContentFile(b'image'))
+
+        call_command('collect_recipe_images', min_age=0, stdout=StringIO())
+
+        self.assertTrue(self.storage.exists('uploads/recipe/ab/used.jpg'))
+        self.assertTrue(self.storage.exists('uploads/recipe/ab/used_thumbnail.jpg'))
+        self.assertFalse(self.storage.exists('uploads/recipe/cd/orphan.jpg'))
+
+    def test_recent_files_kept(self):
+        """ Test files younger than min_age are kept, their recipe may not be saved yet """
+        self.storage.save('uploads/recipe/cd/new.jpg', ContentFile(b'image'))
+
+        call_command('collect_recipe_images', stdout=StringIO())
+
+        self.assertTrue(self.storage.exists('uploads/recipe/cd/new.jpg'))
+
+
+class RebuildRecipeSnapshotsTests(TestCase):
+    """ Test rebuilding and verifying snapshots of recipes' tags and ingredients """
+
+    def setUp(self):
+        user = get_user_model().objects.create_user('user@example.com', 'test1234')
+        self.recipes = [Recipe.objects.create(user=user, title=f'Recipe {i}', time_minutes=5, price=Decimal('1.00')) for i in range(3)]
+        for recipe in self.recipes:
+            recipe.tags.create(user=user, name=recipe.title)
+
+    def test_verify_reports_outdated(self):
+        """ Test if --verify fails while snapshots are missing and passes after a rebuild """
+        with self.assertRaisesMessage(CommandError, '3 of 3 snapshots are outdated or missing'):
+            call_command('rebuild_recipe_snapshots', verify=True, stdout=StringIO())
+
+        call_command('rebuild_recipe_snapshots', batch_size=2, stdout=StringIO())
+
+        call_command('rebuild_recipe_snapshots', verify=True, stdout=StringIO())
+        self.recipes[0].refresh_from_db()
+        self.assertEqual(self.recipes[0].nested_snapshot, {'tags': [{'id': self.recipes[0].tags.get().id, 'name': 'Recipe 0'}], 'ingredients': []})
+
+    def test_missing_only(self):
+        """ Test if --missing leaves existing snapshots alone """
+        Recipe.objects.filter(id=self.recipes[0].id).update(nested_snapshot={'tags': [], 'ingredients': []})
+
+        out = StringIO()
+        call_command('rebuild_recipe_snapshots', missing=True, stdout=out)
+
+        self.assertIn('Rebuilt 2 snapshots', out.getvalue())
+        self.recipes[0].refresh_from_db()
+        self.assertEqual(self.recipes[0].nested_snapshot, {'tags': [], 'ingredients': []})
+
+    @skipUnless(connection.features.has_select_for_update, 'The database has no row locks')
+    def test_batch_rows_locked(self):
+        """ Test if recipes of a batch are locked before their links are read """
+        with CaptureQueriesContext(connection) as queries:
+            call_command('rebuild_recipe_snapshots', stdout=StringIO())
+
+        sql = [query['sql'] for query in queries.captured_queries]
+        locks = [i for i, query in enumerate(sql) if query.endswith('FOR UPDATE')]
+        reads = [i for i, query in enumerate(sql) if 'core_recipe_tags' in query]
+        self.assertTrue(locks)
+        self.assertLess(locks[0], reads[0])
@@ -9,6 +9,7 @@ from rest_framework import status
 from rest_framework.test import APIClient
 
 from core.models import Ingredient, Recipe
+from core.testing import QueryCountTestMixin
 from recipe.serializers import IngredientSerializer
 
 INGREDIENTS_URL = reverse('recipe:ingredient-list')
@@ -135,3 +136,40 @@ class PrivateIngredientsAPITests(TestCase):
 
         res = self.client.get(INGREDIENTS_URL, {'assigned_only': 1})
         self.assertEqual(len(res.data), 1)
+
+
+class IngredientQueryCountTests(QueryCountTestMixin, TestCase):
+    """ Test the number of queries of ingredient endpoints doesn't grow with the number of ingredients """
+
+    def setUp(self):
+        self.user = create_user()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.recipe = Recipe.objects.create(user=self.user, title='Soup', time_minutes=5, price=Decimal('1.00'))
+
+    def add_ingredients(self, count):
+        """ Create ingredients, assigned to a recipe """
+        self.recipe.ingredients.add(*[
+            Ingredient.objects.create(user=self.user, name=f'Ingredient {Ingredient.objects.count()}') for _ in range(count)
+        ])
+
+    def test_list(self):
+        """ Test listing all and assigned ingredients """
+        for params in [{}, {'assigned_only': 1}]:
+            with self.subTest(params=params):
+                self.assertConstantQueries(lambda: self.client.get(INGREDIENTS_URL, params), self.add_ingredients)
+
+    def add_linked_recipes(self, count):
+        """ Create recipes, then a new ingredient linked to all of them """
+        for _ in range(count):
+            Recipe.objects.create(user=self.user, title='Soup', time_minutes=5, price=Decimal('1.00'))
+        self.ingredient = Ingredient.objects.create(user=self.user, name=f'Ingredient {Ingredient.objects.count()}')
+        self.ingredient.recipe_set.add(*Recipe.objects.filter(user=self.user))
+
+    def test_update_and_delete(self):
+        """ Test renaming and deleting an ingredient of more and more recipes """
+        self.assertConstantQueries(
+            self.committed(lambda: self.client.patch(detail_url(self.ingredient.id), {'name': f'Renamed {self.ingredient.id}'})),
+            self.add_linked_recipes,
+        )
+        self.assertConstantQueries(self.committed(lambda: self.client.delete(detail_url(self.ingredient.id))), self.add_linked_recipes)
@@ -0,0 +1,63 @@
+""" Tests for query plans of the recipe API """
+from unittest import skipUnless
+
+from django.test import TestCase
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from benchmarks.data import seed
+from core.models import Recipe, Tag, Ingredient
+from core.testing import QueryPlanTestMixin
+from recipe import views, search
+
+
+def view_queryset(viewset, user, action='list', params=None):
+    """ Return the queryset a viewset uses for a request of the user """
+    request = Request(APIRequestFactory().get('/', params))
+    request.user = user
+    view = viewset(request=request, action=action, format_kwarg=None, kwargs={})
+    return view.filter_queryset(view.get_queryset())
+
+
+class QueryPlanTests(QueryPlanTestMixin, TestCase):
+    """ Test queries of the recipe views are answered from indexes """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = seed(users=3, recipes=50)[0]
+        cls.tag_ids = list(Tag.objects.filter(user=cls.user).values_list('id', flat=True)[:2])
+        cls.ingredient_ids = list(Ingredient.objects.filter(user=cls.user).values_list('id', flat=True)[:2])
+
+    def test_recipe_list(self):
+        """ Test listing recipes reads them in index order """
+        self.assertUsesIndex(view_queryset(views.RecipeViewSet, self.user))
+
+    def test_recipe_list_next_page(self):
+        """ Test the cursor of the next page seeks into the index """
+        queryset = view_queryset(views.RecipeViewSet, self.user).filter(id__lt=Recipe.objects.latest('id').id)
+        self.assertUsesIndex(queryset)
+
+    def test_recipe_list_filtered(self):
+        """ Test filtering recipes by tags and ingredients doesn't scan any table """
+        params = {
+            'tags': ','.join(map(str, self.tag_ids)),
+            'ingredients': ','.join(map(str, self.ingredient_ids)),
+            'ingredients_match': 'all',
+        }
+        self.assertUsesIndex(view_queryset(views.RecipeViewSet, self.user, params=params), ordered=False)
+
+    @skipUnless(search.is_supported(), 'Full-text search needs Postgres')
+    def test_recipe_search(self):
+        """ Test searching recipes doesn't scan them """
+        self.assertUsesIndex(view_queryset(views.RecipeViewSet, self.user, params={'search': 'recipe'}), ordered=False)
+
+    def test_tag_and_ingredient_lists(self):
+        """ Test listing tags and ingredients reads them in index order """
+        for viewset in [views.TagViewSet, views.IngredientViewset]:
+            with self.subTest(viewset=viewset.__name__):
+                self.assertUsesIndex(view_queryset(viewset, self.user))
+                self.assertUsesIndex(view_queryset(viewset, self.user, params={'assigned_only': 1}), ordered=False)
+
+    def test_tag_name_lookup(self):
+        """ Test looking up tags by name (when creating recipes) uses the unique (user, name) index """
+        self.assertUsesIndex(Tag.objects.filter(user=self.user, name__in=['Tag 1', 'Tag 2']), ordered=False)
@@ -1,20 +1,33 @@
 """ Tests for recipe API """
 from decimal import Decimal
+import io
+import json
 import tempfile
 import os
+from io import StringIO
+from unittest import skipUnless
+from unittest.mock import patch
 
 from PIL import Image
 
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.core.cache import caches
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APIClient
 
 from core.models import Recipe, Tag, Ingredient
+from core.testing import QueryCountTestMixin
+from recipe import cache, images, search, snapshots
 from ..serializers import RecipeSerializer, RecipeDetailSerializer
 
 RECIPES_URL = reverse('recipe:recipe-list')
+BULK_URL = reverse('recipe:recipe-bulk')
+EXPORT_URL = reverse('recipe:recipe-export')
 
 
 def detail_url(recipe_id):
@@ -285,6 +298,36 @@ class PrivateRecipeAPITests(TestCase):
         self.assertEqual(res.status_code, status.HTTP_200_OK)
         self.assertEqual(recipe.tags.count(), 0)
 
+    def test_update_recipe_tags_only_changes_diff(self):
+        """ Test updating tags keeps the links that didn't change """
+        recipe = create_recipe(user=self.user)
+        breakfast = Tag.objects.create(user=self.user, name='Breakfast')
+        lunch = Tag.objects.create(user=self.user, name='Lunch')
+        recipe.tags.add(breakfast, lunch)
+        kept_link = Recipe.tags.through.objects.get(recipe=recipe, tag=breakfast)
+
+        payload = {'tags': [{'name': 'Breakfast'}, {'name': 'Dinner'}]}
+        res = self.client.patch(detail_url(recipe.id), payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(set(recipe.tags.values_list('name', flat=True)), {'Breakfast', 'Dinner'})
+        # The link of the tag that stayed wasn't deleted and re-inserted
+        self.assertTrue(Recipe.tags.through.objects.filter(id=kept_link.id).exists())
+
+    def test_update_recipe_tags_query_count_constant(self):
+        """ Test updating tags runs the same number of queries regardless of the number of tags """
+        def update_with_tags(size):
+            recipe = create_recipe(user=self.user)
+            recipe.tags.add(*[Tag.objects.get_or_create(user=self.user, name=f'Old {i}')[0] for i in range(size)])
+            payload = {'tags': [{'name': f'New {i}'} for i in range(size)]}
+            with CaptureQueriesContext(connection) as queries:
+                res = self.client.patch(detail_url(recipe.id), payload, format='json')
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            self.assertEqual(len(res.data['tags']), size)
+            return len(queries)
+
+        self.assertEqual(update_with_tags(2), update_with_tags(25))
+
     def test_create_recipe_with_new_ingredients(self):
         """ Test creating a recipe with new ingredients """
         payload = {
@@ -423,6 +466,47 @@ class PrivateRecipeAPITests(TestCase):
         self.assertEqual(Ingredient.objects.count(), 1)
         self.assertEqual(ingredient.name, res.data['ingredients'][0]['name'])
 
+    def test_create_recipe_with_many_tags_and_ingredients_query_count(self):
+        """ Test creating tags and ingredients runs a fixed number of queries regardless of their number """
+        Tag.objects.create(user=self.user, name='Existing')
+
+        def payload(size):
+            return {
+                'title': 'Sample recipe',
+                'time_minutes': 30,
+                'price': Decimal('5.99'),
+                'tags': [{'name': 'Existing'}] + [{'name': f'Tag {i}'} for i in range(size)],
+                'ingredients': [{'name': f'Ingredient {i}'} for i in range(size)],
+            }
+
+        # Savepoint + recipe insert + (select, insert, select, existing links select, links insert) per relation + release
+        # + select per relation for the response. The existing links are checked because of recipe.signals.drop_snapshots.
+        with self.assertNumQueries(15):
+            res = self.client.post(RECIPES_URL, payload(2), format='json')
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+
+        with self.assertNumQueries(15):
+            res = self.client.post(RECIPES_URL, payload(30), format='json')
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+
+        self.assertEqual(len(res.data['tags']), 31)
+        self.assertEqual(len(res.data['ingredients']), 30)
+        self.assertEqual(Tag.objects.filter(user=self.user).count(), 31)
+
+    def test_create_recipe_with_duplicated_tags(self):
+        """ Test tags that normalize to the same name are created and assigned once """
+        payload = {
+            'title': 'Pancakes',
+            'time_minutes': 20,
+            'price': Decimal('1.50'),
+            'tags': [{'name': 'breakfast'}, {'name': '  Breakfast '}, {'name': 'Sweet'}],
+        }
+        res = self.client.post(RECIPES_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual([tag['name'] for tag in res.data['tags']], ['Breakfast', 'Sweet'])
+        self.assertEqual(Tag.objects.filter(user=self.user).count(), 2)
+
     def test_filter_by_tags(self):
         """ Test filtering recipes by tags """
         recipe1 = create_recipe(user=self.user, title='Thai Vegetable Curry')
@@ -472,6 +556,109 @@ class PrivateRecipeAPITests(TestCase):
         self.assertIn(s2.data, res.data)
         self.assertNotIn(s3.data, res.data)
 
+    def test_filter_by_tags_no_duplicates(self):
+        """ Test a recipe matching several of the filtered tags is returned once """
+        recipe = create_recipe(user=self.user)
+        tag1 = Tag.objects.create(user=self.user, name='Vegan')
+        tag2 = Tag.objects.create(user=self.user, name='Dinner')
+        recipe.tags.add(tag1, tag2)
+
+        res = self.client.get(RECIPES_URL, {'tags': f'{tag1.id},{tag2.id}'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([r['id'] for r in res.data], [recipe.id])
+
+    def test_filter_by_all_tags(self):
+        """ Test tags_match=all returns only recipes having every tag """
+        tag1 = Tag.objects.create(user=self.user, name='Vegan')
+        tag2 = Tag.objects.create(user=self.user, name='Dinner')
+        recipe1 = create_recipe(user=self.user, title='Vegan Chilli')
+        recipe1.tags.add(tag1, tag2)
+        recipe2 = create_recipe(user=self.user, title='Vegan Smoothie')
+        recipe2.tags.add(tag1)
+
+        params = {'tags': f'{tag1.id},{tag2.id}', 'tags_match': 'all'}
+        res = self.client.get(RECIPES_URL, params)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([r['id'] for r in res.data], [recipe1.id])
+
+    def test_filter_invalid_ids(self):
+        """ Test filtering with non-numeric IDs returns 400 """
+        res = self.client.get(RECIPES_URL, {'tags': '1,abc'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_list_recipes_query_count_constant(self):
+        """ Test listing recipes runs the same number of queries regardless of the result size """
+        for i in range(5):
+            recipe = create_recipe(user=self.user, title=f'Recipe {i}')
+            recipe.tags.add(Tag.objects.create(user=self.user, name=f'Tag {i}'))
+            recipe.ingredients.add(Ingredient.objects.create(user=self.user, name=f'Ingredient {i}'))
+
+        # 1 query for recipes + 1 prefetch query for tags + 1 prefetch query for ingredients
+        with self.assertNumQueries(3):
+            res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data), 5)
+        self.assertEqual(len(res.data[0]['tags']), 1)
+        self.assertEqual(len(res.data[0]['ingredients']), 1)
+
+    def test_retrieve_recipe_prefetches_nested(self):
+        """ Test recipe detail loads tags and ingredients with one query each """
+        recipe = create_recipe(user=self.user)
+        recipe.tags.add(Tag.objects.create(user=self.user, name='Dinner'), Tag.objects.create(user=self.user, name='Vegan'))
+        recipe.ingredients.add(Ingredient.objects.create(user=self.user, name='Salt'))
+
+        with self.assertNumQueries(3):
+            res = self.client.get(detail_url(recipe.id))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data['tags']), 2)
+
+    def test_list_recipes_cursor_pagination(self):
+        """ Test paging through recipes with cursors """
+        recipes = [create_recipe(user=self.user, title=f'Recipe {i}') for i in range(5)]
+
+        res = self.client.get(RECIPES_URL, {'page_size': 2})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertIsNone(res.data['previous'])
+        ids = [recipe['id'] for recipe in res.data['results']]
+
+        while res.data['next']:
+            res = self.client.get(res.data['next'])
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            ids.extend(recipe['id'] for recipe in res.data['results'])
+
+        self.assertEqual(ids, [recipe.id for recipe in reversed(recipes)])
+
+    @override_settings(API_STREAM_CHUNK_SIZE=2)
+    def test_stream_recipes(self):
+        """ Test if streamed list of recipes is the same as the regular one, read with a constant number of queries """
+        for i in range(5):
+            recipe = create_recipe(user=self.user, title=f'Recipe {i}')
+            recipe.tags.add(Tag.objects.create(user=self.user, name=f'Tag {i}'))
+        create_recipe(user=create_user(email='other@example.com', password='test1234'))
+
+        res = self.client.get(RECIPES_URL, {'format': 'json'})
+        streamed = self.client.get(RECIPES_URL, {'stream': 1})
+        with CaptureQueriesContext(connection) as queries:
+            content = b''.join(streamed.streaming_content)
+
+        self.assertEqual(streamed['Content-Type'], 'application/json')
+        self.assertEqual(content, res.content)
+        self.assertEqual(json.loads(content)[0]['title'], 'Recipe 4')
+        # 1 query for the recipes + 3 chunks * (1 prefetch query for tags + 1 for ingredients)
+        self.assertEqual(len(queries), 7)
+
+    def test_list_recipes_invalid_cursor(self):
+        """ Test a tampered cursor returns 404 """
+        create_recipe(user=self.user)
+        res = self.client.get(RECIPES_URL, {'page_size': 1, 'cursor': 'notacursor'})
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
 
 class ImageUploadTests(TestCase):
     """ Tests for the image upload API """
@@ -483,6 +670,9 @@ class ImageUploadTests(TestCase):
         self.recipe = create_recipe(user=self.user)
 
     def tearDown(self):
+        self.recipe.refresh_from_db()
+        for path in self.recipe.image_variants.values():
+            self.recipe.image.storage.delete(path)
         self.recipe.image.delete()
 
     def test_upload_image(self):
@@ -501,6 +691,137 @@ class ImageUploadTests(TestCase):
         self.assertIn('image', res.data)
         self.assertTrue(os.path.exists(self.recipe.image.path))
 
+    @override_settings(RECIPE_IMAGE_PROCESSING='sync')
+    def test_upload_image_generates_variants(self):
+        """ Test resized variants are generated after the upload and returned by the detail view """
+        url = image_upload_url(self.recipe.id)
+        with tempfile.NamedTemporaryFile(suffix='.png') as image_file:
+            Image.new('RGBA', (1200, 600)).save(image_file, format='PNG')
+            image_file.seek(0)
+            with self.captureOnCommitCallbacks(execute=True):
+                res = self.client.post(url, {'image': image_file}, format='multipart')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.recipe.refresh_from_db()
+        self.assertIn('thumbnail', self.recipe.image_variants)
+        self.assertIn('medium', self.recipe.image_variants)
+        with Image.open(self.recipe.image.storage.path(self.recipe.image_variants['thumbnail'])) as thumbnail:
+            self.assertEqual(thumbnail.size, (200, 100))
+            self.assertEqual(thumbnail.format, 'JPEG')
+
+        res = self.client.get(detail_url(self.recipe.id))
+        self.assertTrue(res.data['image_variants']['medium'].endswith(self.recipe.image_variants['medium']))
+
+    @override_settings(RECIPE_IMAGE_PROCESSING='off')
+    def test_variants_decode_original_once(self):
+        """ Test all variants are made from one decoded original, turned upright by its EXIF orientation """
+        exif = Image.Exif()
+        exif[0x0112] = 6  # Orientation: rotated 90 degrees, shown as 600x1200
+        with tempfile.NamedTemporaryFile(suffix='.jpg') as image_file:
+            Image.new('RGB', (1200, 600)).save(image_file, format='JPEG', exif=exif)
+            image_file.seek(0)
+            res = self.client.post(image_upload_url(self.recipe.id), {'image': image_file}, format='multipart')
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+        with patch('recipe.images.Image.open', wraps=Image.open) as image_open:
+            images.generate_variants(self.recipe.id)
+
+        image_open.assert_called_once()
+        self.recipe.refresh_from_db()
+        with Image.open(self.recipe.image.storage.path(self.recipe.image_variants['thumbnail'])) as thumbnail:
+            self.assertEqual(thumbnail.size, (100, 200))
+
+    @override_settings(RECIPE_IMAGE_MAX_PIXELS=100 * 100)
+    def test_upload_image_too_many_pixels(self):
+        """ Test images with more pixels than the limit are rejected """
+        url = image_upload_url(self.recipe.id)
+        with tempfile.NamedTemporaryFile(suffix='.png') as image_file:
+            Image.new('RGB', (200, 100)).save(image_file, format='PNG')
+            image_file.seek(0)
+            res = self.client.post(url, {'image': image_file}, format='multipart')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('image', res.data)
+        self.recipe.refresh_from_db()
+        self.assertFalse(self.recipe.image)
+
+    @override_settings(RECIPE_IMAGE_MAX_UPLOAD_SIZE=1024)
+    def test_upload_image_too_large(self):
+        """ Test uploads bigger than the size limit are rejected """
+        url = image_upload_url(self.recipe.id)
+        with tempfile.NamedTemporaryFile(suffix='.jpg') as image_file:
+            image_file.write(os.urandom(4096))
+            image_file.seek(0)
+            res = self.client.post(url, {'image': image_file}, format='multipart')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_upload_image_unsupported_format(self):
+        """ Test image formats outside of the allowed ones are rejected by their header """
+        url = image_upload_url(self.recipe.id)
+        with tempfile.NamedTemporaryFile(suffix='.jpg') as image_file:
+            Image.new('RGB', (10, 10)).save(image_file, format='BMP')
+            image_file.seek(0)
+            res = self.client.post(url, {'image': image_file}, format='multipart')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('BMP', str(res.data['image'][0]))
+
+    def test_upload_not_an_image(self):
+        """ Test a file that isn't an image is rejected """
+        url = image_upload_url(self.recipe.id)
+        with tempfile.NamedTemporaryFile(suffix='.jpg') as image_file:
+            image_file.write(b'This is not an image')
+            image_file.seek(0)
+            res = self.client.post(url, {'image': image_file}, format='multipart')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def _upload(self, recipe, color):
+        """ Upload a 10x10 image of color to recipe """
+        with tempfile.NamedTemporaryFile(suffix='.jpg') as image_file:
+            Image.new('RGB', (10, 10), color).save(image_file, format='JPEG')
+            image_file.seek(0)
+            with self.captureOnCommitCallbacks(execute=True):
+                res = self.client.post(image_upload_url(recipe.id), {'image': image_file}, format='multipart')
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        recipe.refresh_from_db()
+        return recipe.image.name
+
+    @override_settings(RECIPE_IMAGE_PROCESSING='off')
+    def test_identical_images_stored_once(self):
+        """ Test the same image uploaded for two recipes is stored once """
+        other_recipe = create_recipe(user=self.user)
+        name = self._upload(self.recipe, 'red')
+        other_name = self._upload(other_recipe, 'red')
+
+        self.assertEqual(name, other_name)
+
+        # Replacing the image of one recipe keeps the file, the other recipe still uses it
+        new_name = self._upload(other_recipe, 'blue')
+        self.assertTrue(self.recipe.image.storage.exists(name))
+
+        # Replacing it again keeps it too, unused files are only deleted by collect_recipe_images
+        green_name = self._upload(self.recipe, 'green')
+        self.assertTrue(self.recipe.image.storage.exists(name))
+        call_command('collect_recipe_images', min_age=0, stdout=StringIO())
+        self.assertFalse(self.recipe.image.storage.exists(name))
+        for used_name in [new_name, green_name]:
+            self.recipe.image.storage.delete(used_name)
+
+    @override_settings(RECIPE_IMAGE_PROCESSING='off')
+    def test_deleting_recipe_keeps_image(self):
+        """ Test deleting a recipe leaves its image to collect_recipe_images """
+        recipe = create_recipe(user=self.user)
+        name = self._upload(recipe, 'yellow')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete(detail_url(recipe.id))
+
+        self.assertTrue(recipe.image.storage.exists(name))
+        call_command('collect_recipe_images', min_age=0, stdout=StringIO())
+        self.assertFalse(recipe.image.storage.exists(name))
+
     def test_upload_image_bad_request(self):
         """ Test uploading invalid image """
         url = image_upload_url(self.recipe.id)
@@ -508,3 +829,541 @@ class ImageUploadTests(TestCase):
         res = self.client.post(url, payload, format='multipart')
 
         self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+@override_settings(CACHES={
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    'responses': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'recipe-api-tests'},
+})
+class ResponseCacheTests(TestCase):
+    """ Test caching of list responses """
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user(email='user@example.com', password='test1234')
+        self.client.force_authenticate(self.user)
+
+    def tearDown(self):
+        caches['responses'].clear()
+
+    def test_list_recipes_served_from_cache(self):
+        """ Test if repeated list requests don't query the database """
+        create_recipe(user=self.user)
+        res1 = self.client.get(RECIPES_URL)
+
+        with CaptureQueriesContext(connection) as queries:
+            res2 = self.client.get(RECIPES_URL)
+
+        self.assertEqual(len(queries), 0)
+        self.assertEqual(res1.data, res2.data)
+
+    def test_equivalent_params_share_cache_entry(self):
+        """ Test if params in a different order hit the same cache entry """
+        tag1 = Tag.objects.create(user=self.user, name='Vegan')
+        tag2 = Tag.objects.create(user=self.user, name='Dinner')
+        self.client.get(RECIPES_URL, {'tags': f'{tag1.id},{tag2.id}', 'tags_match': 'all'})
+
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(RECIPES_URL, {'tags_match': 'all', 'tags': f'{tag2.id},{tag1.id},{tag2.id}'})
+
+        self.assertEqual(len(queries), 0)
+
+    def test_write_invalidates_cache(self):
+        """ Test if creating, updating and deleting recipes shows up in the next list response """
+        self.client.get(RECIPES_URL)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(RECIPES_URL, {'title': 'Soup', 'time_minutes': 10, 'price': Decimal('2.50')})
+        res = self.client.get(RECIPES_URL)
+        self.assertEqual(len(res.data), 1)
+        recipe_id = res.data[0]['id']
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(detail_url(recipe_id), {'title': 'Tomato soup'})
+        res = self.client.get(RECIPES_URL)
+        self.assertEqual(res.data[0]['title'], 'Tomato soup')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete(detail_url(recipe_id))
+        res = self.client.get(RECIPES_URL)
+        self.assertEqual(len(res.data), 0)
+
+    def test_version_bumped_on_commit(self):
+        """ Test a write invalidates cached responses only once it's committed """
+        version = cache.get_version(self.user.id)
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.client.post(RECIPES_URL, {'title': 'Soup', 'time_minutes': 10, 'price': Decimal('2.50')})
+            # A list requested before the commit would be cached under the old version, which the commit bumps
+            self.assertEqual(cache.get_version(self.user.id), version)
+
+        for callback in callbacks:
+            callback()
+        self.assertGreater(cache.get_version(self.user.id), version)
+
+    def test_tag_rename_invalidates_recipe_list(self):
+        """ Test if renaming a tag shows up in cached recipe lists """
+        recipe = create_recipe(user=self.user)
+        tag = Tag.objects.create(user=self.user, name='Breakfast')
+        recipe.tags.add(tag)
+        self.client.get(RECIPES_URL)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(reverse('recipe:tag-detail', args=[tag.id]), {'name': 'Brunch'})
+        res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(res.data[0]['tags'][0]['name'], 'Brunch')
+
+    def test_cache_is_per_user(self):
+        """ Test if users don't get each other's cached responses """
+        other_user = create_user(email='other@example.com', password='test1234')
+        create_recipe(user=other_user)
+        other_client = APIClient()
+        other_client.force_authenticate(other_user)
+        other_client.get(RECIPES_URL)
+
+        res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(len(res.data), 0)
+
+
+@override_settings(CACHES={
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    'responses': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'recipe-etag-tests'},
+})
+class ConditionalGetTests(TestCase):
+    """ Test ETag and Last-Modified validators of the recipe API """
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user(email='user@example.com', password='test1234')
+        self.client.force_authenticate(self.user)
+        self.recipe = create_recipe(user=self.user)
+
+    def tearDown(self):
+        caches['responses'].clear()
+
+    def test_list_not_modified(self):
+        """ Test if listing recipes returns 304 without any query, when the client's copy is current """
+        res = self.client.get(RECIPES_URL)
+        self.assertIn('ETag', res)
+
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.get(RECIPES_URL, HTTP_IF_NONE_MATCH=res['ETag'])
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(len(queries), 0)
+
+    def test_list_etag_per_params(self):
+        """ Test if lists with different params have different ETags """
+        etag = self.client.get(RECIPES_URL)['ETag']
+
+        res = self.client.get(RECIPES_URL, {'title': 'Soup'}, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(res['ETag'], etag)
+
+    @override_settings(CACHES={'responses': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}})
+    def test_list_without_response_cache(self):
+        """ Test if lists have no ETag when the response cache is disabled, so it takes no query """
+        res = self.client.get(RECIPES_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotIn('ETag', res)
+
+    def test_list_modified_after_delete(self):
+        """ Test if deleting a recipe changes the ETag of the list """
+        create_recipe(user=self.user)
+        etag = self.client.get(RECIPES_URL)['ETag']
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.recipe.delete()
+        res = self.client.get(RECIPES_URL, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data), 1)
+
+    def test_detail_not_modified(self):
+        """ Test if recipe detail supports both If-None-Match and If-Modified-Since """
+        res = self.client.get(detail_url(self.recipe.id))
+
+        with self.assertNumQueries(1):
+            res_etag = self.client.get(detail_url(self.recipe.id), HTTP_IF_NONE_MATCH=res['ETag'])
+        res_date = self.client.get(detail_url(self.recipe.id), HTTP_IF_MODIFIED_SINCE=res['Last-Modified'])
+
+        self.assertEqual(res_etag.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(res_etag['ETag'], res['ETag'])
+        self.assertEqual(res_date.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_detail_modified_by_tag_changes(self):
+        """ Test if changing tags of a recipe, or renaming them, changes the ETag of the recipe """
+        etag = self.client.get(detail_url(self.recipe.id))['ETag']
+        self.client.patch(detail_url(self.recipe.id), {'tags': [{'name': 'Dinner'}]}, format='json')
+        res = self.client.get(detail_url(self.recipe.id), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+        etag = res['ETag']
+        tag = self.recipe.tags.get()
+        self.client.patch(reverse('recipe:tag-detail', args=[tag.id]), {'name': 'Supper'})
+        res = self.client.get(detail_url(self.recipe.id), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['tags'][0]['name'], 'Supper')
+
+    def test_assigned_tags_modified_by_recipe_changes(self):
+        """ Test if assigning a tag to a recipe changes the ETag of the assigned only tag list """
+        tag = Tag.objects.create(user=self.user, name='Lunch')
+        url = reverse('recipe:tag-list')
+        etag = self.client.get(url, {'assigned_only': 1})['ETag']
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(detail_url(self.recipe.id), {'tags': [{'name': tag.name}]}, format='json')
+        res = self.client.get(url, {'assigned_only': 1}, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data), 1)
+
+
+class RecipeSearchTests(TestCase):
+    """ Test full-text search of recipes """
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user(email='user@example.com', password='test1234')
+        self.client.force_authenticate(self.user)
+
+        self.soup = create_recipe(user=self.user, title='Tomato soup', description='Simple and quick.')
+        self.pasta = create_recipe(user=self.user, title='Pasta', description='With a tomato sauce.')
+        self.salad = create_recipe(user=self.user, title='Salad', description='Fresh.')
+        self.salad.tags.add(Tag.objects.create(user=self.user, name='Vegan'))
+        self.salad.ingredients.add(Ingredient.objects.create(user=self.user, name='Cucumber'))
+        # Recipes were created with the ORM, serializers and the admin do this on their own
+        search.update_search_vectors([self.soup.id, self.pasta.id, self.salad.id])
+
+    def test_search_title_and_description(self):
+        """ Test if search matches titles and descriptions, best matches first on Postgres """
+        res = self.client.get(RECIPES_URL, {'search': 'tomato'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        ids = [recipe['id'] for recipe in res.data]
+        if search.is_supported():
+            self.assertEqual(ids, [self.soup.id, self.pasta.id])
+        else:
+            self.assertCountEqual(ids, [self.soup.id, self.pasta.id])
+
+    def test_search_tags_and_ingredients(self):
+        """ Test if search matches names of tags and ingredients """
+        for text in ['vegan', 'cucumber']:
+            with self.subTest(text=text):
+                res = self.client.get(RECIPES_URL, {'search': text})
+                self.assertEqual([recipe['id'] for recipe in res.data], [self.salad.id])
+
+    def test_search_other_users_recipes(self):
+        """ Test if search is limited to the user's recipes """
+        create_recipe(user=create_user(email='other@example.com', password='test1234'), title='Tomato salad')
+
+        res = self.client.get(RECIPES_URL, {'search': 'tomato'})
+
+        self.assertEqual(len(res.data), 2)
+
+    def test_search_after_update(self):
+        """ Test if recipes created and updated through the API are searchable by their new tags """
+        self.client.patch(detail_url(self.pasta.id), {'tags': [{'name': 'Italian'}]}, format='json')
+
+        res = self.client.get(RECIPES_URL, {'search': 'italian'})
+
+        self.assertEqual([recipe['id'] for recipe in res.data], [self.pasta.id])
+
+    def test_search_paginated(self):
+        """ Test if search results can be paginated with the cursor """
+        res = self.client.get(RECIPES_URL, {'search': 'tomato', 'page_size': 1})
+        next_res = self.client.get(res.data['next'])
+
+        self.assertEqual(len(res.data['results']), 1)
+        self.assertEqual(len(next_res.data['results']), 1)
+        self.assertNotEqual(res.data['results'][0]['id'], next_res.data['results'][0]['id'])
+        self.assertIsNone(next_res.data['next'])
+
+    @skipUnless(search.is_supported(), 'Ranked search needs Postgres')
+    def test_search_paginated_tied_ranks(self):
+        """ Test if paging through results with equal and almost equal ranks returns every result once, in order """
+        # Identical recipes have equal ranks, more mentions of tomato in the description make ranks slightly higher
+        recipes = [create_recipe(user=self.user, title='Tomato soup', description='Simple and quick.') for _ in range(4)]
+        recipes += [
+            create_recipe(user=self.user, title='Soup', description=' '.join(['tomato'] * (i // 2 + 1) + ['water'] * i))
+            for i in range(8)
+        ]
+        search.update_search_vectors([recipe.id for recipe in recipes])
+        expected = [recipe['id'] for recipe in self.client.get(RECIPES_URL, {'search': 'tomato'}).data]
+        self.assertEqual(len(expected), len(recipes) + 2)  # With the soup and the pasta
+
+        for page_size in [1, 2, 3, 5]:
+            with self.subTest(page_size=page_size):
+                res = self.client.get(RECIPES_URL, {'search': 'tomato', 'page_size': page_size})
+                ids = [recipe['id'] for recipe in res.data['results']]
+                while res.data['next']:
+                    res = self.client.get(res.data['next'])
+                    ids.extend(recipe['id'] for recipe in res.data['results'])
+
+                self.assertEqual(ids, expected)
+
+
+class BulkImportExportTests(TestCase):
+    """ Test bulk import and export of recipes """
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user(email='user@example.com', password='test1234')
+        self.client.force_authenticate(self.user)
+
+    def post_lines(self, lines):
+        body = '\n'.join(line if isinstance(line, str) else json.dumps(line) for line in lines)
+        return self.client.post(BULK_URL, body, content_type='application/x-ndjson')
+
+    def make_recipe(self, i, **kwargs):
+        recipe = {
+            'title': f'Recipe {i}', 'time_minutes': 10, 'price': '4.50',
+            'tags': [{'name': 'dinner'}, {'name': f'tag {i}'}],
+            'ingredients': [{'name': 'salt'}, {'name': f'ingredient {i}'}],
+        }
+        recipe.update(kwargs)
+        return recipe
+
+    def test_bulk_import(self):
+        """ Test if recipes are created with their tags and ingredients """
+        Tag.objects.create(user=self.user, name='Dinner')
+
+        res = self.post_lines([self.make_recipe(1), self.make_recipe(2, description='Quick.')])
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(res.data, {'created': 2, 'errors': []})
+        recipe = Recipe.objects.get(user=self.user, title='Recipe 2')
+        self.assertEqual(recipe.description, 'Quick.')
+        self.assertEqual(sorted(tag.name for tag in recipe.tags.all()), ['Dinner', 'Tag 2'])
+        self.assertEqual(sorted(i.name for i in recipe.ingredients.all()), ['Ingredient 2', 'Salt'])
+        self.assertEqual(Tag.objects.filter(user=self.user).count(), 3)
+
+    def test_bulk_import_reports_invalid_lines(self):
+        """ Test if invalid lines are reported by their numbers and valid ones are created """
+        res = self.post_lines([self.make_recipe(1), '{not json', '', self.make_recipe(2, price='x')])
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(res.data['created'], 1)
+        self.assertEqual([error['line'] for error in res.data['errors']], [2, 4])
+        self.assertIn('price', res.data['errors'][1]['errors'])
+
+    def test_bulk_import_query_count_constant(self):
+        """ Test if the number of queries doesn't depend on the number of recipes in a batch """
+        with CaptureQueriesContext(connection) as one:
+            self.post_lines([self.make_recipe(0)])
+        with CaptureQueriesContext(connection) as many:
+            self.post_lines([self.make_recipe(i) for i in range(1, 50)])
+
+        self.assertEqual(len(one), len(many))
+
+    @override_settings(RECIPE_BULK_BATCH_SIZE=2)
+    def test_bulk_import_batches(self):
+        """ Test if recipes are created in batches """
+        res = self.post_lines([self.make_recipe(i) for i in range(5)])
+
+        self.assertEqual(res.data['created'], 5)
+        self.assertEqual(Recipe.objects.filter(user=self.user).count(), 5)
+
+    @override_settings(RECIPE_BULK_BATCH_SIZE=2)
+    def test_export(self):
+        """ Test if exported recipes can be imported back """
+        self.post_lines([self.make_recipe(i) for i in range(5)])
+        create_recipe(user=create_user(email='other@example.com', password='test1234'))
+
+        res = self.client.get(EXPORT_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res['Content-Type'], 'application/x-ndjson')
+        lines = b''.join(res.streaming_content).decode().splitlines()
+        self.assertEqual(len(lines), 5)
+        self.assertEqual(json.loads(lines[0])['tags'][0]['name'], 'Dinner')
+
+        Recipe.objects.filter(user=self.user).delete()
+        res = self.post_lines(lines)
+        self.assertEqual(res.data, {'created': 5, 'errors': []})
+
+
+class NestedSnapshotTests(TestCase):
+    """ Test snapshots of recipes' tags and ingredients used by the list """
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user(email='user@example.com', password='test1234')
+        self.client.force_authenticate(self.user)
+
+    def create(self, **payload):
+        payload = {'title': 'Soup', 'time_minutes': 30, 'price': Decimal('5.00'), **payload}
+        res = self.client.post(RECIPES_URL, payload, format='json')
+        return Recipe.objects.get(id=res.data['id'])
+
+    def assert_snapshot_up_to_date(self, recipe):
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.nested_snapshot, snapshots.build_snapshots([recipe.id])[recipe.id])
+
+    def test_snapshot_written_by_create_and_update(self):
+        """ Test if creating and updating a recipe writes its snapshot """
+        recipe = self.create(tags=[{'name': 'Vegan'}, {'name': 'Dinner'}], ingredients=[{'name': 'Salt'}])
+        self.assert_snapshot_up_to_date(recipe)
+        self.assertEqual([tag['name'] for tag in recipe.nested_snapshot['tags']], ['Vegan', 'Dinner'])
+
+        self.client.patch(detail_url(recipe.id), {'tags': [{'name': 'Lunch'}]}, format='json')
+        self.assert_snapshot_up_to_date(recipe)
+        self.assertEqual([tag['name'] for tag in recipe.nested_snapshot['tags']], ['Lunch'])
+        self.assertEqual([ingredient['name'] for ingredient in recipe.nested_snapshot['ingredients']], ['Salt'])
+
+    def test_snapshot_follows_renamed_and_deleted_tags(self):
+        """ Test if renaming or deleting a tag rewrites snapshots of its recipes """
+        recipe = self.create(tags=[{'name': 'Vegan'}, {'name': 'Dinner'}])
+        tag = Tag.objects.get(user=self.user, name='Vegan')
+
+        self.client.patch(reverse('recipe:tag-detail', args=[tag.id]), {'name': 'Plant Based'})
+        self.assert_snapshot_up_to_date(recipe)
+        self.assertIn('Plant Based', [tag['name'] for tag in recipe.nested_snapshot['tags']])
+
+        self.client.delete(reverse('recipe:tag-detail', args=[tag.id]))
+        self.assert_snapshot_up_to_date(recipe)
+        self.assertEqual([tag['name'] for tag in recipe.nested_snapshot['tags']], ['Dinner'])
+
+    def test_snapshot_written_by_bulk_import(self):
+        """ Test if imported recipes get their snapshots """
+        line = json.dumps({'title': 'Soup', 'time_minutes': 30, 'price': '5.00', 'tags': [{'name': 'Vegan'}]})
+        self.client.post(BULK_URL, line, content_type='application/x-ndjson')
+
+        self.assert_snapshot_up_to_date(Recipe.objects.get(user=self.user))
+
+    def test_snapshot_dropped_by_other_link_changes(self):
+        """ Test if linking tags and ingredients outside of the API leaves no outdated snapshot """
+        recipe = self.create(tags=[{'name': 'Vegan'}], ingredients=[{'name': 'Salt'}])
+        other = self.create(title='Salad')
+        tag = Tag.objects.create(user=self.user, name='Lunch')
+        ingredient = Ingredient.objects.get(user=self.user, name='Salt')
+        changes = [
+            ('add', lambda: recipe.tags.add(tag), [recipe]),
+            ('remove', lambda: recipe.ingredients.remove(ingredient), [recipe]),
+            ('reverse add', lambda: tag.recipe_set.add(other), [other]),
+            ('reverse clear', lambda: tag.recipe_set.clear(), [recipe, other]),
+        ]
+        for name, change, changed in changes:
+            with self.subTest(name):
+                snapshots.update_snapshots([recipe.id, other.id])
+                change()
+                for changed_recipe in changed:
+                    changed_recipe.refresh_from_db()
+                    self.assertIsNone(changed_recipe.nested_snapshot)
+
+                # Listed from the M2M tables until the snapshots are rebuilt
+                with override_settings(RECIPE_LIST_SNAPSHOTS=False):
+                    expected = self.client.get(RECIPES_URL).content
+                self.assertEqual(self.client.get(RECIPES_URL).content, expected)
+
+    def test_list_rendered_from_snapshots(self):
+        """ Test if the list reads one table and renders the same data as without snapshots """
+        for i in range(3):
+            self.create(title=f'Soup {i}', tags=[{'name': f'Tag {i}'}, {'name': 'Dinner'}], ingredients=[{'name': 'Salt'}])
+        # A recipe without a snapshot yet is loaded from the M2M tables
+        Recipe.objects.filter(title='Soup 0').update(nested_snapshot=None)
+
+        with override_settings(RECIPE_LIST_SNAPSHOTS=False):
+            expected = self.client.get(RECIPES_URL).content
+        res = self.client.get(RECIPES_URL)
+        self.assertEqual(res.content, expected)
+
+        snapshots.update_snapshots(Recipe.objects.values_list('id', flat=True))
+        with self.assertNumQueries(1):
+            res = self.client.get(RECIPES_URL)
+        self.assertEqual(res.content, expected)
+
+
+class RecipeQueryCountTests(QueryCountTestMixin, TestCase):
+    """ Test the number of queries of recipe endpoints doesn't grow with the number of recipes """
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user(email='user@example.com', password='test1234')
+        self.client.force_authenticate(self.user)
+        self.tag = Tag.objects.create(user=self.user, name='Dinner')
+        self.recipe = create_recipe(user=self.user)
+        self.nested, self.writes = 0, 0
+
+    def add_recipes(self, count):
+        """ Create recipes with a tag and ingredients of their own, half of them without a snapshot """
+        for i in range(count):
+            recipe = self.client.post(RECIPES_URL, {
+                'title': f'Soup {i}', 'time_minutes': 5, 'price': '1.00',
+                'tags': [{'name': 'Dinner'}, {'name': f'Tag {i} {count}'}], 'ingredients': [{'name': f'Ingredient {i} {count}'}],
+            }, format='json').data
+            if i % 2:
+                Recipe.objects.filter(id=recipe['id']).update(nested_snapshot=None)
+
+    def add_tags(self, count):
+        """ Add tags to the detailed recipe """
+        self.recipe.tags.add(*[Tag.objects.create(user=self.user, name=f'Detail {Tag.objects.count()}') for _ in range(count)])
+
+    def test_list(self):
+        """ Test listing recipes, whole and paginated """
+        for params in [{}, {'page_size': 100}, {'tags': self.tag.id}, {'search': 'soup'}]:
+            with self.subTest(params=params):
+                self.assertConstantQueries(lambda: self.client.get(RECIPES_URL, params), self.add_recipes)
+
+    def test_stream_and_export(self):
+        """ Test streaming and exporting recipes """
+        for url, params in [(RECIPES_URL, {'stream': 1}), (EXPORT_URL, {})]:
+            with self.subTest(url=url):
+                self.assertConstantQueries(lambda: self.client.get(url, params), self.add_recipes)
+
+    def test_retrieve(self):
+        """ Test retrieving a recipe with more and more tags """
+        self.assertConstantQueries(lambda: self.client.get(detail_url(self.recipe.id)), self.add_tags)
+
+    def add_nested(self, count):
+        """ Add an existing and a new tag and ingredient to the payload of nested writes, per object """
+        for _ in range(count):
+            Tag.objects.create(user=self.user, name=f'Existing {self.nested}')
+            Ingredient.objects.create(user=self.user, name=f'Existing {self.nested}')
+            self.nested += 1
+
+    def nested_payload(self):
+        """ Return a recipe with all the existing tags and ingredients and as many new ones, new on every write """
+        self.writes += 1
+        names = [f'Existing {i}' for i in range(self.nested)] + [f'New {self.writes} {i}' for i in range(self.nested)]
+        return {
+            'title': 'Soup', 'time_minutes': 5, 'price': '1.00',
+            'tags': [{'name': name} for name in names], 'ingredients': [{'name': name} for name in names],
+        }
+
+    def test_create_nested(self):
+        """ Test creating a recipe with more and more tags and ingredients """
+        self.assertConstantQueries(
+            self.committed(lambda: self.client.post(RECIPES_URL, self.nested_payload(), format='json')), self.add_nested
+        )
+
+    def test_update_nested(self):
+        """ Test replacing tags and ingredients of a recipe with more and more of them """
+        # Every write unlinks the ones of the previous write, the first one too
+        self.recipe.tags.add(self.tag)
+        self.recipe.ingredients.add(Ingredient.objects.create(user=self.user, name='Salt'))
+        for method in ['patch', 'put']:
+            with self.subTest(method=method):
+                request = getattr(self.client, method)
+                self.assertConstantQueries(
+                    self.committed(lambda: request(detail_url(self.recipe.id), self.nested_payload(), format='json')), self.add_nested
+                )
+
+    @override_settings(RECIPE_IMAGE_PROCESSING='sync')
+    def test_upload_image(self):
+        """ Test uploading an image (and generating its variants) doesn't depend on other recipes """
+        colors = iter(range(256))
+
+        def upload():
+            image_file = io.BytesIO()
+            Image.new('RGB', (600, 300), (next(colors), 0, 0)).save(image_file, format='PNG')
+            image_file.seek(0)
+            image_file.name = 'image.png'
+            return self.client.post(image_upload_url(self.recipe.id), {'image': image_file}, format='multipart')
+
+        with tempfile.TemporaryDirectory() as media_root, self.settings(MEDIA_ROOT=media_root):
+            self.assertConstantQueries(self.committed(upload), self.add_recipes)
@@ -9,6 +9,8 @@ from rest_framework import status
 from rest_framework.test import APIClient
 
 from core.models import Tag, Recipe
+from core.testing import QueryCountTestMixin
+from recipe import autocomplete
 from recipe.serializers import TagSerializer
 
 TAGS_URL = reverse('recipe:tag-list')
@@ -81,6 +83,17 @@ class PrivateTagsAPITests(TestCase):
         tag.refresh_from_db()
         self.assertEqual(tag.name, payload['name'])
 
+    def test_rename_tag_to_existing_name(self):
+        """ Test renaming a tag to a name user already has returns 400 """
+        Tag.objects.create(user=self.user, name='Dinner')
+        tag = Tag.objects.create(user=self.user, name='Lunch')
+
+        res = self.client.patch(detail_url(tag.id), {'name': 'Dinner'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        tag.refresh_from_db()
+        self.assertEqual(tag.name, 'Lunch')
+
     def test_delete_tag(self):
         """ Test deleting a tag """
         tag = Tag.objects.create(user=self.user, name='Breakfast')
@@ -90,6 +103,13 @@ class PrivateTagsAPITests(TestCase):
         tags = Tag.objects.filter(user=self.user)
         self.assertFalse(tags.exists())
 
+    def test_tag_detail_not_allowed(self):
+        """ Test tags can't be retrieved one by one, only listed """
+        tag = Tag.objects.create(user=self.user, name='Breakfast')
+        res = self.client.get(detail_url(tag.id))
+
+        self.assertEqual(res.status_code, status.HTTP_405_METHOD_NOT_ALLOWED)
+
     def test_filter_tags_assigned_to_recipes(self):
         """ Test listing tags to those that are assigned to recipes """
         tag1 = Tag.objects.create(user=self.user, name='Vegetarian')
@@ -133,3 +153,102 @@ class PrivateTagsAPITests(TestCase):
 
         res = self.client.get(TAGS_URL, {'assigned_only': 1})
         self.assertEqual(len(res.data), 1)
+
+    def test_tags_cursor_pagination(self):
+        """ Test paging through tags keeps the -name order """
+        for name in ['Breakfast', 'Dinner', 'Lunch', 'Vegan', 'Dessert']:
+            Tag.objects.create(user=self.user, name=name)
+
+        res = self.client.get(TAGS_URL, {'page_size': 2})
+        names = [tag['name'] for tag in res.data['results']]
+        while res.data['next']:
+            res = self.client.get(res.data['next'])
+            names.extend(tag['name'] for tag in res.data['results'])
+
+        self.assertEqual(names, ['Vegan', 'Lunch', 'Dinner', 'Dessert', 'Breakfast'])
+
+
+class TagAutocompleteTests(TestCase):
+    """ Test autocomplete of tag names """
+
+    def setUp(self):
+        self.user = create_user()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        autocomplete.local_indexes.clear()
+        for name in ['Dinner', 'Dessert', 'Breakfast', 'Tomato', 'Tomatoes']:
+            Tag.objects.create(user=self.user, name=name)
+
+    def test_autocomplete_prefix(self):
+        """ Test if names starting with q are returned first """
+        res = self.client.get(TAGS_URL, {'q': 'to'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([tag['name'] for tag in res.data], ['Tomato', 'Tomatoes'])
+
+    def test_autocomplete_typo(self):
+        """ Test if names similar to q are returned """
+        res = self.client.get(TAGS_URL, {'q': 'desert'})
+
+        self.assertIn('Dessert', [tag['name'] for tag in res.data])
+
+    def test_autocomplete_limit(self):
+        """ Test if the number of suggestions is limited """
+        res = self.client.get(TAGS_URL, {'q': 'd', 'limit': 1})
+        self.assertEqual(len(res.data), 1)
+
+        for limit in ['0', '51', 'x']:
+            with self.subTest(limit=limit):
+                res = self.client.get(TAGS_URL, {'q': 'd', 'limit': limit})
+                self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_autocomplete_limited_to_user(self):
+        """ Test if only user's tags are suggested """
+        Tag.objects.create(user=create_user(email='other@example.com'), name='Toast')
+
+        res = self.client.get(TAGS_URL, {'q': 'toa'})
+
+        self.assertNotIn('Toast', [tag['name'] for tag in res.data])
+
+    def test_autocomplete_new_tag(self):
+        """ Test if new and renamed tags are suggested right away """
+        self.client.get(TAGS_URL, {'q': 'lu'})
+        tag = Tag.objects.create(user=self.user, name='Lunch')
+        self.assertEqual([t['name'] for t in self.client.get(TAGS_URL, {'q': 'lu'}).data], ['Lunch'])
+
+        self.client.patch(detail_url(tag.id), {'name': 'Supper'})
+        self.assertEqual([t['name'] for t in self.client.get(TAGS_URL, {'q': 'su'}).data], ['Supper'])
+
+
+class TagQueryCountTests(QueryCountTestMixin, TestCase):
+    """ Test the number of queries of tag endpoints doesn't grow with the number of tags """
+
+    def setUp(self):
+        self.user = create_user()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.recipe = Recipe.objects.create(user=self.user, title='Soup', time_minutes=5, price=Decimal('1.00'))
+
+    def add_tags(self, count):
+        """ Create tags, assigned to a recipe """
+        self.recipe.tags.add(*[Tag.objects.create(user=self.user, name=f'Tag {Tag.objects.count()}') for _ in range(count)])
+
+    def test_list(self):
+        """ Test listing all, assigned and autocompleted tags """
+        for params in [{}, {'assigned_only': 1}, {'q': 'tag'}]:
+            with self.subTest(params=params):
+                self.assertConstantQueries(lambda: self.client.get(TAGS_URL, params), self.add_tags)
+
+    def add_linked_recipes(self, count):
+        """ Create recipes, then a new tag linked to all of them """
+        for _ in range(count):
+            Recipe.objects.create(user=self.user, title='Soup', time_minutes=5, price=Decimal('1.00'))
+        self.tag = Tag.objects.create(user=self.user, name=f'Tag {Tag.objects.count()}')
+        self.tag.recipe_set.add(*Recipe.objects.filter(user=self.user))
+
+    def test_update_and_delete(self):
+        """ Test renaming and deleting a tag of more and more recipes """
+        self.assertConstantQueries(
+            self.committed(lambda: self.client.patch(detail_url(self.tag.id), {'name': f'Renamed {self.tag.id}'})), self.add_linked_recipes
+        )
+        self.assertConstantQueries(self.committed(lambda: self.client.delete(detail_url(self.tag.id))), self.add_linked_recipes)
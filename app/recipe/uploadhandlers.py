@@ -0,0 +1,81 @@
+""" Upload handlers for recipe images """
+import io
+import warnings
+
+from PIL import Image
+from django.conf import settings
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from rest_framework.exceptions import ValidationError
+
+# Image headers (including EXIF, which comes before the size in JPEGs) fit in the first few chunks of the upload
+MAX_HEADER_SIZE = 256 * 1024
+
+
+class ImageUploadHandler(TemporaryFileUploadHandler):
+    """
+    Stream uploaded images to a temporary file, checking their format and dimensions as the first chunks arrive.
+    Only the image header is parsed, so an oversized image is rejected before it's buffered or decoded.
+    """
+
+    def __init__(self, request=None):
+        super().__init__(request)
+        self.max_size = settings.RECIPE_IMAGE_MAX_UPLOAD_SIZE
+        self.max_pixels = settings.RECIPE_IMAGE_MAX_PIXELS
+        self.formats = settings.RECIPE_IMAGE_FORMATS
+
+    def handle_raw_input(self, input_data, META, content_length, boundary, encoding=None):
+        # Reject based on Content-Length, before reading anything from the body
+        if content_length > self.max_size:
+            self._reject(f'Upload is larger than {self.max_size} bytes.')
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.received = 0
+        self.header = b''
+        self.header_checked = False
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.received > self.max_size:
+            self._reject(f'Image is larger than {self.max_size} bytes.')
+
+        if not self.header_checked:
+            self.header += raw_data
+            self._check_header(complete=len(self.header) >= MAX_HEADER_SIZE)
+
+        # Writes the chunk to the temporary file
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        if not self.header_checked:
+            self._check_header(complete=True)
+        return super().file_complete(file_size)
+
+    def _check_header(self, complete):
+        """ Check format and dimensions, once there's enough of the file to read its header """
+        try:
+            with warnings.catch_warnings():
+                warnings.simplefilter('error', Image.DecompressionBombWarning)
+                # open() is lazy, it only reads the header without decoding (or allocating) the pixels
+                with Image.open(io.BytesIO(self.header)) as image:
+                    image_format, (width, height) = image.format, image.size
+        except (Image.DecompressionBombError, Image.DecompressionBombWarning):
+            self._reject(f'Image is larger than {self.max_pixels} pixels.')
+        except Exception:
+            if complete:
+                self._reject('Upload a valid image. The file you uploaded was either not an image or a corrupted image.')
+            return  # Header isn't complete yet, try again with the next chunk
+
+        if image_format not in self.formats:
+            self._reject(f'Unsupported image format {image_format}, use one of: {", ".join(self.formats)}.')
+        if width * height > self.max_pixels:
+            self._reject(f'Image is larger than {self.max_pixels} pixels ({width}x{height}).')
+
+        self.header_checked = True
+        self.header = b''
+
+    def _reject(self, message):
+        """ Stop the upload, removing what has been written to the temporary file """
+        if getattr(self, 'file', None) is not None:
+            self.file.close()  # Temporary files are deleted on close
+        raise ValidationError({'image': [message]})
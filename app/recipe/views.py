@@ -1,54 +1,90 @@
 """ Views for the recipe API """
-from drf_spectacular.utils import extend_schema_view, extend_schema, OpenApiParameter, OpenApiTypes
-from rest_framework import viewsets, mixins, status
+import io
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Prefetch
+from django.http import StreamingHttpResponse
+from drf_spectacular.utils import extend_schema_view, extend_schema, inline_serializer, OpenApiParameter, OpenApiTypes
+from rest_framework import viewsets, mixins, status, serializers as drf_serializers
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from rest_framework.authentication import TokenAuthentication
 from rest_framework.permissions import IsAuthenticated
 
+from core.lean import LeanListMixin
 from core.models import Recipe, Tag, Ingredient
-from recipe import serializers
+from core.streaming import StreamingListMixin
+from recipe import serializers, filters, images, bulk
+from recipe.autocomplete import AutocompleteMixin
+from recipe.cache import CachedListMixin
+from recipe.conditional import ConditionalGetMixin, ConditionalListMixin
+from recipe.uploadhandlers import ImageUploadHandler
+from user.authentication import CachedTokenAuthentication
 
 
 # V.131
 @extend_schema_view(
     list=extend_schema(
         parameters=[
+            OpenApiParameter(
+                'search', OpenApiTypes.STR,
+                description='Search in titles, descriptions, tags and ingredients, best matches first'
+            ),
             OpenApiParameter('tags', OpenApiTypes.STR, description='Comma separated list of tags IDs to filter'),
-            OpenApiParameter('ingredients', OpenApiTypes.STR, description='Comma separated list of ingredient IDs to filter')
+            OpenApiParameter('ingredients', OpenApiTypes.STR, description='Comma separated list of ingredient IDs to filter'),
+            OpenApiParameter(
+                'tags_match', OpenApiTypes.STR, enum=[filters.MATCH_ANY, filters.MATCH_ALL],
+                description='Return recipes with any (default) or all of the tags'
+            ),
+            OpenApiParameter(
+                'ingredients_match', OpenApiTypes.STR, enum=[filters.MATCH_ANY, filters.MATCH_ALL],
+                description='Return recipes with any (default) or all of the ingredients'
+            ),
+            OpenApiParameter('stream', OpenApiTypes.INT, enum=[0, 1], description='Stream all recipes as one JSON array, unpaginated'),
         ]
     )
 )
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(ConditionalGetMixin, StreamingListMixin, CachedListMixin, LeanListMixin, viewsets.ModelViewSet):
     """ View for manage recipe API """
     # serializer_class = serializers.RecipeSerializer  # We use get_serializer_class instead
     queryset = Recipe.objects.all()
-    authentication_classes = [TokenAuthentication]  # It supports Token Authentication
+    authentication_classes = [CachedTokenAuthentication]  # It supports Token Authentication
     # Note: I can change it later to IsAuthenticatedOrReadOnly to allow anon users to acces GET methods.
     permission_classes = [IsAuthenticated]  # Not only that, user needs to be authenticated
-
-    def _params_to_ints(self, query_string):
-        """ Convert a list of strings to integers """
-        # '1,2,3' -> [1,2,3]
-        return [int(str_id) for str_id in query_string.split(',')]
+    filter_backends = [filters.RecipeAttrFilter, filters.RecipeSearchFilter]
+    ordering = ['-id']  # Used by get_queryset and by the cursor pagination
+    # Only these actions serialize recipes they read, so only they benefit from prefetching nested relations
+    prefetch_actions = ['list', 'retrieve', 'export']
 
     # We specify this, to limit the queryset to only recipes of the authenticated user
+    # Filtering by tags/ingredients is done by filter_backends (RecipeAttrFilter), which uses EXISTS, so no distinct() is needed
     def get_queryset(self):
         """ Retrieve recipes for authenticated user """
-        tags = self.request.query_params.get('tags')  # This will return None if there is no tags
-        ingredients = self.request.query_params.get('ingredients')
-        queryset = self.queryset
-
-        if tags:
-            tag_ids = self._params_to_ints(tags)
-            queryset = queryset.filter(tags__id__in=tag_ids)  # tags__id__in -> Lookup fields
-
-        if ingredients:
-            ingredient_ids = self._params_to_ints(ingredients)
-            queryset = queryset.filter(ingredients__id__in=ingredient_ids)
+        # search_vector is only used in SQL and nested_snapshot only by the list, deferring them saves loading them
+        # and writing them back on save()
+        queryset = self.queryset.filter(user=self.request.user).defer('search_vector', 'nested_snapshot').order_by(*self.ordering)
+        return self._prefetch_nested(queryset)
+
+    # Nested serializers call recipe.tags.all() and recipe.ingredients.all() for every recipe (N+1 queries).
+    # prefetch_related() loads every relation with one extra query for the whole queryset instead.
+    def _prefetch_nested(self, queryset):
+        """ Prefetch relations rendered by nested serializers of the current action """
+        if self.action not in self.prefetch_actions:
+            return queryset
+
+        serializer_class = self.get_serializer_class()
+        nested = [
+            field.source or name for name, field in serializer_class._declared_fields.items()
+            if isinstance(field, (drf_serializers.BaseSerializer, drf_serializers.ManyRelatedField))
+        ]
+        # Ordered by primary key, the same order the lean list (core.lean) uses
+        return queryset.prefetch_related(*[
+            Prefetch(name, queryset=queryset.model._meta.get_field(name).related_model.objects.order_by('pk')) for name in nested
+        ])
 
-        # Disctinct() will remove duplicate objects from queryset
-        return queryset.filter(user=self.request.user).order_by('-id').distinct()
+    def get_snapshot_field(self):
+        """ Render tags and ingredients of listed recipes from their snapshots (recipe.snapshots), when enabled """
+        return 'nested_snapshot' if settings.RECIPE_LIST_SNAPSHOTS else None
 
     # Instead of having serializer = RecipeSerializer, we base our serializer on the action that viewset is handling
     def get_serializer_class(self):
@@ -57,6 +93,8 @@ class RecipeViewSet(viewsets.ModelViewSet):
             return serializers.RecipeSerializer
         elif self.action == 'upload_image':
             return serializers.RecipeImageSerializer
+        elif self.action in ('bulk', 'export'):
+            return serializers.RecipeBulkSerializer
 
         return serializers.RecipeDetailSerializer
 
@@ -72,14 +110,44 @@ class RecipeViewSet(viewsets.ModelViewSet):
     def upload_image(self, request, pk=None):
         """ Upload an image to recipe """
         recipe = self.get_object()
+        # Must be set before request.data is read for the first time
+        request.upload_handlers = [ImageUploadHandler(request)]
         serializer = self.get_serializer(recipe, data=request.data)  # I need to pass in recipe to fulfill validation rules
 
         if serializer.is_valid():
-            serializer.save()
+            # Variants are resized in the background, so the upload doesn't block the worker. The old image is left
+            # to collect_recipe_images, other recipes may use it.
+            serializer.save(image_variants={})
+            images.schedule_variants(recipe.id)
             return Response(serializer.data, status=status.HTTP_200_OK)
 
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+    @extend_schema(
+        request={'application/x-ndjson': serializers.RecipeBulkSerializer},
+        responses=inline_serializer('RecipeBulkImport', {'created': drf_serializers.IntegerField(), 'errors': drf_serializers.ListField()}),
+    )
+    @action(methods=['POST'], detail=False, url_path='bulk')
+    def bulk(self, request):
+        """ Create recipes from JSON Lines, one recipe per line """
+        # The body is read line by line as the recipes are imported, it's never loaded (or parsed) at once.
+        # Invalid lines are reported with their numbers, valid ones are created in batches of RECIPE_BULK_BATCH_SIZE.
+        result = bulk.import_recipes(
+            bulk.read_lines(request.stream or io.BytesIO()), request.user, self.get_serializer_context(), settings.RECIPE_BULK_BATCH_SIZE
+        )
+        return Response(result, status=status.HTTP_201_CREATED if result['created'] else status.HTTP_400_BAD_REQUEST)
+
+    @extend_schema(responses={(200, 'application/x-ndjson'): serializers.RecipeBulkSerializer})
+    @action(methods=['GET'], detail=False, url_path='export')
+    def export(self, request):
+        """ Stream user's recipes as JSON Lines, one recipe per line """
+        # Accepts the same filters as the list. Recipes are written as they are read from the database.
+        queryset = self.filter_queryset(self.get_queryset())
+        stream = bulk.export_recipes(queryset, self.get_serializer_context(), settings.RECIPE_BULK_BATCH_SIZE)
+        response = StreamingHttpResponse(stream, content_type='application/x-ndjson')
+        response['Content-Disposition'] = 'attachment; filename="recipes.jsonl"'
+        return response
+
 
 @extend_schema_view(
     list=extend_schema(
@@ -88,26 +156,36 @@ class RecipeViewSet(viewsets.ModelViewSet):
                 'assigned_only',
                 OpenApiTypes.INT, enum=[0, 1],
                 description='Filter by items assigned to recipes.'
-            )
+            ),
+            OpenApiParameter('q', OpenApiTypes.STR, description='Autocomplete: names starting with (or similar to) q, best matches first'),
+            OpenApiParameter('limit', OpenApiTypes.INT, description='Maximum number of autocomplete results (default 10, at most 50)'),
         ]
     )
 )
-class BaseRecipeAttrViewset(mixins.ListModelMixin, mixins.UpdateModelMixin, mixins.DestroyModelMixin, viewsets.GenericViewSet):
-    authentication_classes = [TokenAuthentication]
+class BaseRecipeAttrViewset(ConditionalListMixin, CachedListMixin, AutocompleteMixin, LeanListMixin,
+                            mixins.ListModelMixin, mixins.UpdateModelMixin, mixins.DestroyModelMixin, viewsets.GenericViewSet):
+    authentication_classes = [CachedTokenAuthentication]
     permission_classes = [IsAuthenticated]  # You cannot make a request to this endpoint, unless you are authenticated
+    filter_backends = [filters.AssignedOnlyFilter]
+    # Names are unique per user (see the models' constraints), so they make the order (and the pagination cursor)
+    # deterministic on their own, and the (user, name) unique index returns rows already sorted
+    ordering = ['-name']
 
     def get_queryset(self):
         """ Filter queryset to authenticated user """
-        queryset = self.queryset
-        # assigned_only = self.request.query_params.get('assigned_only') # It also works
-        assigned_only = bool(
-            int(self.request.query_params.get('assigned_only', 0))
-        )
-        if assigned_only:
-            queryset = queryset.filter(recipe__isnull=False)
-
         # It can be either user_id=self.request.user.id or user=self.request.user
-        return queryset.filter(user_id=self.request.user.id).order_by('-name').distinct()
+        # assigned_only param is handled by filter_backends (AssignedOnlyFilter)
+        return self.queryset.filter(user_id=self.request.user.id).order_by(*self.ordering)
+
+    # Renaming or deleting a tag/ingredient also rewrites snapshots of the recipes showing it (recipe.signals),
+    # both have to be committed together
+    def perform_update(self, serializer):
+        with transaction.atomic():
+            super().perform_update(serializer)
+
+    def perform_destroy(self, instance):
+        with transaction.atomic():
+            super().perform_destroy(instance)
 
 
 class IngredientViewset(BaseRecipeAttrViewset):
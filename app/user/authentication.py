@@ -0,0 +1,152 @@
+""" Authentication classes for the API """
+import copy
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth import authenticate, get_user_model
+from django.core.cache import caches
+from django.utils.crypto import constant_time_compare, salted_hmac
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+
+from core import metrics
+from core.cache import TTLCache
+
+# Without a shared cache, workers can't learn about tokens revoked by another worker, so they trust them only this long
+LOCAL_ONLY_MAX_TTL = 5
+
+
+def _local_ttl():
+    """ Return seconds a worker trusts a token from its local cache """
+    ttl = settings.TOKEN_AUTH_CACHE['TTL']
+    return ttl if settings.TOKEN_AUTH_CACHE['SHARED_CACHE'] else min(ttl, LOCAL_ONLY_MAX_TTL)
+
+
+# Every uWSGI worker has its own local cache, invalidation (see user/signals.py) only deletes entries of the worker
+# that handled the change. With a shared cache, other workers find out from the token's generation: it's bumped in the
+# shared cache whenever the token is deleted or its user changes, and entries of an older generation aren't used.
+local_cache = TTLCache(max_size=settings.TOKEN_AUTH_CACHE['MAX_SIZE'], ttl=_local_ttl())
+shared_stats = {'hits': 0, 'misses': 0}
+# Users who logged in a moment ago, by their credentials (see authenticate_cached)
+login_cache = TTLCache(max_size=settings.LOGIN_CACHE['MAX_SIZE'], ttl=settings.LOGIN_CACHE['TTL'])
+_shared_stats_lock = threading.Lock()
+
+
+def _shared_cache():
+    """ Return the cache shared between workers, or None if it's not configured """
+    alias = settings.TOKEN_AUTH_CACHE['SHARED_CACHE']
+    return caches[alias] if alias else None
+
+
+def _shared_key(key):
+    return f'auth-token:{key}'
+
+
+def _generation_key(key):
+    return f'auth-token-generation:{key}'
+
+
+def _count_shared(result):
+    with _shared_stats_lock:
+        shared_stats[result] += 1
+
+
+def get_generation(shared_cache, key):
+    """ Return the token's current generation in the shared cache """
+    generation = shared_cache.get(_generation_key(key))
+    if generation is None:
+        # Start from the current time, so an evicted generation never comes back with the same value
+        shared_cache.add(_generation_key(key), time.time_ns(), timeout=None)
+        generation = shared_cache.get(_generation_key(key))
+    return generation
+
+
+def invalidate_token(key):
+    """ Remove the token from the local and shared cache, and make other workers stop using their cached copies """
+    local_cache.delete(key)
+    shared_cache = _shared_cache()
+    if shared_cache is not None:
+        shared_cache.delete(_shared_key(key))
+        try:
+            shared_cache.incr(_generation_key(key))
+        except ValueError:  # No generation yet
+            shared_cache.set(_generation_key(key), time.time_ns(), timeout=None)
+
+
+def get_stats():
+    """ Return hit/miss counters of both cache tiers """
+    return {
+        'local_hits': local_cache.hits,
+        'local_misses': local_cache.misses,
+        'shared_hits': shared_stats['hits'],
+        'shared_misses': shared_stats['misses'],
+    }
+
+
+def _login_key(email, password):
+    # Keyed with SECRET_KEY, so the cache never holds anything a password could be recovered from without it
+    return salted_hmac('user.authentication.login_cache', f'{email}\0{password}', algorithm='sha256').digest()
+
+
+def authenticate_cached(request, email, password):
+    """ authenticate() the user, without hashing the password again if the same credentials were correct recently """
+    # Apps log in again on every cold start, a burst of them would keep all workers busy hashing passwords.
+    # Entries are local to the worker and expire after LOGIN_CACHE['TTL'] seconds.
+    if not settings.LOGIN_CACHE['TTL']:
+        return authenticate(request=request, username=email, password=password)
+
+    key = _login_key(email, password)
+    cached = login_cache.get(key)
+    metrics.count_cache('logins', cached is not None)
+    if cached is not None:
+        user_id, password_hash = cached
+        user = get_user_model()._default_manager.filter(pk=user_id).first()
+        # A changed password has a different hash, a deactivated user can't log in, same as with ModelBackend
+        if user is not None and user.is_active and constant_time_compare(user.password, password_hash):
+            return user
+
+    user = authenticate(request=request, username=email, password=password)
+    if user is not None:
+        # After authenticate(), which may have just rehashed the password with the preferred hasher
+        login_cache.set(key, (user.pk, user.password))
+    return user
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """ Token authentication, which caches tokens (with their users) instead of querying them on every request """
+
+    def authenticate_credentials(self, key):
+        # Entries are (token, its generation when it was cached), the generation is None without a shared cache
+        shared_cache = _shared_cache()
+        entry = local_cache.get(key)
+        if entry is not None and shared_cache is not None and entry[1] != get_generation(shared_cache, key):
+            local_cache.delete(key)  # Revoked by another worker
+            entry = None
+        metrics.count_cache('tokens', entry is not None)
+
+        if entry is None and shared_cache is not None:
+            entry = shared_cache.get(_shared_key(key))
+            if entry is not None and entry[1] != get_generation(shared_cache, key):
+                entry = None
+            _count_shared('misses' if entry is None else 'hits')
+            metrics.count_cache('shared_tokens', entry is not None)
+            if entry is not None:
+                local_cache.set(key, entry)
+
+        if entry is None:
+            # Cache miss, the default implementation queries the token together with its user (and checks is_active).
+            # The generation is read first, so a revocation committed after it always makes the entry outdated.
+            generation = get_generation(shared_cache, key) if shared_cache is not None else None
+            user, token = super().authenticate_credentials(key)
+            entry = (token, generation)
+            local_cache.set(key, entry)
+            if shared_cache is not None:
+                shared_cache.set(_shared_key(key), entry, settings.TOKEN_AUTH_CACHE['TTL'])
+        token = entry[0]
+
+        if not token.user.is_active:
+            raise exceptions.AuthenticationFailed('User inactive or deleted.')
+
+        # Views may modify request.user (e.g. ManageUserView), so every request gets its own copy of the cached user
+        return (copy.copy(token.user), token)
@@ -1,14 +1,19 @@
 """ Serializers for the user API view """
-from django.contrib.auth import get_user_model, authenticate
+from django.contrib.auth import get_user_model
 from django.utils.translation import gettext as _
 from rest_framework import serializers
 
+from core.serializers import TimedListSerializer, TimedModelSerializer
 
-class UserSerializer(serializers.ModelSerializer):
+from .authentication import authenticate_cached
+
+
+class UserSerializer(TimedModelSerializer):
     """ Serializer for the user object """
 
     class Meta:
         model = get_user_model()
+        list_serializer_class = TimedListSerializer
         fields = ['email', 'password', 'name']
         extra_kwargs = {'password': {'write_only': True, 'min_length': 5}}
 
@@ -48,10 +53,11 @@ class AuthTokenSerializer(serializers.Serializer):
         """ Validate and authenticate the user """
         email = attrs.get('email')
         password = attrs.get('password')
-        user = authenticate(
+        # Same as authenticate(), but repeated logins with the same credentials skip the password hashing
+        user = authenticate_cached(
             # We need to pass request here, it is a required field v.70
             request=self.context.get('request'),
-            username=email,
+            email=email,
             password=password
         )
 
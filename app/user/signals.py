@@ -0,0 +1,28 @@
+""" Signal handlers for the user app """
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from .authentication import invalidate_token
+
+
+# Tokens are invalidated once the change commits. Invalidated any earlier, a concurrent request could still read the
+# old row from the database and cache it again, under the new generation (user/authentication.py).
+@receiver(post_delete, sender=Token)
+def invalidate_deleted_token(sender, instance, **kwargs):
+    """ Stop authenticating with a deleted token """
+    key = instance.key
+    transaction.on_commit(lambda: invalidate_token(key))
+
+
+# Covers deactivating a user from the admin, ManageUserView and any other save, so cached users never go stale
+@receiver(post_save, sender=get_user_model())
+def invalidate_user_tokens(sender, instance, created, **kwargs):
+    """ Drop cached tokens of a saved user """
+    if created:
+        return
+
+    for key in Token.objects.filter(user_id=instance.pk).values_list('key', flat=True):
+        transaction.on_commit(lambda key=key: invalidate_token(key))
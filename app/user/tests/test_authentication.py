@@ -0,0 +1,190 @@
+""" Tests for the cached token authentication """
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import check_password, get_hasher, identify_hasher, make_password
+from django.conf import settings
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from user import authentication
+
+ME_URL = reverse('user:me')
+TOKEN_URL = reverse('user:token')
+
+
+class CachedTokenAuthenticationTests(TestCase):
+    """ Test authenticating with cached tokens """
+
+    def setUp(self):
+        authentication.local_cache.clear()
+        self.user = get_user_model().objects.create_user(email='test@example.com', password='testpass123', name='Test')
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def test_token_cached_after_first_request(self):
+        """ Test only the first request queries the token """
+        with self.assertNumQueries(1):
+            res = self.client.get(ME_URL)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+        with self.assertNumQueries(0):
+            res = self.client.get(ME_URL)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['email'], self.user.email)
+
+        stats = authentication.get_stats()
+        self.assertEqual(stats['local_hits'], 1)
+        self.assertEqual(stats['local_misses'], 1)
+
+    def test_invalid_token(self):
+        """ Test an unknown token is rejected """
+        self.client.credentials(HTTP_AUTHORIZATION='Token invalid')
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_deleted_token_invalidated(self):
+        """ Test a cached token stops working once it's deleted """
+        self.client.get(ME_URL)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.token.delete()
+
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_deactivated_user_invalidated(self):
+        """ Test a cached token stops working once its user is deactivated """
+        self.client.get(ME_URL)
+        self.user.is_active = False
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.save()
+
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_profile_update_refreshes_cached_user(self):
+        """ Test requests after updating the profile see the new data """
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(ME_URL, {'name': 'New Name'})
+
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.data['name'], 'New Name')
+
+    def test_shared_cache_tier(self):
+        """ Test a token cached by another worker is read from the shared cache """
+        shared_settings = {**settings.TOKEN_AUTH_CACHE, 'SHARED_CACHE': 'default'}
+        with override_settings(TOKEN_AUTH_CACHE=shared_settings):
+            self.client.get(ME_URL)
+            authentication.local_cache.clear()  # The next request is handled by a "different worker"
+
+            with self.assertNumQueries(0):
+                res = self.client.get(ME_URL)
+
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            with self.captureOnCommitCallbacks(execute=True):
+                self.token.delete()
+            self.assertIsNone(cache.get(f'auth-token:{self.token.key}'))
+
+    def test_revoked_in_other_workers(self):
+        """ Test a token deleted by one worker stops working in workers which have it in their local cache """
+        shared_settings = {**settings.TOKEN_AUTH_CACHE, 'SHARED_CACHE': 'default'}
+        with override_settings(TOKEN_AUTH_CACHE=shared_settings):
+            self.client.get(ME_URL)
+            entry = authentication.local_cache.get(self.token.key)
+            with self.captureOnCommitCallbacks(execute=True):
+                self.token.delete()
+            # The local cache of another worker, which didn't handle the delete
+            authentication.local_cache.set(self.token.key, entry)
+
+            res = self.client.get(ME_URL)
+
+            self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_local_ttl_capped_without_shared_cache(self):
+        """ Test workers trust their local cache only for a few seconds, when they can't learn about revoked tokens """
+        with override_settings(TOKEN_AUTH_CACHE={**settings.TOKEN_AUTH_CACHE, 'TTL': 30, 'SHARED_CACHE': ''}):
+            self.assertEqual(authentication._local_ttl(), authentication.LOCAL_ONLY_MAX_TTL)
+        with override_settings(TOKEN_AUTH_CACHE={**settings.TOKEN_AUTH_CACHE, 'TTL': 30, 'SHARED_CACHE': 'default'}):
+            self.assertEqual(authentication._local_ttl(), 30)
+
+
+class LoginTests(TestCase):
+    """ Test password hashing and the login cache of the token endpoint """
+
+    def setUp(self):
+        authentication.login_cache.clear()
+        self.user = get_user_model().objects.create_user(email='test@example.com', password='testpass123', name='Test')
+        self.client = APIClient()
+        self.credentials = {'email': 'test@example.com', 'password': 'testpass123'}
+
+    def login(self, **credentials):
+        return self.client.post(TOKEN_URL, {**self.credentials, **credentials})
+
+    def test_new_passwords_hashed_with_preferred_hasher(self):
+        """ Test if new passwords use the first hasher, Argon2 """
+        self.assertEqual(identify_hasher(self.user.password).algorithm, get_hasher().algorithm)
+        self.assertEqual(get_hasher().algorithm, 'argon2')
+
+    def test_pbkdf2_password_rehashed_on_login(self):
+        """ Test if passwords hashed before are rehashed with the preferred hasher when the user logs in """
+        self.user.password = make_password('testpass123', hasher='pbkdf2_sha256')
+        self.user.save()
+
+        res = self.login()
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.user.refresh_from_db()
+        self.assertEqual(identify_hasher(self.user.password).algorithm, get_hasher().algorithm)
+        self.assertEqual(self.login().status_code, status.HTTP_200_OK)
+
+    def test_repeated_login_not_hashed_again(self):
+        """ Test if the password is checked only on the first of repeated logins """
+        with mock.patch('django.contrib.auth.base_user.check_password', wraps=check_password) as check:
+            first, second = self.login(), self.login()
+
+        self.assertEqual(first.data['token'], second.data['token'])
+        self.assertEqual(check.call_count, 1)
+
+    def test_failed_logins_not_cached(self):
+        """ Test if wrong passwords are checked every time and a cached login doesn't accept them """
+        self.login()
+        with mock.patch('django.contrib.auth.base_user.check_password', wraps=check_password) as check:
+            responses = [self.login(password='wrong123'), self.login(password='wrong123')]
+
+        self.assertEqual([res.status_code for res in responses], [status.HTTP_400_BAD_REQUEST] * 2)
+        self.assertEqual(check.call_count, 2)
+
+    def test_cached_login_after_password_change(self):
+        """ Test if the old password stops working as soon as it's changed """
+        self.login()
+        self.user.set_password('newpass123')
+        self.user.save()
+
+        self.assertEqual(self.login().status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.login(password='newpass123').status_code, status.HTTP_200_OK)
+
+    def test_cached_login_after_deactivation(self):
+        """ Test if a deactivated user can't log in with cached credentials """
+        self.login()
+        self.user.is_active = False
+        self.user.save()
+
+        self.assertEqual(self.login().status_code, status.HTTP_400_BAD_REQUEST)
+
+    @override_settings(LOGIN_CACHE={'TTL': 0, 'MAX_SIZE': 10})
+    def test_login_cache_disabled(self):
+        """ Test if every login checks the password with the cache disabled """
+        with mock.patch('django.contrib.auth.base_user.check_password', wraps=check_password) as check:
+            self.login()
+            self.login()
+
+        self.assertEqual(check.call_count, 2)
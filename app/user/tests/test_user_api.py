@@ -1,11 +1,14 @@
 """ Tests for the user API """
-from django.test import TestCase
+from django.test import TestCase, override_settings
 from django.contrib.auth import get_user_model
 from django.urls import reverse  # reverse function allows us to get the URL from the name of the view that we want to get the URL for
 
 from rest_framework.test import APIClient  # Testing client provided by DRF framework
 from rest_framework import status
 
+from core.testing import QueryCountTestMixin
+from user.authentication import login_cache
+
 CREATE_USER_URL = reverse('user:create')
 TOKEN_URL = reverse('user:token')
 ME_URL = reverse('user:me')
@@ -166,3 +169,55 @@ class PrivateUserAPITests(TestCase):
         res = self.client.get(GET_ALL_USERS)
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    @override_settings(API_STREAM_CHUNK_SIZE=2)
+    def test_stream_all_users(self):
+        """ Test if streamed list of users is the same as the regular one """
+        self.user.is_superuser = True
+        self.user.save()
+        for i in range(4):
+            create_user(email=f'user{i}@example.com', password='testpass123', name=f'User {i}')
+
+        res = self.client.get(GET_ALL_USERS, {'format': 'json'})
+        streamed = self.client.get(GET_ALL_USERS, {'stream': 1})
+
+        self.assertEqual(streamed.status_code, status.HTTP_200_OK)
+        self.assertTrue(streamed.streaming)
+        self.assertEqual(b''.join(streamed.streaming_content), res.content)
+
+
+class UserQueryCountTests(QueryCountTestMixin, TestCase):
+    """ Test the number of queries of user endpoints doesn't grow with the number of users """
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_superuser('admin@example.com', 'testpass123')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def add_users(self, count):
+        """ Create other users """
+        for _ in range(count):
+            create_user(email=f'user{get_user_model().objects.count()}@example.com', password='testpass123', name='User')
+
+    def test_list_users(self):
+        """ Test listing users, whole and streamed """
+        for params in [{}, {'stream': 1}]:
+            with self.subTest(params=params):
+                self.assertConstantQueries(lambda: self.client.get(GET_ALL_USERS, params), self.add_users)
+
+    def test_me(self):
+        """ Test the profile doesn't depend on other users """
+        self.assertConstantQueries(lambda: self.client.get(ME_URL), self.add_users)
+
+    def add_users_logged_out(self, count):
+        """ Create other users, with the login cache cleared, so every login checks the password """
+        self.add_users(count)
+        login_cache.clear()
+
+    def test_token(self):
+        """ Test logging in doesn't depend on other users, with or without a cached login """
+        credentials = {'email': 'admin@example.com', 'password': 'testpass123'}
+        self.client.post(TOKEN_URL, credentials)  # Creates the token, later logins return it
+        for add_data in [self.add_users_logged_out, self.add_users]:
+            with self.subTest(add_data=add_data.__name__):
+                self.assertConstantQueries(lambda: self.client.post(TOKEN_URL, credentials), add_data)
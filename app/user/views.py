@@ -1,10 +1,13 @@
 """ Views for the User API """
 from django.contrib.auth import get_user_model
-from rest_framework import generics, authentication, permissions
+from rest_framework import generics, permissions
 from rest_framework.authtoken.views import ObtainAuthToken
 from rest_framework.settings import api_settings
+from drf_spectacular.utils import extend_schema_view, extend_schema, OpenApiParameter, OpenApiTypes
+from core.streaming import StreamingListMixin
 from .serializers import UserSerializer, AuthTokenSerializer
 from .permissions import IsSuperUser
+from .authentication import CachedTokenAuthentication
 
 
 # CreateAPIView is used for create-only endpoints.
@@ -26,7 +29,7 @@ class CreateTokenView(ObtainAuthToken):
 class ManageUserView(generics.RetrieveUpdateAPIView):
     """ Manage the authenticated user """
     serializer_class = UserSerializer
-    authentication_classes = [authentication.TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
     permission_classes = [permissions.IsAuthenticated]
 
     # Vid. 72
@@ -37,9 +40,15 @@ class ManageUserView(generics.RetrieveUpdateAPIView):
         return self.request.user
 
 
-class GetAllUsersView(generics.ListAPIView):
+@extend_schema_view(
+    get=extend_schema(
+        parameters=[OpenApiParameter('stream', OpenApiTypes.INT, enum=[0, 1], description='Stream all users as one JSON array, unpaginated')]
+    )
+)
+class GetAllUsersView(StreamingListMixin, generics.ListAPIView):
     """ Admin's Get All Users (Only for testing) """
     serializer_class = UserSerializer
-    queryset = get_user_model().objects.all()
-    authentication_classes = [authentication.TokenAuthentication]
+    queryset = get_user_model().objects.order_by('-id')
+    ordering = ['-id']
+    authentication_classes = [CachedTokenAuthentication]
     permission_classes = [IsSuperUser]
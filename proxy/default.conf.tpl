@@ -5,6 +5,22 @@ server {
         alias /vol/static;
     }
 
+    # Recipe images are named after a hash of their content, so the content behind a URL never changes
+    location /static/media/uploads/recipe/ {
+        alias /vol/static/media/uploads/recipe/;
+        expires max;
+        add_header Cache-Control "public, immutable";
+    }
+
+    # Bulk import reads the body line by line and export writes recipes as they are read, so don't buffer them
+    location ~ ^/api/recipe/recipes/(bulk|export)/$ {
+        uwsgi_pass               ${APP_HOST}:${APP_PORT};
+        include                  /etc/nginx/uwsgi_params;
+        client_max_body_size     200M;
+        uwsgi_request_buffering  off;
+        uwsgi_buffering          off;
+    }
+
     location / {
         uwsgi_pass            ${APP_HOST}:${APP_PORT};
         include               /etc/nginx/uwsgi_params;
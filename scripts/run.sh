@@ -5,5 +5,17 @@ set -e
 python manage.py wait_for_db
 python manage.py collectstatic --noinput
 python manage.py migrate
+# Recipes saved before snapshots existed, or whose tags/ingredients were linked outside of the API and the admin
+# (recipe.signals.drop_snapshots), cheap once all are built
+python manage.py rebuild_recipe_snapshots --missing
 
-uwsgi --socket :9000 --workers 4 --master --enable-threads --module app.wsgi
\ No newline at end of file
+# uWSGI workers write their Prometheus metrics to files in this directory, /metrics adds them up (core/metrics.py).
+# Files left by the previous run would be added too, so start with an empty directory.
+export PROMETHEUS_MULTIPROC_DIR=${PROMETHEUS_MULTIPROC_DIR:-/tmp/prometheus}
+rm -rf "$PROMETHEUS_MULTIPROC_DIR"
+mkdir -p "$PROMETHEUS_MULTIPROC_DIR"
+
+# Recipe images are shared by recipes uploading the same file, so they are never deleted by requests. The uWSGI
+# master deletes unused ones every hour (minute 0), files uploaded less than an hour ago are kept.
+uwsgi --socket :9000 --workers 4 --master --enable-threads --module app.wsgi \
+    --cron "0 -1 -1 -1 -1 python manage.py collect_recipe_images"
\ No newline at end of file